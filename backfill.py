@@ -0,0 +1,194 @@
+"""
+Backfill - טעינת היסטוריה ארוכה לגיליונות (למשל שנה אחורה לדף חדש)
+טווח התאריכים מחולק לחלונות של WINDOW_DAYS ימים, והחלונות נאספים במקביל (BACKFILL_WORKERS
+threads) תחת מגביל קצב אחד לכל קריאות ה-Graph (RATE_LIMITER של ה-collector).
+כל חלון נאסף ליומן משלו (collector_checkpoint); חלון שהושלם נכתב מיד לגיליון ב-upsert
+בחתיכות (sheet_stream) ונרשם בקובץ ההתקדמות. הרצה חוזרת אחרי כשל מדלגת על חלונות שהושלמו
+וממשיכה חלונות חלקיים מה-cursor שלהם.
+
+הרצה:
+    python backfill.py facebook --days 365
+    python backfill.py instagram --since 2025-01-01 --until 2025-12-31 [--window-days 7] [--workers 4]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import facebook_collector
+import instagram_collector
+from collector_checkpoint import CHECKPOINT_DIR, CollectorCheckpoint
+from rate_limiter import RateLimiter
+from run_telemetry import track_run, mark_failed
+from sheet_journal import flush
+from sheet_stream import SheetChunkWriter
+from profiling import profile_run
+
+# --- הגדרות ---
+WINDOW_DAYS = int(os.environ.get('BACKFILL_WINDOW_DAYS') or 7)
+BACKFILL_WORKERS = int(os.environ.get('BACKFILL_WORKERS') or 4)
+# קריאות Graph לשנייה, משותף לכל ה-threads
+GRAPH_RATE_PER_SEC = float(os.environ.get('BACKFILL_RATE_PER_SEC') or 5)
+
+PLATFORMS = {
+    'facebook': {
+        'module': facebook_collector,
+        'id_column': 'post_id',
+        'delta_columns': {'views_delta': 'views', 'reach_delta': 'reach'},
+    },
+    'instagram': {
+        'module': instagram_collector,
+        'id_column': 'media_id',
+        'delta_columns': {'views_delta': 'views', 'reach_delta': 'reach'},
+    },
+}
+
+
+def shard(since, until, window_days):
+    """חלונות [start, end) של window_days ימים מ-until אחורה (החדש ראשון)"""
+    windows = []
+    end = until
+    while end > since:
+        start = max(since, end - timedelta(days=window_days))
+        windows.append((start, end))
+        end = start
+    return windows
+
+
+def window_key(start, end):
+    return f"{start:%Y-%m-%d}..{end:%Y-%m-%d}"
+
+
+class BackfillProgress:
+    """קובץ ההתקדמות: החלונות שהושלמו ונכתבו לגיליון (כתיבה אטומית אחרי כל חלון)"""
+
+    def __init__(self, platform):
+        self.path = os.path.join(CHECKPOINT_DIR, f"backfill-{platform}.json")
+        self.done = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                self.done = json.load(f).get('done', {})
+
+    def mark_done(self, key, rows):
+        self.done[key] = {'rows': rows, 'at': time.time()}
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        with open(f"{self.path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'done': self.done}, f, ensure_ascii=False, indent=1)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def collect_window(platform, account_id, start, end):
+    """איסוף חלון אחד (ב-thread) ליומן משלו. מחזיר את היומן - complete רק אם החלון נגמר בלי שגיאה"""
+    checkpoint = CollectorCheckpoint(f"backfill-{platform}-{start:%Y%m%d}-{end:%Y%m%d}")
+    if platform == 'facebook':
+        rows = facebook_collector.iter_facebook_posts(checkpoint, since=start, until=end)
+    else:
+        rows = instagram_collector.iter_instagram_media(account_id, checkpoint, since=start, until=end)
+    for _ in rows:
+        pass
+    return checkpoint
+
+
+def backfill(platform, since, until, window_days=WINDOW_DAYS, workers=BACKFILL_WORKERS):
+    """איסוף מקבילי של הטווח וכתיבה לגיליון. מחזיר את מספר החלונות שנכשלו"""
+    spec = PLATFORMS[platform]
+    module = spec['module']
+    account_id = None
+    if platform == 'instagram':
+        account_id = module.get_instagram_account_id()
+        if not account_id:
+            mark_failed('no_instagram_account')
+            return 1
+
+    progress = BackfillProgress(platform)
+    windows = [(start, end) for start, end in shard(since, until, window_days)
+               if window_key(start, end) not in progress.done]
+    print(f"🗄️ Backfill {platform}: {since:%Y-%m-%d} -> {until:%Y-%m-%d}, {len(windows)} windows of "
+          f"{window_days} days to collect ({len(progress.done)} already done), {workers} workers, "
+          f"{GRAPH_RATE_PER_SEC:g} calls/sec")
+    if not windows:
+        progress.clear()
+        return 0
+
+    sh, worksheet = module.open_worksheet()
+    # כתיבה מלאה שממתינה ביומן הייתה דורסת את מה שנכתב כאן
+    if not flush(sh):
+        mark_failed('sheet_journal_pending')
+        return len(windows)
+    writer = SheetChunkWriter(sh, worksheet, platform, spec['id_column'], spec['delta_columns'])
+
+    module.RATE_LIMITER = RateLimiter(GRAPH_RATE_PER_SEC, capacity=GRAPH_RATE_PER_SEC)
+    failed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(collect_window, platform, account_id, start, end): (start, end)
+                       for start, end in windows}
+            # כתיבה לגיליון ב-thread הראשי, בזמן שהחלונות הבאים עדיין נאספים
+            for future in as_completed(futures):
+                key = window_key(*futures[future])
+                try:
+                    checkpoint = future.result()
+                except Exception as e:
+                    print(f"   ❌ {key}: {e}")
+                    failed += 1
+                    continue
+                if not checkpoint.complete:
+                    # היומן נשאר - ההרצה הבאה ממשיכה את החלון מה-cursor
+                    print(f"   ❌ {key}: stopped before the end of the window ({len(checkpoint.item_ids)} items kept)")
+                    failed += 1
+                    continue
+                rows = checkpoint.rows()
+                writer.write(rows)
+                progress.mark_done(key, len(rows))
+                checkpoint.clear()
+                print(f"   ✅ {key}: {len(rows)} items ({len(progress.done)} windows done)")
+    finally:
+        module.RATE_LIMITER = None
+        writer.close()
+
+    if failed:
+        mark_failed('backfill_windows_failed')
+        print(f"⚠️ {failed} window(s) failed - run the same command again to resume them")
+    else:
+        progress.clear()
+        print(f"✅ Backfill of {platform} complete")
+    return failed
+
+
+def parse_range(args):
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    until = datetime.strptime(args.until, '%Y-%m-%d') + timedelta(days=1) if args.until else today + timedelta(days=1)
+    since = datetime.strptime(args.since, '%Y-%m-%d') if args.since else until - timedelta(days=args.days)
+    return since, until
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel, resumable historical backfill into the sheets")
+    parser.add_argument('platform', choices=list(PLATFORMS))
+    parser.add_argument('--days', type=int, default=365, help="days back from today (ignored with --since)")
+    parser.add_argument('--since', help="first day, YYYY-MM-DD")
+    parser.add_argument('--until', help="last day (inclusive), YYYY-MM-DD - default today")
+    parser.add_argument('--window-days', type=int, default=WINDOW_DAYS)
+    parser.add_argument('--workers', type=int, default=BACKFILL_WORKERS)
+    parser.add_argument('--profile', action='store_true', help="see profiling.py")
+    args = parser.parse_args()
+
+    if not PLATFORMS[args.platform]['module'].ACCESS_TOKEN:
+        print("❌ Missing FACEBOOK_TOKEN environment variable")
+        mark_failed('missing_token')
+        return 1
+    since, until = parse_range(args)
+    return 1 if backfill(args.platform, since, until, args.window_days, args.workers) else 0
+
+
+if __name__ == "__main__":
+    with track_run('backfill'), profile_run('backfill'):
+        status = main()
+    sys.exit(status)
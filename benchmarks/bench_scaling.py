@@ -0,0 +1,200 @@
+"""
+Benchmark - עקומות זמן וזיכרון של מסלולי החישוב הטהורים כשהגיליונות גדלים
+(1k / 10k / 100k / 1M שורות): מיזוג ה-collectors (merge_videos / merge_posts / merge_media,
+כולל מפות הדלתא), summarize_day / summarize_period, calculate_weekly_stats,
+ואינדקס התאריכים / זיהוי החורים בגיליון העוקבים.
+
+לכל מקרה ולכל גודל נמדדים זמן (הטוב מבין --repeat) ושיא זיכרון (tracemalloc, ריצה נפרדת),
+ומחושב מעריך הגדילה בין גדלים עוקבים: log(t2/t1) / log(n2/n1). מעריך מעל MAX_EXPONENT
+(למשל מעבר מ-O(n) ל-O(n²)) מסומן כרגרסיה וקוד היציאה הוא 1.
+
+הרצה:
+    python benchmarks/bench_scaling.py [--sizes 1000,10000,100000,1000000] [--only merge]
+                                       [--repeat 3] [--output scaling.json]
+"""
+
+import io
+import os
+import re
+import sys
+import gc
+import json
+import math
+import time
+import argparse
+import tracemalloc
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gspread
+from synthetic_data import END_DATE, FOLLOWERS_MAX_ROWS, make_sheet_frame, make_collector_batch
+from youtube_collector import merge_videos
+from facebook_collector import merge_posts
+from instagram_collector import merge_media
+from summary_engine import summarize_day, summarize_period
+from weekly_reporter import calculate_weekly_stats
+from followers_tracker import HEADERS, build_date_index, find_followers_gaps
+
+# --- הגדרות ---
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+# גודל ריצת collector טיפוסית (שורות חדשות/מעודכנות מול הגיליון)
+BATCH_ROWS = 500
+# מעריך גדילה מקסימלי מותר בין גדלים עוקבים (1.0 = ליניארי)
+MAX_EXPONENT = 1.3
+# מתחת לזמן הזה המדידה רועשת מדי לחישוב מעריך
+MIN_TIMED_SEC = 0.01
+PLATFORMS = ['youtube', 'facebook', 'instagram']
+MERGES = {'youtube': merge_videos, 'facebook': merge_posts, 'instagram': merge_media}
+
+
+class FrameWorksheet:
+    """
+    גיליון בזיכרון מעל טבלה - רק col_values ו-batch_get, מה שפונקציות העוקבים קוראות.
+    הטווחים נשמרים אחרי הקריאה הראשונה, כדי שהמדידה (הטובה מבין החזרות) תכלול
+    רק את העבודה של הפונקציה ולא את בניית התשובה המדומה.
+    """
+
+    def __init__(self, frame):
+        self.rows = [HEADERS] + frame.astype(str).values.tolist()
+        self.cache = {}
+
+    def col_values(self, col):
+        if col not in self.cache:
+            self.cache[col] = [row[col - 1] for row in self.rows]
+        return self.cache[col]
+
+    def batch_get(self, ranges):
+        for a1 in ranges:
+            if a1 not in self.cache:
+                self.cache[a1] = self._range(a1)
+        return [self.cache[a1] for a1 in ranges]
+
+    def _range(self, a1):
+        first_col, first_row, last_col = re.match(r'([A-Z]+)(\d*):?([A-Z]*)', a1).groups()
+        start = gspread.utils.a1_to_rowcol(f"{first_col}1")[1] - 1
+        end = gspread.utils.a1_to_rowcol(f"{last_col or first_col}1")[1]
+        values = []
+        for row in self.rows[int(first_row or 1) - 1:]:
+            cells = row[start:end]
+            while cells and cells[-1] == '':
+                cells = cells[:-1]
+            values.append(cells)
+        return values
+
+
+def build_cases(size, only):
+    """
+    המקרים של גודל אחד: {שם: (setup, fn)}. setup מחזיר את הארגומנטים (מחוץ למדידה),
+    כי חלק מהפונקציות משנות את הקלט.
+    """
+    cases = {}
+    frames = {platform: make_sheet_frame(platform, size, seed) for seed, platform in enumerate(PLATFORMS)}
+    report_date = END_DATE.isoformat()
+
+    for platform in PLATFORMS:
+        existing = frames[platform]
+        batch = make_collector_batch(platform, existing, BATCH_ROWS)
+        cases[f"merge:{platform}"] = (
+            lambda existing=existing, batch=batch: (batch.copy(), existing.copy()), MERGES[platform])
+        cases[f"summarize_day:{platform}"] = (
+            lambda frame=existing, platform=platform: (frame, platform, report_date), summarize_day)
+        cases[f"summarize_period:{platform}"] = (
+            lambda frame=existing, platform=platform: (frame, platform), summarize_period)
+    cases['weekly_stats'] = (lambda: (frames['youtube'], frames['facebook'], frames['instagram']),
+                             calculate_weekly_stats)
+
+    if size <= FOLLOWERS_MAX_ROWS:
+        worksheet = FrameWorksheet(make_sheet_frame('followers', size))
+        cases['followers:date_index'] = (lambda: (worksheet,), build_date_index)
+        cases['followers:gaps'] = (lambda: (worksheet,), find_followers_gaps)
+
+    return {name: case for name, case in cases.items() if not only or name.startswith(only)}
+
+
+def measure_time(setup, fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        args = setup()
+        gc.collect()
+        with redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def measure_memory(setup, fn):
+    """שיא הזיכרון שהפונקציה מקצה מעבר לקלט (MB)"""
+    args = setup()
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    with redirect_stdout(io.StringIO()):
+        fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (peak - base) / 1024 / 1024
+
+
+def growth_exponents(points):
+    """מעריך הגדילה בין כל שני גדלים עוקבים (None כשהזמנים קצרים מדי למדידה)"""
+    exponents = []
+    for (n1, t1), (n2, t2) in zip(points, points[1:]):
+        if t1 < MIN_TIMED_SEC or t2 < MIN_TIMED_SEC:
+            exponents.append(None)
+        else:
+            exponents.append(math.log(t2 / t1) / math.log(n2 / n1))
+    return exponents
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmark for merge and report paths")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)))
+    parser.add_argument('--only', default='', help="run only cases whose name starts with this")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--output', help="write the curves as JSON")
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(',') if size)
+    curves = {}
+    for size in sizes:
+        print(f"\n📦 {size:,} rows per sheet...")
+        cases = build_cases(size, args.only)
+        for name, (setup, fn) in cases.items():
+            elapsed = measure_time(setup, fn, args.repeat)
+            peak_mb = None if args.no_memory else measure_memory(setup, fn)
+            curves.setdefault(name, []).append({'rows': size, 'sec': elapsed, 'peak_mb': peak_mb})
+            memory = '' if peak_mb is None else f" | peak {peak_mb:,.1f} MB"
+            print(f"   {name:<28} {elapsed * 1000:>10,.1f} ms{memory}")
+        del cases
+        gc.collect()
+
+    print(f"\n{'case':<28} {'exponents':<30} result")
+    regressions = []
+    for name, points in curves.items():
+        exponents = growth_exponents([(p['rows'], p['sec']) for p in points])
+        for point, exponent in zip(points[1:], exponents):
+            point['exponent'] = exponent
+        measured = [e for e in exponents if e is not None]
+        bad = any(e > MAX_EXPONENT for e in measured)
+        if bad:
+            regressions.append(name)
+        text = ' '.join('-' if e is None else f"{e:.2f}" for e in exponents) or '-'
+        print(f"{name:<28} {text:<30} {'❌' if bad else '✅'}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'sizes': sizes, 'max_exponent': MAX_EXPONENT, 'curves': curves}, f, indent=2)
+        print(f"💾 Curves saved to {args.output}")
+
+    if regressions:
+        print(f"❌ Super-linear growth (> n^{MAX_EXPONENT:g}): {', '.join(regressions)}")
+        return 1
+    print(f"✅ All paths scale within n^{MAX_EXPONENT:g}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
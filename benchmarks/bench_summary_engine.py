@@ -0,0 +1,72 @@
+"""
+Benchmark - מנוע הסיכומים (summary_engine) על טבלאות גדולות
+מייצר נתונים סינתטיים (synthetic_data, ברירת מחדל 100,000 שורות לכל פלטפורמה) ומודד את הכנת הדוח
+היומי והשבועי. היעד: פחות משנייה לכל הפלטפורמות יחד.
+
+הרצה:
+    python benchmarks/bench_summary_engine.py [--rows 100000] [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_data import DAYS, END_DATE, make_sheet_frame
+from prompt_builder import PromptBuilder
+from summary_engine import summarize_day, summarize_period, format_top_lines, format_delta_lines
+
+# --- הגדרות ---
+TARGET_SEC = 1.0
+
+
+def run_daily(frames, report_date):
+    links = PromptBuilder()
+    for platform, frame in frames.items():
+        summary = summarize_day(frame, platform, report_date)
+        format_top_lines(summary, links)
+        format_delta_lines(summary, links)
+
+
+def run_weekly(frames):
+    for platform, frame in frames.items():
+        summarize_period(frame, platform)
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summary engine benchmark")
+    parser.add_argument('--rows', type=int, default=100_000, help="rows per platform")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"📦 Generating {args.rows:,} rows per platform...")
+    frames = {
+        platform: make_sheet_frame(platform, args.rows, seed)
+        for seed, platform in enumerate(['youtube', 'facebook', 'instagram'])
+    }
+    report_date = (END_DATE - timedelta(days=DAYS // 2)).isoformat()
+
+    daily = measure(lambda: run_daily(frames, report_date), args.repeat)
+    weekly = measure(lambda: run_weekly(frames), args.repeat)
+
+    print(f"⏱️ Daily summaries (3 platforms): {daily * 1000:,.0f} ms")
+    print(f"⏱️ Weekly stats (3 platforms):    {weekly * 1000:,.0f} ms")
+    ok = daily < TARGET_SEC and weekly < TARGET_SEC
+    print(f"{'✅' if ok else '❌'} Target: < {TARGET_SEC:g}s each")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
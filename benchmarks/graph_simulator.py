@@ -0,0 +1,532 @@
+"""
+Graph API Simulator - תחליף מקומי ל-graph.facebook.com לבדיקות עומס
+מייצר דף פייסבוק וחשבון אינסטגרם סינתטיים (עד אלפי פוסטים בחלון) ומגיש את מה שה-collectors
+וה-followers_tracker קוראים: /me, /{id}, /{id}/feed, /{id}/media, /{id}/insights, /?ids=,
+batch (POST עם batch=[...]) ו-paging עם cursors.
+
+כל תשובה מתעכבת לפי התפלגות log-normal (חציון --latency-ms), כוללת כותרות שימוש
+(X-App-Usage / X-Business-Use-Case-Usage), וכשתקציב הקריאות בחלון נגמר - או בהסתברות
+--error-rate - מוחזרת שגיאת throttling אמיתית בפורמט של Graph (קודים 4/17/32/613).
+
+הפניית הקוד לסימולטור:
+    GRAPH_API_BASE=http://127.0.0.1:8765 python facebook_collector.py
+
+הרצה:
+    python benchmarks/graph_simulator.py --posts 5000 [--port 8765] [--latency-ms 120]
+                                         [--error-rate 0.01] [--call-budget 4800]
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import base64
+import argparse
+import threading
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# --- הגדרות ---
+DEFAULT_PORT = 8765
+PAGE_ID = "220634478361516"
+IG_ACCOUNT_ID = "17841400000000001"
+MAX_PAGE_LIMIT = 100
+MAX_BATCH_SIZE = 50
+# מכפיל זמן תגובה לפי סוג הקריאה (insights איטיים יותר מקריאת אובייקט)
+LATENCY_FACTORS = {'insights': 1.6, 'feed': 1.3, 'media': 1.3, 'batch': 1.0}
+# קודי ה-throttling של Graph והודעותיהם
+THROTTLE_ERRORS = {
+    4: "(#4) Application request limit reached",
+    17: "(#17) User request limit reached",
+    32: "(#32) Page request limit reached",
+    613: "(#613) Calls to this api have exceeded the rate limit.",
+}
+
+FB_TYPES = {
+    # סוג -> (משקל, attachment type, נתיב ב-permalink)
+    'Reel': (0.35, 'video_inline', 'reel'),
+    'Video': (0.15, 'video_inline', 'videos'),
+    'Photo': (0.35, 'photo', 'photos'),
+    'Link': (0.15, 'share', 'posts'),
+}
+IG_TYPES = {'VIDEO': 0.5, 'IMAGE': 0.3, 'CAROUSEL_ALBUM': 0.2}
+
+
+def _graph_time(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+0000')
+
+
+def _cursor(offset):
+    return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+
+def _offset(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception:
+        return 0
+
+
+def split_fields(fields):
+    """פיצול fields=a,b.summary(true).limit(0),c{d,e} לשמות השדות ברמה העליונה"""
+    names, depth, current = [], 0, ''
+    for ch in fields or '':
+        if ch in '({':
+            depth += 1
+        elif ch in ')}':
+            depth -= 1
+        if ch == ',' and depth == 0:
+            names.append(current)
+            current = ''
+        else:
+            current += ch
+    names.append(current)
+    return [name.split('.')[0].split('{')[0].strip() for name in names if name.strip()]
+
+
+class SyntheticGraph:
+    """
+    הנתונים של הסימולטור: posts פוסטים בדף ו-posts מדיות באינסטגרם, מפוזרים על days הימים
+    האחרונים (החדש ראשון), עם מדדים עקביים (reach > views > likes וכו').
+    """
+
+    def __init__(self, posts=500, days=7, seed=0, page_id=PAGE_ID, ig_id=IG_ACCOUNT_ID):
+        self.rng = random.Random(seed)
+        self.page_id = page_id
+        self.ig_id = ig_id
+        self.objects = {}
+        now = time.time()
+        # מרווח קטן משני הקצוות כדי שכל הפוסטים ייכנסו לחלון ה-since של ה-collector
+        start, end = now - days * 86400 + 3600, now - 60
+        stamps = sorted((self.rng.uniform(start, end) for _ in range(posts)), reverse=True)
+
+        self.page = {
+            'id': page_id, 'name': 'Simulated Page',
+            'fan_count': 250_000, 'followers_count': 265_000,
+            'instagram_business_account': {'id': ig_id},
+        }
+        self.ig_account = {'id': ig_id, 'username': 'simulated', 'followers_count': 120_000,
+                           'media_count': posts}
+        self.objects[page_id] = self.page
+        self.objects[ig_id] = self.ig_account
+
+        self.posts = [self._make_post(i, ts) for i, ts in enumerate(stamps)]
+        self.media = [self._make_media(i, ts) for i, ts in enumerate(stamps)]
+
+    def _metrics(self, video):
+        reach = int(self.rng.lognormvariate(9, 1.2))
+        views = int(reach * self.rng.uniform(0.8, 2.5)) if video else int(reach * self.rng.uniform(0, 0.3))
+        likes = int(reach * self.rng.uniform(0.005, 0.06))
+        return {
+            'reach': reach, 'views': views, 'likes': likes,
+            'comments': int(likes * self.rng.uniform(0.02, 0.2)),
+            'shares': int(likes * self.rng.uniform(0.01, 0.15)),
+            'saved': int(likes * self.rng.uniform(0.01, 0.1)),
+            'clicks': int(reach * self.rng.uniform(0.01, 0.08)),
+            'views_30s': int(views * self.rng.uniform(0.05, 0.4)) if video else 0,
+            'avg_watch_ms': int(self.rng.uniform(3_000, 40_000)) if video else 0,
+        }
+
+    def _make_post(self, index, ts):
+        kind = self.rng.choices(list(FB_TYPES), [w for w, _, _ in FB_TYPES.values()])[0]
+        _, att_type, path = FB_TYPES[kind]
+        post_id = f"{self.page_id}_{100000 + index}"
+        video_id = str(900000 + index)
+        permalink = f"https://www.facebook.com/{path}/{100000 + index}"
+        m = self._metrics(kind in ('Reel', 'Video'))
+        post = {
+            'id': post_id,
+            'created_time': _graph_time(ts),
+            'message': f"פוסט סינתטי מספר {index} עם כותרת באורך סביר לבדיקת עומס",
+            'permalink_url': permalink,
+            'attachments': {'data': [{
+                'type': att_type, 'url': permalink,
+                'target': {'id': video_id, 'url': permalink},
+            }]},
+            '_ts': ts, '_metrics': m,
+        }
+        self.objects[post_id] = post
+        if kind in ('Reel', 'Video'):
+            self.objects[video_id] = {'id': video_id, 'views': m['views'], '_metrics': m}
+        return post
+
+    def _make_media(self, index, ts):
+        media_type = self.rng.choices(list(IG_TYPES), list(IG_TYPES.values()))[0]
+        media_id = str(18000000000000000 + index)
+        media = {
+            'id': media_id,
+            'caption': f"מדיה סינתטית מספר {index} #בדיקה",
+            'media_type': media_type,
+            'media_url': f"https://cdn.example.com/{media_id}.jpg",
+            'permalink': f"https://www.instagram.com/p/SIM{index}/",
+            'thumbnail_url': f"https://cdn.example.com/{media_id}_thumb.jpg",
+            'timestamp': _graph_time(ts),
+            '_ts': ts, '_metrics': self._metrics(media_type == 'VIDEO'),
+        }
+        media['like_count'] = media['_metrics']['likes']
+        media['comments_count'] = media['_metrics']['comments']
+        self.objects[media_id] = media
+        return media
+
+    # --- תשובות ---
+
+    def node(self, object_id, params):
+        """GET /{id}?fields=... (כולל /me)"""
+        obj = self.page if object_id == 'me' else self.objects.get(object_id)
+        if obj is None:
+            return None
+        m = obj.get('_metrics', {})
+        fields = split_fields(params.get('fields')) or ['id']
+        result = {'id': obj['id']}
+        for field in fields:
+            if field == 'shares':
+                result['shares'] = {'count': m.get('shares', 0)}
+            elif field in ('comments', 'reactions', 'likes'):
+                total = m.get('comments' if field == 'comments' else 'likes', 0)
+                result[field] = {'data': [], 'summary': {'total_count': total}}
+            elif field in obj and not field.startswith('_'):
+                result[field] = obj[field]
+        return result
+
+    def insights(self, object_id, params):
+        """GET /{id}/insights?metric=a,b&period=..."""
+        obj = self.page if object_id == 'me' else self.objects.get(object_id)
+        if obj is None:
+            return None
+        m = obj.get('_metrics', {})
+        period = params.get('period', 'lifetime')
+        data = []
+        for name in filter(None, params.get('metric', '').split(',')):
+            value = self._metric_value(name, m)
+            item = {'name': name, 'period': period, 'id': f"{obj['id']}/insights/{name}/{period}"}
+            if params.get('metric_type') == 'total_value':
+                item['total_value'] = {'value': value}
+            if period == 'day':
+                item['values'] = [
+                    {'value': int(value * self.rng.uniform(0.7, 1.3)), 'end_time': day}
+                    for day in self._days(params)
+                ]
+            else:
+                item['values'] = [{'value': value}]
+            data.append(item)
+        return {'data': data}
+
+    def _metric_value(self, name, m):
+        if not m:
+            # מדדי דף / חשבון - מספרים יומיים בגודל סביר
+            return int(self.rng.lognormvariate(8, 0.5))
+        if 'avg' in name and 'time' in name:
+            return m['avg_watch_ms']
+        if 'view_time' in name:
+            return m['views'] * m['avg_watch_ms']
+        if '30s' in name:
+            return m['views_30s']
+        for key, words in (('clicks', ('click',)), ('reach', ('reach', 'impressions_unique')),
+                           ('views', ('view', 'play')), ('saved', ('save',)), ('shares', ('share',)),
+                           ('comments', ('comment',)), ('likes', ('like', 'reaction'))):
+            if any(word in name for word in words):
+                return m[key]
+        if name == 'total_interactions':
+            return m['likes'] + m['comments'] + m['shares'] + m['saved']
+        return m['reach']
+
+    def _days(self, params):
+        """ימי סיום (end_time) לטווח since/until, או יום אחד (אתמול)"""
+        today = datetime.now(timezone.utc).replace(hour=7, minute=0, second=0, microsecond=0)
+        try:
+            since = datetime.strptime(params['since'], '%Y-%m-%d').replace(hour=7, tzinfo=timezone.utc)
+            until = datetime.strptime(params['until'], '%Y-%m-%d').replace(hour=7, tzinfo=timezone.utc)
+        except (KeyError, ValueError):
+            return [today.strftime('%Y-%m-%dT%H:%M:%S+0000')]
+        days = []
+        while since < until:
+            since += timedelta(days=1)
+            days.append(since.strftime('%Y-%m-%dT%H:%M:%S+0000'))
+        return days
+
+    def edge(self, items, params, next_url):
+        """דף אחד של /feed או /media, עם since/until ו-cursors (after)"""
+        since = float(params['since']) if params.get('since', '').isdigit() else None
+        until = float(params['until']) if params.get('until', '').isdigit() else None
+        if since is not None or until is not None:
+            items = [item for item in items
+                     if (since is None or item['_ts'] >= since) and (until is None or item['_ts'] < until)]
+        limit = min(int(params.get('limit') or 25), MAX_PAGE_LIMIT)
+        offset = _offset(params['after']) if params.get('after') else 0
+        page = items[offset:offset + limit]
+        fields = split_fields(params.get('fields')) or ['id']
+        data = [{field: item[field] for field in fields if field in item} for item in page]
+        result = {'data': data}
+        if page:
+            result['paging'] = {'cursors': {'before': _cursor(offset), 'after': _cursor(offset + len(page))}}
+            if offset + len(page) < len(items):
+                result['paging']['next'] = next_url({**params, 'after': _cursor(offset + len(page))})
+        return result
+
+
+class UsageTracker:
+    """ספירת קריאות בחלון זמן נע - לכותרות השימוש ולשגיאות throttling כשהתקציב נגמר"""
+
+    def __init__(self, call_budget=0, window_sec=3600):
+        self.call_budget = call_budget
+        self.window_sec = window_sec
+        self.calls = deque()
+        self.lock = threading.Lock()
+
+    def hit(self, count=1):
+        """רישום קריאה; מחזיר אחוז שימוש (0 כשאין תקציב)"""
+        now = time.monotonic()
+        with self.lock:
+            while self.calls and self.calls[0] <= now - self.window_sec:
+                self.calls.popleft()
+            self.calls.extend([now] * count)
+            if not self.call_budget:
+                return 0
+            return min(100 * len(self.calls) // self.call_budget, 999)
+
+    def regain_minutes(self):
+        with self.lock:
+            if not self.calls:
+                return 0
+            return math.ceil((self.calls[0] + self.window_sec - time.monotonic()) / 60)
+
+
+class GraphSimulator(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, graph, latency_ms=120, latency_sigma=0.6, error_rate=0.0,
+                 call_budget=0, window_sec=3600, throttle_code=4, seed=0):
+        super().__init__(address, GraphHandler)
+        self.graph = graph
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.throttle_code = throttle_code
+        self.usage = UsageTracker(call_budget, window_sec)
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key, n=1):
+        with self.stats_lock:
+            self.stats[key] += n
+
+    def reset(self, graph=None):
+        """נתונים חדשים / איפוס מונים בין הרצות של אותו שרת"""
+        if graph is not None:
+            self.graph = graph
+        with self.stats_lock:
+            self.stats.clear()
+        with self.usage.lock:
+            self.usage.calls.clear()
+
+    def delay(self, kind):
+        if self.latency_ms <= 0:
+            return 0
+        with self.rng_lock:
+            factor = self.rng.lognormvariate(0, self.latency_sigma)
+        return self.latency_ms * LATENCY_FACTORS.get(kind, 1.0) * factor / 1000
+
+    def injected_error(self):
+        if self.error_rate <= 0:
+            return None
+        with self.rng_lock:
+            if self.rng.random() >= self.error_rate:
+                return None
+            return self.rng.choice(list(THROTTLE_ERRORS))
+
+    def usage_headers(self, percent):
+        usage = {'call_count': percent, 'total_cputime': percent * 6 // 10, 'total_time': percent * 8 // 10}
+        buc = {self.graph.page_id: [{'type': 'pages', **usage,
+                                     'estimated_time_to_regain_access': self.usage.regain_minutes()
+                                     if percent >= 100 else 0}]}
+        return {'X-App-Usage': json.dumps(usage), 'X-Business-Use-Case-Usage': json.dumps(buc)}
+
+
+def split_path(path):
+    """'/v24.0/123/feed' -> ('v24.0', ['123', 'feed'])"""
+    segments = [s for s in path.split('/') if s]
+    if segments and segments[0].startswith('v') and segments[0][1:2].isdigit():
+        return segments[0], segments[1:]
+    return '', segments
+
+
+def throttle_error(code):
+    return 400, {'error': {
+        'message': THROTTLE_ERRORS[code], 'type': 'OAuthException', 'code': code,
+        'is_transient': True, 'fbtrace_id': 'SIMULATED',
+    }}
+
+
+def not_found(object_id):
+    return 400, {'error': {
+        'message': f"(#100) Unsupported get request. Object with ID '{object_id}' does not exist",
+        'type': 'GraphMethodException', 'code': 100, 'fbtrace_id': 'SIMULATED',
+    }}
+
+
+class GraphHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass  # בלי שורת לוג לכל בקשה
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        self.respond(*self.dispatch('GET', parts.path, dict(parse_qsl(parts.query))))
+
+    def do_POST(self):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        params = {**dict(parse_qsl(parts.query)), **dict(parse_qsl(body))}
+        self.respond(*self.dispatch('POST', parts.path, params))
+
+    def dispatch(self, method, path, params):
+        """בקשה חיצונית: עיכוב, מונה שימוש, שגיאות throttling ואז ניתוב"""
+        server = self.server
+        version, segments = split_path(path)
+        batch = json.loads(params['batch']) if method == 'POST' and 'batch' in params else None
+        kind = 'batch' if batch is not None else self.kind(segments, params)
+
+        time.sleep(server.delay(kind))
+        server.count(kind)
+        # בקשת batch נספרת בתקציב לפי מספר תתי-הבקשות, כמו ב-Graph
+        percent = server.usage.hit(len(batch) if batch else 1)
+        self.extra_headers = server.usage_headers(percent)
+
+        if percent >= 100:
+            server.count('throttled')
+            return throttle_error(server.throttle_code)
+        code = server.injected_error()
+        if code:
+            server.count('throttled')
+            return throttle_error(code)
+
+        if batch is not None:
+            return 200, self.run_batch(batch, version)
+        return self.route(version, segments, params)
+
+    @staticmethod
+    def kind(segments, params):
+        if not segments:
+            return 'ids' if 'ids' in params else 'root'
+        if len(segments) > 1 or segments[0] == 'insights':
+            return segments[-1]
+        return 'me' if segments[0] == 'me' else 'node'
+
+    def route(self, version, segments, params):
+        graph = self.server.graph
+        if not segments or (len(segments) == 1 and 'ids' in params and segments[0] == 'insights'):
+            # /?ids=a,b[&fields=...] או /insights?ids=a,b&metric=...
+            if 'ids' not in params:
+                return not_found('')
+            result = {}
+            for object_id in params['ids'].split(','):
+                found = graph.insights(object_id, params) if segments else graph.node(object_id, params)
+                if found is None:
+                    return not_found(object_id)
+                result[object_id] = found
+            return 200, result
+
+        object_id = segments[0]
+        if len(segments) == 1:
+            found = graph.node(object_id, params)
+            return (200, found) if found is not None else not_found(object_id)
+
+        edge = segments[1]
+        if edge == 'insights':
+            found = graph.insights(object_id, params)
+            return (200, found) if found is not None else not_found(object_id)
+        if edge in ('feed', 'posts', 'published_posts'):
+            items = graph.posts
+        elif edge == 'media':
+            items = graph.media
+        else:
+            return not_found(f"{object_id}/{edge}")
+
+        path = '/'.join(([version] if version else []) + segments)
+        next_url = lambda p: f"{self.server.base_url}/{path}?{urlencode(p)}"
+        return 200, graph.edge(items, params, next_url)
+
+    def run_batch(self, batch, default_version):
+        """batch: כל תת-בקשה מנותבת כמו בקשה רגילה, התשובה היא רשימה בסדר הבקשות"""
+        if len(batch) > MAX_BATCH_SIZE:
+            return [{'code': 400, 'headers': [], 'body': json.dumps({'error': {
+                'message': f"(#100) Too many requests in batch message. Maximum batch size is {MAX_BATCH_SIZE}",
+                'code': 100}})}]
+        responses = []
+        for request in batch:
+            parts = urlsplit('/' + request.get('relative_url', '').lstrip('/'))
+            version, segments = split_path(parts.path)
+            params = dict(parse_qsl(parts.query))
+            self.server.count(f"batch:{self.kind(segments, params)}")
+            status, body = self.route(version or default_version, segments, params)
+            responses.append({'code': status, 'headers': [{'name': 'Content-Type', 'value': 'application/json'}],
+                              'body': json.dumps(body)})
+        return responses
+
+    def respond(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in getattr(self, 'extra_headers', {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_simulator(graph, port=0, **options):
+    """הרצת הסימולטור ב-thread ברקע (port=0 - פורט פנוי). מחזיר את השרת; server.shutdown() לעצירה"""
+    server = GraphSimulator(('127.0.0.1', port), graph, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Graph API simulator")
+    parser.add_argument('--posts', type=int, default=500, help="synthetic posts (and IG media) in the window")
+    parser.add_argument('--days', type=int, default=7, help="window the posts are spread over")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--latency-ms', type=float, default=120, help="median response time (0 - none)")
+    parser.add_argument('--latency-sigma', type=float, default=0.6, help="log-normal spread")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="probability of a random throttling error")
+    parser.add_argument('--call-budget', type=int, default=0, help="calls per window before throttling (0 - unlimited)")
+    parser.add_argument('--window-sec', type=int, default=3600)
+    parser.add_argument('--throttle-code', type=int, default=4, choices=sorted(THROTTLE_ERRORS))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"📦 Generating {args.posts:,} posts and {args.posts:,} IG media over {args.days} days...")
+    graph = SyntheticGraph(args.posts, args.days, args.seed)
+    server = GraphSimulator(('127.0.0.1', args.port), graph, latency_ms=args.latency_ms,
+                            latency_sigma=args.latency_sigma, error_rate=args.error_rate,
+                            call_budget=args.call_budget, window_sec=args.window_sec,
+                            throttle_code=args.throttle_code, seed=args.seed)
+    print(f"🚀 Graph simulator on {server.base_url}")
+    print(f"   export GRAPH_API_BASE={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"📊 Requests: {dict(server.stats)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
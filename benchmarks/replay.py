@@ -0,0 +1,484 @@
+"""
+Replay Benchmark - הרצת נקודות הכניסה מול תשובות HTTP מוקלטות
+כל התעבורה (Graph, YouTube, Sheets, Gemini, Telegram) עוברת דרך requests / httplib2 / httpx,
+ושלושתם מיורטים כאן: במצב --record הקריאות יוצאות לרשת והתשובות נשמרות ל-fixtures,
+ובמצב replay (ברירת מחדל) התשובות מוגשות מהקובץ בלי רשת.
+עם --simulate ההקלטה לא יוצאת לרשת: Graph מוגש מ-graph_simulator ושאר השירותים מ-stub_services
+(Sheets עם מצב, YouTube, Gemini, Telegram) - כך הוקלט התרחיש simulated שב-fixtures וב-baseline.json.
+כל ריצה מתחילה ממצב מקומי ריק (יומני collectors, יומן כתיבות, cache) בתיקייה זמנית.
+השעון של מודולי הפרויקט (datetime.now) מוקפא לשעת ההקלטה (recorded_at ב-fixture), כך שהחלונות
+של הקוד (היום / אתמול / 7 ימים) נופלים על אותם פוסטים בכל יום שבו מריצים את ה-replay.
+
+לכל נקודת כניסה נמדדים: זמן ריצה, מספר קריאות HTTP לכל endpoint, בייטים שעברו
+ושיא זיכרון (tracemalloc) - ומושווים ל-baseline שמור.
+
+הרצה:
+    python benchmarks/replay.py --record --scenario live # הקלטה (דורש את כל המפתחות האמיתיים)
+    python benchmarks/replay.py --record --simulate      # הקלטה מחדש של simulated, בלי מפתחות
+    python benchmarks/replay.py                          # replay של simulated + השוואה ל-baseline
+    python benchmarks/replay.py --update-baseline        # שמירת התוצאות כ-baseline חדש
+    python benchmarks/replay.py --only facebook_collector
+
+טוקנים (access_token, key, טוקן הבוט) לא נשמרים ב-fixtures.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import base64
+import argparse
+import tempfile
+import importlib
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from run_telemetry import endpoint_name
+
+# --- הגדרות ---
+FIXTURES_DIR = os.path.join(ROOT, 'benchmarks', 'fixtures')
+BASELINE_FILE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+# פרמטרים שלא נכנסים למפתח ה-fixture ולא נשמרים
+SECRET_PARAMS = {'access_token', 'key', 'appsecret_proof', 'input_token'}
+# פרמטרים שתלויים בשעת הריצה - לא נכנסים למפתח כדי שה-replay יעבוד גם בימים אחרים
+TIME_PARAMS = {'since', 'until', 'publishedAfter'}
+SECRET_PATTERN = re.compile(r'((?:access_token|key|appsecret_proof)=)[^&"\s]+')
+BOT_TOKEN_PATTERN = re.compile(r'/bot[^/]+/')
+# קריאות שהספריות עושות ברקע (thread של google-auth) - מוגשות ונשמרות, אבל לא נספרות:
+# הן לא מהקוד שלנו, ונופלות על נקודת הכניסה שרצה כשהן מסתיימות
+UNCOUNTED_HOSTS = {'iamcredentials.googleapis.com'}
+# סטייה מותרת מה-baseline בזמן ובזיכרון (קריאות HTTP חייבות להיות זהות או פחות)
+TOLERANCE = 0.25
+# ועוד שנייה בזמן - בנקודות כניסה קצרות הזמן משתנה ביותר מ-25% בין ריצות
+TOLERANCE_SEC = 1.0
+# ועוד 8MB בזיכרון - אתחול עצל של ספריות (google-genai) נופל על נקודת הכניסה הראשונה שמשתמשת בהן
+TOLERANCE_MB = 8
+# תקציב הריצה היומית (כל נקודות הכניסה של daily_update)
+DAILY_BUDGET_SEC = 300
+DAILY_ENTRY_POINTS = ['followers_tracker', 'youtube_collector', 'facebook_collector',
+                      'instagram_collector', 'telegram_reporter']
+
+# ערכי סביבה ל-replay - המודולים קוראים חלק מהם בזמן import
+REPLAY_ENV = {
+    'FACEBOOK_TOKEN': 'replay',
+    'FACEBOOK_PAGE_ID': '220634478361516',
+    'YOUTUBE_API_KEY': 'replay',
+    'GEMINI_API_KEY': 'replay',
+    'TELEGRAM_TOKEN': 'replay',
+    'TELEGRAM_CHAT_ID': '0',
+    'GEMINI_FORCE_REFRESH': '1',
+    'TELEGRAM_EDIT_INTERVAL_SEC': '0',
+}
+# המצב המקומי של נקודות הכניסה - בתיקייה זמנית, כדי שיומן או cache מריצה קודמת לא ישנו את הקריאות
+STATE_ENV = {
+    'CHECKPOINT_DIR': 'checkpoints',
+    'SHEET_JOURNAL_DIR': 'sheet_journal',
+    'GEMINI_CACHE_DIR': 'gemini_cache',
+    'FOLLOWERS_INDEX_FILE': 'followers_index.json',
+    'TELEMETRY_DIR': 'telemetry',
+    'PROFILE_DIR': 'profile',
+}
+# התרחיש של --simulate: פוסטים (ומדיות) בסימולטור, על פני ימים
+SIMULATED_POSTS = 50
+SIMULATED_DAYS = 7
+
+
+def dummy_service_account():
+    """service account עם מפתח RSA חד-פעמי - מספיק כדי שהספריות יחתמו בקשת טוקן שתוגש מה-fixture"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption()).decode('ascii')
+    return json.dumps({
+        'type': 'service_account',
+        'project_id': 'replay',
+        'private_key_id': 'replay',
+        'private_key': pem,
+        'client_email': 'replay@replay.iam.gserviceaccount.com',
+        'client_id': '0',
+        'token_uri': 'https://oauth2.googleapis.com/token',
+    })
+
+
+def freeze_clock(recorded_at):
+    """
+    datetime.now / today / utcnow של מודולי הפרויקט (שמייבאים `from datetime import datetime`)
+    מחזירים את recorded_at. ספריות (google-auth וכו') ו-time.time לא מושפעים.
+    """
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            moment = recorded_at.astimezone(tz) if tz else recorded_at.astimezone().replace(tzinfo=None)
+            return cls.combine(moment.date(), moment.timetz())
+
+        @classmethod
+        def today(cls):
+            return cls.now()
+
+        @classmethod
+        def utcnow(cls):
+            return cls.now(timezone.utc).replace(tzinfo=None)
+
+    frozen = []
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None) or ''
+        if os.path.dirname(os.path.abspath(path)) == ROOT and getattr(module, 'datetime', None) is datetime:
+            module.datetime = FrozenDatetime
+            frozen.append(module.__name__)
+    return frozen
+
+
+def _run_youtube():
+    module = importlib.import_module('youtube_collector')
+    videos = module.fetch_videos()
+    if not videos.empty:
+        module.update_google_sheet(videos)
+
+
+ENTRY_POINTS = {
+    'followers_tracker': lambda: importlib.import_module('followers_tracker').main(),
+    'youtube_collector': _run_youtube,
+    'facebook_collector': lambda: importlib.import_module('facebook_collector').main(),
+    'instagram_collector': lambda: importlib.import_module('instagram_collector').main(),
+    'telegram_reporter': lambda: importlib.import_module('telegram_reporter').generate_unified_report(),
+    'weekly_reporter': lambda: importlib.import_module('weekly_reporter').main(),
+}
+
+
+def fixture_key(method, url):
+    """מפתח ל-fixture: method + כתובת + query בלי סודות (גוף הבקשה לא נכלל)"""
+    parts = urlsplit(url)
+    ignored = SECRET_PARAMS | TIME_PARAMS
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in ignored)
+    path = BOT_TOKEN_PATTERN.sub('/bot{token}/', parts.path)
+    return f"{method} {parts.netloc}{path}?{urlencode(query)}"
+
+
+def scrub(text):
+    """הסרת טוקנים מתוך גוף תשובה (למשל paging.next של Graph)"""
+    text = SECRET_PATTERN.sub(r'\1REDACTED', text)
+    return re.sub(r'("(?:access_token|id_token|refresh_token)"\s*:\s*")[^"]*"', r'\1REDACTED"', text)
+
+
+class HttpTap:
+    """
+    יירוט HTTP משותף לשלוש הספריות.
+    replay: כל מפתח מחזיק רשימת תשובות שמוגשות לפי הסדר (האחרונה חוזרת אם נגמרו).
+    המפתחות נשמרים לכל נקודת כניסה בנפרד (scope), כך ש---only מקבל בדיוק את מה שהוקלט לה.
+    upstream - בהקלטה: פונקציה (method, url, body) -> (status, content_type, content) במקום הרשת
+    """
+
+    def __init__(self, mode, fixtures=None, upstream=None):
+        self.mode = mode
+        self.fixtures = fixtures if fixtures is not None else {}
+        self.upstream = upstream
+        self.positions = Counter()
+        self.scope = ''
+        self.calls = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.missing = Counter()
+        self._originals = []
+
+    def reset_stats(self):
+        self.calls = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.missing = Counter()
+
+    def _account(self, method, url, body, content):
+        if urlsplit(url).netloc in UNCOUNTED_HOSTS:
+            return
+        self.calls[endpoint_name(method, url)] += 1
+        if body:
+            self.bytes_sent += len(body if isinstance(body, (bytes, bytearray)) else str(body).encode('utf-8'))
+        self.bytes_received += len(content or b'')
+
+    def key(self, method, url):
+        return f"{self.scope}: {fixture_key(method, url)}"
+
+    def record(self, method, url, status, headers, content):
+        content_type = headers.get('content-type', '') if headers else ''
+        try:
+            body = {'body': scrub(content.decode('utf-8'))}
+        except UnicodeDecodeError:
+            body = {'body_b64': base64.b64encode(content).decode('ascii')}
+        self.fixtures.setdefault(self.key(method, url), []).append(
+            dict(status=status, content_type=content_type, **body)
+        )
+
+    def lookup(self, method, url):
+        """(status, content_type, content) מה-fixture, או 599 אם אין הקלטה"""
+        key = self.key(method, url)
+        responses = self.fixtures.get(key)
+        if not responses:
+            self.missing[key] += 1
+            return 599, 'application/json', b'{"error": {"message": "no recorded fixture"}}'
+        entry = responses[min(self.positions[key], len(responses) - 1)]
+        self.positions[key] += 1
+        if 'body_b64' in entry:
+            content = base64.b64decode(entry['body_b64'])
+        else:
+            content = entry['body'].encode('utf-8')
+        return entry['status'], entry.get('content_type', ''), content
+
+    def serve(self, method, url, body):
+        """תשובה בלי רשת: מ-upstream (ונרשמת ל-fixtures) בהקלטה, או מה-fixture ב-replay"""
+        if self.mode == 'record':
+            status, content_type, content = self.upstream(method, url, body)
+            self.record(method, url, status, {'content-type': content_type}, content)
+            return status, content_type, content
+        return self.lookup(method, url)
+
+    @property
+    def live(self):
+        return self.mode == 'record' and self.upstream is None
+
+    # --- יירוט לכל ספרייה ---
+
+    def _patch(self, owner, name, replacement):
+        self._originals.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, replacement)
+
+    def install(self):
+        tap = self
+
+        import requests
+        original_send = requests.Session.send
+
+        def requests_send(session, request, **kwargs):
+            if tap.live:
+                response = original_send(session, request, **kwargs)
+                tap.record(request.method, request.url, response.status_code, response.headers, response.content)
+            else:
+                status, content_type, content = tap.serve(request.method, request.url, request.body)
+                response = requests.Response()
+                response.status_code = status
+                response._content = content
+                response.headers['content-type'] = content_type
+                response.url = request.url
+                response.request = request
+                response.encoding = 'utf-8'
+            tap._account(request.method, request.url, request.body, response.content)
+            return response
+
+        self._patch(requests.Session, 'send', requests_send)
+
+        try:
+            import httplib2
+        except ImportError:
+            httplib2 = None
+        if httplib2:
+            original_request = httplib2.Http.request
+
+            def httplib2_request(http, uri, method='GET', body=None, headers=None, *args, **kwargs):
+                if tap.live:
+                    response, content = original_request(http, uri, method, body, headers, *args, **kwargs)
+                    tap.record(method, uri, response.status, response, content)
+                else:
+                    status, content_type, content = tap.serve(method, uri, body)
+                    response = httplib2.Response({'status': status, 'content-type': content_type})
+                tap._account(method, uri, body, content)
+                return response, content
+
+            self._patch(httplib2.Http, 'request', httplib2_request)
+
+        try:
+            import httpx
+        except ImportError:
+            httpx = None
+        if httpx:
+            original_httpx_send = httpx.Client.send
+
+            def httpx_send(client, request, **kwargs):
+                url = str(request.url)
+                body = request.read()
+                if tap.live:
+                    response = original_httpx_send(client, request, **kwargs)
+                    content = response.read()
+                    tap.record(request.method, url, response.status_code, response.headers, content)
+                else:
+                    status, content_type, content = tap.serve(request.method, url, body)
+                    response = httpx.Response(status, headers={'content-type': content_type},
+                                              content=content, request=request)
+                tap._account(request.method, url, body, content)
+                return response
+
+            self._patch(httpx.Client, 'send', httpx_send)
+
+    def uninstall(self):
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
+
+
+def run_entry_point(name, tap):
+    """הרצת נקודת כניסה אחת ומדידה - מחזיר dict של תוצאות"""
+    tap.reset_stats()
+    tap.scope = name
+    tracemalloc.start()
+    started = time.perf_counter()
+    error = None
+    try:
+        ENTRY_POINTS[name]()
+    except SystemExit:
+        pass
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'wall_sec': round(wall, 3),
+        'total_calls': sum(tap.calls.values()),
+        'calls': dict(sorted(tap.calls.items())),
+        'bytes_sent': tap.bytes_sent,
+        'bytes_received': tap.bytes_received,
+        'peak_mb': round(peak / 1024 / 1024, 2),
+    }
+    if error:
+        result['error'] = error
+    if tap.missing:
+        result['missing_fixtures'] = dict(tap.missing)
+    return result
+
+
+def compare_to_baseline(name, result, baseline):
+    """רשימת רגרסיות מול ה-baseline של נקודת הכניסה"""
+    if not baseline:
+        return []
+    regressions = []
+    for endpoint, count in result['calls'].items():
+        before = baseline.get('calls', {}).get(endpoint, 0)
+        if count > before:
+            regressions.append(f"{endpoint}: {before} -> {count} calls")
+    for metric, slack in (('wall_sec', TOLERANCE_SEC), ('peak_mb', TOLERANCE_MB)):
+        before = baseline.get(metric)
+        if before and result[metric] > before * (1 + TOLERANCE) + slack:
+            regressions.append(f"{metric}: {before} -> {result[metric]}")
+    return regressions
+
+
+def print_result(name, result, regressions):
+    icon = '❌' if regressions or result.get('error') else '✅'
+    print(f"\n{icon} {name}: {result['wall_sec']:.2f}s | {result['total_calls']} calls | "
+          f"{result['bytes_sent']:,} B sent | {result['bytes_received']:,} B received | peak {result['peak_mb']} MB")
+    for endpoint, count in result['calls'].items():
+        print(f"   {count:>5}  {endpoint}")
+    if result.get('error'):
+        print(f"   ⚠️ {result['error']}")
+    for key, count in result.get('missing_fixtures', {}).items():
+        print(f"   ⚠️ missing fixture ({count}x): {key}")
+    for regression in regressions:
+        print(f"   📈 regression: {regression}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay benchmark with HTTP call accounting")
+    parser.add_argument('--record', action='store_true', help="call the real APIs and save fixtures")
+    parser.add_argument('--simulate', action='store_true',
+                        help="with --record: record against graph_simulator and stub_services instead of the real APIs")
+    parser.add_argument('--scenario', default='simulated', help="fixture set name")
+    parser.add_argument('--only', action='append', choices=sorted(ENTRY_POINTS), help="run only these entry points")
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    if args.simulate and not args.record:
+        parser.error("--simulate records a scenario - use it with --record")
+
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    fixture_file = os.path.join(FIXTURES_DIR, f"{args.scenario}.json")
+    fixtures = {}
+    recorded_at = datetime.now(timezone.utc).replace(microsecond=0)
+    if not args.record:
+        if not os.path.exists(fixture_file):
+            print(f"❌ No fixtures at {fixture_file} - record them first with --record")
+            return 1
+        with open(fixture_file, encoding='utf-8') as f:
+            stored = json.load(f)
+        if 'recorded_at' not in stored:
+            print(f"❌ {fixture_file} has no recorded_at - record it again with --record")
+            return 1
+        recorded_at = datetime.fromisoformat(stored['recorded_at'])
+        fixtures = stored['responses']
+    if not args.record or args.simulate:
+        # ההקלטה המדומה רצה עם אותה סביבה כמו ה-replay, כדי שהמפתחות יהיו זהים
+        for key, value in REPLAY_ENV.items():
+            os.environ[key] = value if args.simulate else os.environ.get(key, value)
+        if args.simulate or 'GCP_SERVICE_ACCOUNT' not in os.environ:
+            os.environ['GCP_SERVICE_ACCOUNT'] = dummy_service_account()
+    state_dir = tempfile.mkdtemp(prefix='replay-state-')
+    for key, name in STATE_ENV.items():
+        os.environ[key] = os.path.join(state_dir, name)
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding='utf-8') as f:
+            baseline = json.load(f).get(args.scenario, {})
+
+    # הארגומנטים של ה-harness לא צריכים להגיע לנקודות הכניסה
+    sys.argv = sys.argv[:1]
+    services = None
+    if args.simulate:
+        from stub_services import StubServices
+        services = StubServices(SIMULATED_POSTS, SIMULATED_DAYS)
+        print(f"🧪 Recording against graph_simulator ({SIMULATED_POSTS} posts over {SIMULATED_DAYS} days) "
+              f"and stub services")
+    tap = HttpTap('record' if args.record else 'replay', fixtures, services.respond if services else None)
+    tap.install()
+    results = {}
+    failed = False
+    names = args.only or list(ENTRY_POINTS)
+    try:
+        # imports מראש (אחרי הגדרת הסביבה) - אחרת הזמן והזיכרון שלהם נופלים על נקודת הכניסה
+        # הראשונה שמייבאת כל מודול, והתוצאות תלויות בסדר ובבחירת --only
+        for name in names:
+            importlib.import_module(name)
+        frozen = freeze_clock(recorded_at)
+        print(f"🕰️ Clock frozen at {recorded_at.isoformat()} in {len(frozen)} modules")
+        for name in names:
+            print(f"\n▶️ {name}")
+            result = run_entry_point(name, tap)
+            regressions = [] if args.record else compare_to_baseline(name, result, baseline.get(name))
+            print_result(name, result, regressions)
+            failed = failed or bool(regressions) or 'error' in result
+            results[name] = result
+    finally:
+        tap.uninstall()
+        if services:
+            services.close()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    daily = sum(results[name]['wall_sec'] for name in DAILY_ENTRY_POINTS if name in results)
+    print(f"\n⏱️ Daily run entry points: {daily:.1f}s (budget {DAILY_BUDGET_SEC}s)")
+    failed = failed or daily > DAILY_BUDGET_SEC
+
+    if args.record:
+        with open(fixture_file, 'w', encoding='utf-8') as f:
+            json.dump({'recorded_at': recorded_at.isoformat(), 'responses': fixtures}, f, ensure_ascii=False, indent=1)
+        print(f"💾 Saved {sum(len(v) for v in fixtures.values())} responses to {fixture_file}")
+
+    if args.update_baseline:
+        stored = {}
+        if os.path.exists(BASELINE_FILE):
+            with open(BASELINE_FILE, encoding='utf-8') as f:
+                stored = json.load(f)
+        stored[args.scenario] = dict(baseline, **results)
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(stored, f, ensure_ascii=False, indent=2)
+        print(f"💾 Baseline updated: {BASELINE_FILE}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
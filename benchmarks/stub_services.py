@@ -0,0 +1,458 @@
+"""
+Stub Services - השירותים החיצוניים בזיכרון, להקלטת תרחיש replay בלי מפתחות אמיתיים
+(replay.py --record --simulate). Graph מוגש מ-graph_simulator (SyntheticGraph), ושאר
+השירותים עונים מכאן:
+- OAuth - טוקן קבוע (ובדיקת ה-Regional Access Boundary של google-auth - בלי הגבלה)
+- Sheets - spreadsheets עם מצב (קריאה, update, batchUpdate, append, clear, addSheet),
+  כך שהדוח קורא את מה שה-collectors כתבו באותה הקלטה
+- YouTube Data API - ערוץ עם VIDEOS סרטונים סינתטיים על 30 הימים האחרונים
+- Gemini - דוח JSON לפי REPORT_SCHEMA (או טקסט חופשי), count_tokens ו-context cache
+- Telegram - sendMessage / editMessageText עם מזהי הודעות עוקבים
+
+שימוש:
+    services = StubServices(posts=50, days=7)
+    status, content_type, content = services.respond('GET', url, body)
+    services.close()
+"""
+
+import os
+import re
+import sys
+import json
+import random
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, parse_qs, parse_qsl, unquote
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from graph_simulator import PAGE_ID, SyntheticGraph, start_simulator
+
+# --- הגדרות ---
+GRAPH_BASE = 'https://graph.facebook.com'
+CHANNEL_ID = 'UCreplay0000000000000000'
+UPLOADS_ID = 'UUreplay0000000000000000'
+VIDEOS = 60
+# הגיליון הראשון בכל spreadsheet (youtube_collector נופל אליו כשהגיליון שלו חסר)
+FIRST_SHEET = 'נתוני יוטיוב'
+PLAYLIST_PAGE = 50
+JSON_TYPE = 'application/json; charset=UTF-8'
+
+
+def _json(data, status=200):
+    return status, JSON_TYPE, json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def _error(status, message):
+    return _json({'error': {'code': status, 'message': message, 'status': 'NOT_FOUND'}}, status)
+
+
+# --- Sheets ---
+
+def _column_number(letters):
+    number = 0
+    for char in letters:
+        number = number * 26 + ord(char) - ord('A') + 1
+    return number
+
+
+def _formatted(value):
+    """ערך כפי ש-Sheets מחזיר ב-FORMATTED_VALUE"""
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class FakeSheet:
+    def __init__(self, sheet_id, title, index, rows=1000, cols=26):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.index = index
+        self.rows = rows
+        self.cols = cols
+        self.values = []
+
+    def properties(self):
+        return {'sheetId': self.sheet_id, 'title': self.title, 'index': self.index, 'sheetType': 'GRID',
+                'gridProperties': {'rowCount': self.rows, 'columnCount': self.cols}}
+
+    def bounds(self, ref):
+        """(שורה ראשונה, עמודה ראשונה, שורה אחרונה, עמודה אחרונה) מ-A1 / A1:B2 / A:B / 1:5 / A2:A"""
+        if not ref:
+            return 1, 1, self.rows, self.cols
+        start, _, end = ref.partition(':')
+        start_col, start_row = re.fullmatch(r'([A-Z]*)(\d*)', start.upper()).groups()
+        if not end:
+            end_col, end_row = start_col, start_row
+        else:
+            end_col, end_row = re.fullmatch(r'([A-Z]*)(\d*)', end.upper()).groups()
+        return (int(start_row or 1), _column_number(start_col) if start_col else 1,
+                int(end_row) if end_row else max(self.rows, len(self.values)),
+                _column_number(end_col) if end_col else max(self.cols, 1))
+
+    def read(self, ref, formatted):
+        top, left, bottom, right = self.bounds(ref)
+        rows = []
+        for row in self.values[top - 1:bottom]:
+            cells = row[left - 1:right]
+            while cells and cells[-1] in ('', None):
+                cells.pop()
+            rows.append([_formatted(value) if formatted else value for value in cells])
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def write(self, ref, values):
+        top, left, _, _ = self.bounds(ref)
+        for offset, row in enumerate(values):
+            number = top + offset
+            while len(self.values) < number:
+                self.values.append([])
+            target = self.values[number - 1]
+            while len(target) < left - 1 + len(row):
+                target.append('')
+            target[left - 1:left - 1 + len(row)] = list(row)
+        self.rows = max(self.rows, len(self.values))
+        self.cols = max([self.cols] + [len(row) for row in self.values])
+        width = max((len(row) for row in values), default=0)
+        return {'updatedRange': f"'{self.title}'!{ref}", 'updatedRows': len(values),
+                'updatedColumns': width, 'updatedCells': sum(len(row) for row in values)}
+
+    def clear(self, ref):
+        top, left, bottom, right = self.bounds(ref)
+        for row in self.values[top - 1:bottom]:
+            for col in range(left - 1, min(right, len(row))):
+                row[col] = ''
+
+    def append(self, ref, values, insert_rows):
+        # הטבלה שמתחילה ב-ref נגמרת בשורה הלא-ריקה האחרונה; INSERT_ROWS דוחף את מה שאחריה
+        last = max((number for number, row in enumerate(self.values, start=1) if any(cell != '' for cell in row)),
+                   default=0)
+        if insert_rows:
+            self.values[last:last] = [[] for _ in values]
+        result = self.write(f"A{last + 1}", values)
+        return {'tableRange': f"'{self.title}'!A1", 'updates': result}
+
+
+class FakeSheets:
+    """spreadsheets בזיכרון - כל id חדש נוצר בפנייה הראשונה, עם גיליון ריק אחד (first_sheet)"""
+
+    def __init__(self, first_sheet=FIRST_SHEET):
+        self.first_sheet = first_sheet
+        self.spreadsheets = {}
+        self.lock = threading.Lock()
+
+    def _spreadsheet(self, spreadsheet_id):
+        if spreadsheet_id not in self.spreadsheets:
+            self.spreadsheets[spreadsheet_id] = [FakeSheet(0, self.first_sheet, 0)]
+        return self.spreadsheets[spreadsheet_id]
+
+    def _sheet(self, sheets, name):
+        if not name:
+            return sheets[0]
+        for sheet in sheets:
+            if sheet.title == name:
+                return sheet
+        return None
+
+    def _split_range(self, sheets, range_name):
+        """'שם'!A1:B2 -> (sheet, 'A1:B2'); בלי שם - הגיליון הראשון; שם בלבד - כל הגיליון"""
+        range_name = unquote(range_name)
+        if '!' in range_name:
+            name, _, ref = range_name.rpartition('!')
+        elif self._sheet(sheets, range_name.strip("'")):
+            name, ref = range_name, ''
+        else:
+            name, ref = '', range_name
+        return self._sheet(sheets, name.strip("'").replace("''", "'")), ref
+
+    def metadata(self, spreadsheet_id, sheets):
+        return {'spreadsheetId': spreadsheet_id,
+                'properties': {'title': 'Replay', 'locale': 'iw_IL', 'timeZone': 'Asia/Jerusalem'},
+                'sheets': [{'properties': sheet.properties()} for sheet in sheets]}
+
+    def respond(self, method, path, query, body):
+        with self.lock:
+            return self._respond(method, path, query, body)
+
+    def _respond(self, method, path, query, body):
+        match = re.match(r'/v4/spreadsheets/([^/:]+)(.*)', path)
+        if not match:
+            return _error(404, f"unknown Sheets path {path}")
+        spreadsheet_id, rest = match.groups()
+        sheets = self._spreadsheet(spreadsheet_id)
+        formatted = query.get('valueRenderOption', ['FORMATTED_VALUE'])[0] == 'FORMATTED_VALUE'
+
+        if rest == '' and method == 'GET':
+            return _json(self.metadata(spreadsheet_id, sheets))
+        if rest == ':batchUpdate':
+            replies = []
+            for request in body.get('requests', []):
+                if 'addSheet' in request:
+                    props = request['addSheet'].get('properties', {})
+                    grid = props.get('gridProperties', {})
+                    sheet = FakeSheet(max(s.sheet_id for s in sheets) + 1, props['title'], len(sheets),
+                                      grid.get('rowCount', 1000), grid.get('columnCount', 26))
+                    sheets.append(sheet)
+                    replies.append({'addSheet': {'properties': sheet.properties()}})
+                else:
+                    replies.append({})
+            return _json({'spreadsheetId': spreadsheet_id, 'replies': replies})
+        if rest == '/values:batchGet':
+            value_ranges = []
+            for range_name in query.get('ranges', []):
+                sheet, ref = self._split_range(sheets, range_name)
+                if sheet is None:
+                    return _error(400, f"Unable to parse range: {range_name}")
+                value_ranges.append({'range': range_name, 'majorDimension': 'ROWS',
+                                     'values': sheet.read(ref, formatted)})
+            return _json({'spreadsheetId': spreadsheet_id, 'valueRanges': value_ranges})
+        if rest == '/values:batchUpdate':
+            responses = []
+            for data in body.get('data', []):
+                sheet, ref = self._split_range(sheets, data['range'])
+                if sheet is None:
+                    return _error(400, f"Unable to parse range: {data['range']}")
+                responses.append(sheet.write(ref or 'A1', data.get('values', [])))
+            return _json({'spreadsheetId': spreadsheet_id, 'totalUpdatedRows': sum(r['updatedRows'] for r in responses),
+                          'responses': responses})
+        if rest == '/values:batchClear':
+            for range_name in body.get('ranges', []):
+                sheet, ref = self._split_range(sheets, range_name)
+                if sheet is not None:
+                    sheet.clear(ref)
+            return _json({'spreadsheetId': spreadsheet_id, 'clearedRanges': body.get('ranges', [])})
+
+        match = re.match(r'/values/([^:]+)(:append|:clear)?$', rest)
+        if not match:
+            return _error(404, f"unknown Sheets path {path}")
+        range_name, action = match.groups()
+        sheet, ref = self._split_range(sheets, range_name)
+        if sheet is None:
+            return _error(400, f"Unable to parse range: {unquote(range_name)}")
+        if action == ':append':
+            insert_rows = query.get('insertDataOption', ['OVERWRITE'])[0] == 'INSERT_ROWS'
+            return _json(dict(spreadsheetId=spreadsheet_id, **sheet.append(ref, body.get('values', []), insert_rows)))
+        if action == ':clear':
+            sheet.clear(ref)
+            return _json({'spreadsheetId': spreadsheet_id, 'clearedRange': unquote(range_name)})
+        if method == 'PUT':
+            return _json(dict(spreadsheetId=spreadsheet_id, **sheet.write(ref or 'A1', body.get('values', []))))
+        return _json({'range': unquote(range_name), 'majorDimension': 'ROWS', 'values': sheet.read(ref, formatted)})
+
+
+# --- YouTube ---
+
+class FakeYouTube:
+    """ערוץ עם VIDEOS סרטונים על 30 הימים האחרונים (החדש ראשון)"""
+
+    def __init__(self, seed=0, videos=VIDEOS):
+        rng = random.Random(seed)
+        now = datetime.now(timezone.utc)
+        stamps = sorted((now - timedelta(seconds=rng.uniform(600, 29 * 86400)) for _ in range(videos)), reverse=True)
+        self.videos = []
+        for index, published in enumerate(stamps):
+            short = rng.random() < 0.4
+            views = int(rng.lognormvariate(8, 1.3))
+            self.videos.append({
+                'id': f"vid{index:05d}",
+                'published': published.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'title': f"סרטון סינתטי מספר {index}",
+                'duration': f"PT{rng.randint(15, 59)}S" if short else f"PT{rng.randint(2, 40)}M{rng.randint(0, 59)}S",
+                'views': views,
+                'likes': int(views * rng.uniform(0.01, 0.06)),
+                'comments': int(views * rng.uniform(0.001, 0.01)),
+            })
+        self.by_id = {video['id']: video for video in self.videos}
+
+    def respond(self, resource, query):
+        if resource == 'channels':
+            return _json({'items': [{
+                'id': CHANNEL_ID,
+                'snippet': {'title': 'Replay Channel'},
+                'contentDetails': {'relatedPlaylists': {'uploads': UPLOADS_ID}},
+                'statistics': {'subscriberCount': '185000', 'viewCount': '90000000',
+                               'videoCount': str(len(self.videos))},
+            }]})
+        if resource == 'playlistItems':
+            start = int(query.get('pageToken', ['0'])[0])
+            page = self.videos[start:start + PLAYLIST_PAGE]
+            data = {'items': [{'contentDetails': {'videoId': video['id'], 'videoPublishedAt': video['published']},
+                               'snippet': {'title': video['title'], 'publishedAt': video['published']}}
+                              for video in page]}
+            if start + PLAYLIST_PAGE < len(self.videos):
+                data['nextPageToken'] = str(start + PLAYLIST_PAGE)
+            return _json(data)
+        if resource == 'videos':
+            ids = query.get('id', [''])[0].split(',')
+            return _json({'items': [self._video(self.by_id[video_id]) for video_id in ids if video_id in self.by_id]})
+        return _error(404, f"unknown YouTube resource {resource}")
+
+    def _video(self, video):
+        return {
+            'id': video['id'],
+            'snippet': {
+                'publishedAt': video['published'], 'title': video['title'], 'description': 'תיאור סינתטי',
+                'thumbnails': {'high': {'url': f"https://i.ytimg.com/vi/{video['id']}/hqdefault.jpg"}},
+                'tags': ['חדשות', 'בדיקה'],
+            },
+            'contentDetails': {'duration': video['duration']},
+            'statistics': {'viewCount': str(video['views']), 'likeCount': str(video['likes']),
+                           'commentCount': str(video['comments'])},
+            'topicDetails': {},
+        }
+
+
+# --- Gemini ---
+
+class FakeGemini:
+    def __init__(self):
+        self.caches = {}
+
+    def respond(self, method, path, body):
+        if path.endswith(':countTokens'):
+            return _json({'totalTokens': len(json.dumps(body, ensure_ascii=False)) // 4 + 1})
+        if '/cachedContents' in path:
+            return self._cache(method, path, body)
+        match = re.search(r'/models/([^/:]+):(generateContent|streamGenerateContent)$', path)
+        if not match:
+            return _error(404, f"unknown Gemini path {path}")
+        model, action = match.groups()
+        config = body.get('generationConfig') or {}
+        text = self._report() if config.get('responseMimeType') == 'application/json' else self._text(body)
+        response = {
+            'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finishReason': 'STOP',
+                            'index': 0}],
+            'usageMetadata': {'promptTokenCount': len(json.dumps(body, ensure_ascii=False)) // 4,
+                              'candidatesTokenCount': len(text) // 4,
+                              'totalTokenCount': (len(json.dumps(body, ensure_ascii=False)) + len(text)) // 4},
+            'modelVersion': model,
+        }
+        if action == 'generateContent':
+            return _json(response)
+        # streaming (alt=sse): התשובה בשני חלקים
+        half = len(text) // 2
+        events = []
+        for part in (text[:half], text[half:]):
+            chunk = dict(response, candidates=[{'content': {'parts': [{'text': part}], 'role': 'model'}, 'index': 0}])
+            events.append(f"data: {json.dumps(chunk, ensure_ascii=False)}\r\n\r\n")
+        return 200, 'text/event-stream', ''.join(events).encode('utf-8')
+
+    def _report(self):
+        return json.dumps({
+            'headline': 'יום יציב עם מוביל ברור בפייסבוק',
+            'sections': [
+                {'platform': 'youtube', 'leaders': ['Y1', 'Y2'], 'insight': 'השורטס מובילים בצפיות'},
+                {'platform': 'facebook', 'leaders': ['F1', 'F2', 'F3'], 'insight': 'הרילס מביאים את רוב ה-reach'},
+                {'platform': 'instagram', 'leaders': ['I1', 'I2'], 'insight': 'שמירות גבוהות בקרוסלות'},
+            ],
+            'insights': [
+                {'emoji': '🎬', 'text': 'וידאו קצר מוביל בכל הפלטפורמות'},
+                {'emoji': '⏰', 'text': 'פרסומי הבוקר מקבלים את רוב החשיפה'},
+                {'emoji': '🔁', 'text': 'אותו סיפור הצליח בפייסבוק ובאינסטגרם'},
+            ],
+        }, ensure_ascii=False)
+
+    def _text(self, body):
+        return ("🏆 ההצלחה של השבוע\n━━━━━━━━━━━━━━━\nדוח סינתטי לבדיקת replay.\n\n"
+                "🔥 3 תובנות חוצות פלטפורמות\n━━━━━━━━━━━━━━━\n"
+                "• 🎬 וידאו קצר מוביל\n• ⏰ הבוקר חזק\n• 🔁 סיפור אחד בכל הפלטפורמות")
+
+    def _cache(self, method, path, body):
+        expire = (datetime.now(timezone.utc) + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%S.000000Z')
+        if method == 'GET' and path.endswith('/cachedContents'):
+            return _json({'cachedContents': list(self.caches.values())})
+        if method == 'POST':
+            name = f"cachedContents/replay{len(self.caches) + 1}"
+            self.caches[name] = {'name': name, 'model': body.get('model', ''),
+                                 'displayName': body.get('displayName', ''), 'expireTime': expire}
+            return _json(self.caches[name])
+        name = path[path.index('cachedContents/'):]
+        if name not in self.caches:
+            return _error(404, f"{name} not found")
+        if method == 'DELETE':
+            del self.caches[name]
+            return _json({})
+        self.caches[name]['expireTime'] = expire
+        return _json(self.caches[name])
+
+
+# --- Telegram ---
+
+class FakeTelegram:
+    def __init__(self):
+        self.message_id = 0
+
+    def respond(self, method_name, body):
+        if method_name in ('sendMessage', 'editMessageText'):
+            if method_name == 'sendMessage':
+                self.message_id += 1
+            message_id = body.get('message_id', self.message_id)
+            return _json({'ok': True, 'result': {
+                'message_id': message_id, 'date': 0, 'text': body.get('text', ''),
+                'chat': {'id': body.get('chat_id', 0), 'type': 'private'},
+            }})
+        return _json({'ok': True, 'result': True})
+
+
+class StubServices:
+    """נקודת כניסה אחת לכל השירותים: respond(method, url, body) -> (status, content_type, content)"""
+
+    def __init__(self, posts=50, days=7, seed=0, page_id=PAGE_ID):
+        self.graph = start_simulator(SyntheticGraph(posts, days, seed=seed, page_id=page_id), latency_ms=0)
+        self.sheets = FakeSheets()
+        self.youtube = FakeYouTube(seed)
+        self.gemini = FakeGemini()
+        self.telegram = FakeTelegram()
+
+    def close(self):
+        self.graph.shutdown()
+
+    def respond(self, method, url, body=None):
+        parts = urlsplit(url)
+        query = parse_qs(parts.query, keep_blank_values=True)
+        if isinstance(body, (bytes, bytearray)):
+            body = body.decode('utf-8')
+        host = parts.netloc
+
+        if url.startswith(GRAPH_BASE):
+            return self._graph(method, url, body)
+        if host in ('oauth2.googleapis.com', 'accounts.google.com') or parts.path.endswith('/token'):
+            return _json({'access_token': 'replay', 'expires_in': 3600, 'token_type': 'Bearer'})
+        if host == 'iamcredentials.googleapis.com' and parts.path.endswith('/allowedLocations'):
+            return _json({'locations': [], 'encodedLocations': '0x0'})
+        if host == 'sheets.googleapis.com':
+            return self.sheets.respond(method, parts.path, query, self._json_body(body))
+        if '/youtube/v3/' in parts.path:
+            return self.youtube.respond(parts.path.rsplit('/', 1)[-1], query)
+        if host == 'generativelanguage.googleapis.com':
+            return self.gemini.respond(method, parts.path, self._json_body(body))
+        if host == 'api.telegram.org':
+            return self.telegram.respond(parts.path.rsplit('/', 1)[-1], self._json_body(body))
+        return _error(404, f"no stub for {host}")
+
+    def _json_body(self, body):
+        if not body:
+            return {}
+        try:
+            return json.loads(body)
+        except ValueError:
+            return {key: value for key, value in parse_qsl(body)}
+
+    def _graph(self, method, url, body):
+        """הפניה לסימולטור; כתובות ה-paging בתשובה חוזרות ל-graph.facebook.com"""
+        target = self.graph.base_url + url[len(GRAPH_BASE):]
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        request = urllib.request.Request(target, data=data, method=method)
+        if data:
+            request.add_header('Content-Type', 'application/x-www-form-urlencoded')
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, content_type, content = response.status, response.headers.get('Content-Type', ''), response.read()
+        except urllib.error.HTTPError as e:
+            status, content_type, content = e.code, e.headers.get('Content-Type', ''), e.read()
+        return status, content_type, content.replace(self.graph.base_url.encode('ascii'), GRAPH_BASE.encode('ascii'))
@@ -0,0 +1,210 @@
+"""
+Synthetic Data - טבלאות סינתטיות בסכמות של הגיליונות (יוטיוב, פייסבוק, אינסטגרם, עוקבים)
+הערכים נראים כמו מה ש-get_all_records מחזיר: מספרים כמספרים, מזהים מספריים של אינסטגרם
+כ-int, תאריכים כמחרוזות YYYY-MM-DD, וההתפלגויות עקביות (reach > views > likes > comments).
+
+שימוש:
+    from synthetic_data import make_sheet_frame, make_collector_batch
+    existing = make_sheet_frame('facebook', 100_000)
+    new = make_collector_batch('facebook', existing, rows=500)
+"""
+
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+# --- הגדרות ---
+DAYS = 365
+END_DATE = date.today()
+PLATFORM_TYPES = {
+    'youtube': (['Shorts', 'רגיל'], [0.7, 0.3]),
+    'facebook': (['Reel', 'Video', 'Photo', 'Link', 'Status'], [0.35, 0.15, 0.3, 0.15, 0.05]),
+    'instagram': (['Reel', 'Photo', 'Carousel'], [0.5, 0.3, 0.2]),
+}
+ID_COLUMNS = {'youtube': 'video_id', 'facebook': 'post_id', 'instagram': 'media_id'}
+# גיליון העוקבים הוא שורה ליום - מעבר לזה התאריכים יוצאים מטווח הגיוני
+FOLLOWERS_MAX_ROWS = 100_000
+
+
+def _dates(rng, rows, days=DAYS):
+    """תאריכים אקראיים ב-days הימים שלפני END_DATE (מחרוזות)"""
+    pool = np.array([(END_DATE - timedelta(days=i)).isoformat() for i in range(days)])
+    return pool[rng.integers(0, days, rows)]
+
+
+def _times(rng, rows):
+    return pd.Series(rng.integers(0, 24, rows)).map('{:02d}'.format) + ':' + \
+        pd.Series(rng.integers(0, 60, rows)).map('{:02d}'.format)
+
+
+def _titles(prefix, ids):
+    return [f"{prefix} {i} - כותרת לדוגמה על סיפור חדשותי מהיום" for i in ids]
+
+
+def _engagement(rng, rows, video_share):
+    """reach/views/likes/... עקביים; video_share - שיעור הפריטים שהם וידאו"""
+    reach = rng.lognormal(9, 1.2, rows).astype('int64')
+    video = rng.random(rows) < video_share
+    views = np.where(video, reach * rng.uniform(0.8, 2.5, rows), reach * rng.uniform(0, 0.3, rows)).astype('int64')
+    likes = (reach * rng.uniform(0.005, 0.06, rows)).astype('int64')
+    return {
+        'reach': reach, 'views': views, 'likes': likes,
+        'comments': (likes * rng.uniform(0.02, 0.2, rows)).astype('int64'),
+        'shares': (likes * rng.uniform(0.01, 0.15, rows)).astype('int64'),
+        'saved': (likes * rng.uniform(0.01, 0.1, rows)).astype('int64'),
+        'clicks': (reach * rng.uniform(0.01, 0.08, rows)).astype('int64'),
+    }
+
+
+def _youtube(rng, ids):
+    rows = len(ids)
+    m = _engagement(rng, rows, 1.0)
+    kinds, weights = PLATFORM_TYPES['youtube']
+    video_type = rng.choice(kinds, rows, p=weights)
+    duration = np.where(video_type == 'Shorts', rng.integers(10, 61, rows), rng.integers(120, 3600, rows))
+    views = np.maximum(m['views'], 1)
+    return pd.DataFrame({
+        'video_id': [f"yt{i:09d}" for i in ids],
+        'published_at': _dates(rng, rows),
+        'published_time': _times(rng, rows),
+        'title': _titles('סרטון', ids),
+        'description': 'תיאור קצר של הסרטון',
+        'thumbnail_url': [f"https://i.ytimg.com/vi/yt{i:09d}/maxresdefault.jpg" for i in ids],
+        'tags': 'חדשות,ישראל',
+        'video_type': video_type,
+        'views': m['views'],
+        'likes': m['likes'],
+        'comments': m['comments'],
+        'duration_seconds': duration.astype(float),
+        'duration_formatted': pd.Series(duration // 60).astype(str) + ':' + pd.Series(duration % 60).map('{:02d}'.format),
+        'like_rate': np.round(m['likes'] / views * 100, 2),
+        'comment_rate': np.round(m['comments'] / views * 100, 4),
+        'video_url': [f"https://www.youtube.com/watch?v=yt{i:09d}" for i in ids],
+        'last_updated': f"{END_DATE.isoformat()} 08:00",
+    })
+
+
+def _facebook(rng, ids):
+    rows = len(ids)
+    m = _engagement(rng, rows, 0.5)
+    kinds, weights = PLATFORM_TYPES['facebook']
+    views_30s = (m['views'] * rng.uniform(0.05, 0.4, rows)).astype('int64')
+    total_eng = m['clicks'] + m['likes'] + m['comments'] + m['shares']
+    return pd.DataFrame({
+        'post_id': [f"220634478361516_{i}" for i in ids],
+        'date': _dates(rng, rows),
+        'time': _times(rng, rows),
+        'type': rng.choice(kinds, rows, p=weights),
+        'title': _titles('פוסט', ids),
+        'reach': m['reach'],
+        'clicks': m['clicks'],
+        'views': m['views'],
+        'views_30s': views_30s,
+        'total_watch_min': np.round(m['views'] * rng.uniform(0.05, 0.5, rows), 1),
+        'avg_watch_sec': np.round(rng.uniform(2, 40, rows), 2),
+        'completion_rate': np.round(views_30s / np.maximum(m['views'], 1) * 100, 1),
+        'likes': m['likes'],
+        'comments': m['comments'],
+        'shares': m['shares'],
+        'total_engagement': total_eng,
+        'engagement_rate': np.round(total_eng / np.maximum(m['reach'], 1) * 100, 2),
+        'permalink': [f"https://www.facebook.com/reel/{i}" for i in ids],
+        'pulled_at': f"{END_DATE.isoformat()} 08:00",
+    })
+
+
+def _instagram(rng, ids):
+    rows = len(ids)
+    m = _engagement(rng, rows, 0.5)
+    kinds, weights = PLATFORM_TYPES['instagram']
+    total = m['likes'] + m['comments'] + m['shares'] + m['saved']
+    return pd.DataFrame({
+        'media_id': [18000000000000000 + i for i in ids],
+        'date': _dates(rng, rows),
+        'time': _times(rng, rows),
+        'type': rng.choice(kinds, rows, p=weights),
+        'caption': _titles('מדיה', ids),
+        'likes': m['likes'],
+        'comments': m['comments'],
+        'views': m['views'],
+        'reach': m['reach'],
+        'saved': m['saved'],
+        'shares': m['shares'],
+        'total_interactions': total,
+        'avg_watch_sec': np.round(rng.uniform(0, 30, rows), 2),
+        'engagement_rate': np.round(total / np.maximum(m['reach'], 1) * 100, 2),
+        'permalink': [f"https://www.instagram.com/p/SIM{i}/" for i in ids],
+        'pulled_at': f"{END_DATE.isoformat()} 08:00",
+    })
+
+
+BUILDERS = {'youtube': _youtube, 'facebook': _facebook, 'instagram': _instagram}
+
+
+def make_sheet_frame(platform, rows, seed=0, with_deltas=True):
+    """
+    טבלה בסכמה של גיליון הפלטפורמה, כמו אחרי get_all_records.
+    with_deltas - כולל עמודות הדלתא שה-collector מוסיף (views_delta, ו-reach_delta בפייסבוק/אינסטגרם).
+    """
+    if platform == 'followers':
+        return make_followers_frame(rows, seed)
+    rng = np.random.default_rng(seed)
+    frame = BUILDERS[platform](rng, np.arange(rows))
+    if with_deltas:
+        frame['views_delta'] = rng.integers(-100, 50_000, rows)
+        if platform != 'youtube':
+            frame['reach_delta'] = rng.integers(0, 20_000, rows)
+    return frame
+
+
+def make_collector_batch(platform, existing, rows=500, overlap=0.8, seed=1):
+    """
+    תוצאה של ריצת collector מול גיליון קיים: overlap מהשורות הן פריטים קיימים
+    (עם מדדים שגדלו), והשאר פריטים חדשים. בלי עמודות דלתא - אותן מחשב המיזוג.
+    """
+    rng = np.random.default_rng(seed)
+    id_col = ID_COLUMNS[platform]
+    rows = min(rows, max(len(existing), 1))
+    reused = int(rows * overlap) if len(existing) else 0
+    fresh_ids = np.arange(len(existing), len(existing) + rows - reused)
+    batch = BUILDERS[platform](rng, fresh_ids)
+    if reused:
+        picked = existing.sample(reused, random_state=seed)[batch.columns].copy()
+        for col in ('views', 'reach', 'likes'):
+            if col in picked.columns:
+                picked[col] = picked[col] + rng.integers(0, 5_000, reused)
+        batch = pd.concat([picked, batch], ignore_index=True)
+    # ה-collector מחזיר מזהים כמחרוזות (מה-API), גם כשבגיליון הם מספרים
+    batch[id_col] = batch[id_col].astype(str)
+    return batch.reset_index(drop=True)
+
+
+def make_followers_frame(rows, seed=0, gap_rate=0.01):
+    """
+    גיליון העוקבים (פורמט Wide, HEADERS של followers_tracker): שורה ליום עד END_DATE,
+    עם חורים (ימים חסרים ושורות בלי נתוני דף יומיים) בשיעור gap_rate.
+    """
+    from followers_tracker import HEADERS
+
+    rows = min(rows, FOLLOWERS_MAX_ROWS)
+    rng = np.random.default_rng(seed)
+    days = [(END_DATE - timedelta(days=i)).isoformat() for i in range(rows)]
+    frame = pd.DataFrame({'date': days, 'pulled_at': [f"{d} 08:00" for d in days]})
+    growth = {'yt_subscribers': 180_000, 'fb_followers': 265_000, 'fb_fan_count': 250_000,
+              'ig_followers': 120_000, 'tt_followers': 40_000}
+    for col in HEADERS[2:]:
+        if col in growth:
+            frame[col] = growth[col] - np.arange(rows) * rng.integers(5, 50)
+        elif col.endswith('_change'):
+            frame[col] = rng.integers(-20, 200, rows)
+        else:
+            frame[col] = rng.integers(0, 100_000, rows)
+    frame['yt_total_views'] = 90_000_000 - np.arange(rows) * 20_000
+    frame['yt_video_count'] = 4_000 - np.arange(rows) // 2
+
+    missing = rng.random(rows) < gap_rate
+    empty = rng.random(rows) < gap_rate
+    fb_daily = [col for col in HEADERS if col.startswith('fb_') and col not in growth and not col.endswith('_change')]
+    frame = frame.astype({col: object for col in fb_daily})
+    frame.loc[empty, fb_daily] = ''
+    return frame[~missing].reset_index(drop=True)[HEADERS]
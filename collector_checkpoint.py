@@ -0,0 +1,187 @@
+"""
+Collector Checkpoint - יומן מקומי של ריצת collector, להמשך אחרי קריסה
+כל פריט שעבר העשרה נרשם מיד (שורה ב-JSONL), ואחרי כל דף - ה-cursor של הדף הבא.
+ריצה חוזרת אחרי כשל ממשיכה מהדף האחרון ומדלגת על פריטים שכבר נאספו, ואם הכשל היה
+בשמירה לגיליון - לא קוראת ל-API בכלל. היומן נמחק רק אחרי שהאיסוף הגיע לסוף החלון
+והשמירה הצליחה; שמירה חלקית (האיסוף נעצר בשגיאת API) מסומנת ב-mark_saved, וריצה חוזרת
+שומרת רק את מה שנאסף אחריה - כדי לא לדרוס את הדלתא של הפריטים שכבר נשמרו.
+
+ה-access_token לא נשמר ביומן: הוא מוסר מכתובות ה-paging ומתווסף מחדש בהמשך הריצה.
+
+שימוש:
+    checkpoint = CollectorCheckpoint('facebook_collector')
+    url = checkpoint.cursor or first_page_url
+    ...
+    checkpoint.add_item(post_id, row)
+    checkpoint.set_cursor(res['paging']['next'])
+    ...
+    checkpoint.mark_complete()
+    saved = save_to_sheets(df)
+    if saved:
+        checkpoint.mark_saved()
+    checkpoint.finish(saved)
+"""
+
+import os
+import json
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from run_telemetry import count, mark_failed
+
+# --- הגדרות ---
+CHECKPOINT_DIR = os.environ.get('CHECKPOINT_DIR', '.checkpoints')
+# יומן ישן מזה לא ממשיכים ממנו - המדדים בו כבר לא עדכניים
+CHECKPOINT_MAX_AGE_HOURS = float(os.environ.get('CHECKPOINT_MAX_AGE_HOURS') or 6)
+SECRET_PARAMS = {'access_token', 'appsecret_proof'}
+
+
+def strip_token(url):
+    """הסרת פרמטרים סודיים מכתובת (cursor של paging) לפני שמירה לדיסק"""
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key not in SECRET_PARAMS]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class CollectorCheckpoint:
+    """
+    יומן ריצה של collector אחד (append-only JSONL). רשומות:
+    start / item / deferred / cursor / complete / saved / written
+    persist=False - בזיכרון בלבד (למשל ב-benchmarks, שלא ימשיכו אחד מהשני)
+    keep_rows=False - בזיכרון נשמרים רק המזהים (מצב streaming); השורות נקראות מהקובץ ב-journal_rows
+    """
+
+    def __init__(self, name, persist=True, keep_rows=True):
+        self.name = name
+        self.path = os.path.join(CHECKPOINT_DIR, f"{name}.jsonl")
+        self.persist = persist
+        self.keep_rows = keep_rows
+        self.items = {}
+        self.item_ids = set()
+        self.deferred = []
+        self.deferred_ids = set()
+        self.cursor = None
+        self.complete = False
+        # פריטים שכבר נשמרו לגיליון (רשומת saved של שמירה חלקית)
+        self.saved_ids = set()
+        self.resumed = persist and self._load()
+        if not self.resumed:
+            self._append({'type': 'start', 'at': time.time()})
+        else:
+            print(f"♻️ Resuming {name} from checkpoint: {len(self.item_ids)} items collected"
+                  + (", collection complete" if self.complete else ''))
+            count('checkpoint_resumed_items', len(self.item_ids))
+
+    def _load(self):
+        """טעינת יומן קיים; יומן ישן או פגום נמחק. מחזיר האם יש ממה להמשיך"""
+        if not os.path.exists(self.path):
+            return False
+        entries = self._entries()
+        first = next(entries, {})
+        started = first.get('at', 0) if first.get('type') == 'start' else 0
+        if time.time() - started > CHECKPOINT_MAX_AGE_HOURS * 3600:
+            print(f"🗑️ Discarding stale checkpoint {self.path}")
+            entries.close()
+            os.remove(self.path)
+            return False
+
+        for entry in entries:
+            if entry['type'] == 'item':
+                self.item_ids.add(entry['id'])
+                if self.keep_rows:
+                    self.items[entry['id']] = entry['row']
+            elif entry['type'] == 'deferred':
+                self.deferred.append(entry['id'])
+                self.deferred_ids.add(entry['id'])
+            elif entry['type'] == 'cursor':
+                self.cursor = entry['url']
+            elif entry['type'] == 'complete':
+                self.complete = True
+            elif entry['type'] == 'saved':
+                self.saved_ids = set(self.item_ids)
+        return True
+
+    def _entries(self):
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return  # שורה אחרונה שנכתבה חלקית בזמן הקריסה
+
+    def _append(self, entry):
+        if not self.persist:
+            return
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def has(self, item_id):
+        return str(item_id) in self.item_ids or str(item_id) in self.deferred_ids
+
+    def add_item(self, item_id, row):
+        self.item_ids.add(str(item_id))
+        if self.keep_rows:
+            self.items[str(item_id)] = row
+        self._append({'type': 'item', 'id': str(item_id), 'row': row})
+
+    def add_deferred(self, item_id):
+        self.deferred.append(str(item_id))
+        self.deferred_ids.add(str(item_id))
+        self._append({'type': 'deferred', 'id': str(item_id)})
+
+    def set_cursor(self, url):
+        """ה-cursor של הדף הבא - אחרי שכל הפריטים בדף הנוכחי נרשמו"""
+        self.cursor = strip_token(url)
+        self._append({'type': 'cursor', 'url': self.cursor})
+
+    def mark_complete(self):
+        """האיסוף הסתיים - ריצה חוזרת (אחרי כשל בשמירה) לא תקרא ל-API"""
+        self.complete = True
+        self._append({'type': 'complete'})
+
+    def mark_saved(self):
+        """כל הפריטים שנאספו עד כה נשמרו לגיליון - ריצה חוזרת לא תשמור אותם שוב"""
+        self.saved_ids = set(self.item_ids)
+        self._append({'type': 'saved'})
+
+    def mark_written(self):
+        """כל הפריטים שביומן עד כאן נכתבו לגיליון במצב streaming (אחרי כל chunk)"""
+        self._append({'type': 'written'})
+
+    def rows(self):
+        """השורות שנאספו ועוד לא נשמרו לגיליון"""
+        return [row for item_id, row in self.items.items() if item_id not in self.saved_ids]
+
+    def journal_rows(self):
+        """
+        generator של השורות ביומן שעוד לא נכתבו לגיליון - אחרי רשומת ה-written האחרונה
+        (מהדיסק, בלי להחזיק את כולן בזיכרון). שורה שכבר נכתבה לא נכתבת שוב: הערך הקודם
+        שהכותב היה קורא לה הוא הכתיבה של הריצה עצמה, והדלתא הייתה מתאפסת.
+        """
+        if not (self.persist and os.path.exists(self.path)):
+            return
+        last_written = -1
+        for index, entry in enumerate(self._entries()):
+            if entry['type'] == 'written':
+                last_written = index
+        for index, entry in enumerate(self._entries()):
+            if index > last_written and entry['type'] == 'item':
+                yield entry['row']
+
+    def clear(self):
+        """מחיקת היומן אחרי שמירה מוצלחת"""
+        if self.persist and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def finish(self, saved):
+        """
+        סוף הריצה: היומן נמחק רק אם האיסוף הגיע לסוף החלון והשמירה הצליחה. אחרת הוא נשאר
+        (ריצה חוזרת ממשיכה מה-cursor, או שומרת שוב) והריצה מסומנת ככושלת.
+        """
+        if self.complete and saved:
+            self.clear()
+            return
+        print(f"⚠️ Checkpoint kept for the next run ({len(self.item_ids)} items collected, "
+              + ("collection incomplete)" if not self.complete else "not saved)"))
+        mark_failed('collection_incomplete' if not self.complete else 'save_failed')
@@ -0,0 +1,221 @@
+"""
+Daily Rollup - גיליון סיכום יומי לכל (תאריך, פלטפורמה, סוג תוכן)
+כל collector מעדכן כאן רק את התאריכים שנגעו בהם בריצה שלו, כך שהדוח השבועי
+(ותצוגות של 30/90 יום) קוראים כמה עשרות שורות במקום את כל הפוסטים.
+
+בנייה מחדש מהגיליונות הגולמיים (חד-פעמי, או אחרי תיקון נתונים):
+    python daily_rollup.py --rebuild
+"""
+
+import os
+import sys
+import json
+import pandas as pd
+import gspread
+from gspread.utils import rowcol_to_a1
+from oauth2client.service_account import ServiceAccountCredentials
+from datetime import datetime, timedelta
+import pytz
+from summary_engine import PLATFORMS, prepare_frame
+from sheet_journal import with_retries
+from run_scheduler import ROLLUP_RESERVE_SEC, can_finish
+
+# Load .env file if exists (for local development)
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass  # dotenv not installed, using environment variables directly
+
+# --- הגדרות ---
+SPREADSHEET_ID = "1WB0cFc2RgR1Z-crjhtkSqLKp1mMdFoby8NwV7h3UN6c"
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
+ROLLUP_SHEET = 'סיכום יומי'
+ROLLUP_COLUMNS = ['date', 'platform', 'content_type', 'posts', 'views', 'reach', 'likes',
+                  'shares', 'saves', 'updated_at']
+# עמודת הרולאפ <- עמודת הגיליון הגולמי
+ROLLUP_METRICS = {'views': 'views', 'reach': 'reach', 'likes': 'likes', 'shares': 'shares', 'saves': 'saved'}
+SOURCE_SHEETS = {
+    'youtube': 'נתוני יוטיוב',
+    'facebook': 'נתוני פייסבוק',
+    'instagram': 'נתוני אינסטגרם',
+}
+
+
+def get_spreadsheet():
+    creds_json = json.loads(os.environ['GCP_SERVICE_ACCOUNT'])
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_json, SCOPES)
+    return gspread.authorize(creds).open_by_key(SPREADSHEET_ID)
+
+
+def get_rollup_worksheet(sh):
+    """גיליון הסיכום היומי - נוצר בשימוש הראשון"""
+    try:
+        return sh.worksheet(ROLLUP_SHEET)
+    except gspread.exceptions.WorksheetNotFound:
+        print(f"   Creating '{ROLLUP_SHEET}' worksheet...")
+        worksheet = sh.add_worksheet(title=ROLLUP_SHEET, rows=1000, cols=len(ROLLUP_COLUMNS))
+        worksheet.update([ROLLUP_COLUMNS])
+        return worksheet
+
+
+def build_rollup_rows(df, platform, dates=None):
+    """
+    שורות סיכום (groupby על תאריך וסוג תוכן) מהטבלה הממוזגת של הפלטפורמה.
+    dates - רק התאריכים האלה (התאריכים שנגעו בהם בריצה); None - כל התאריכים.
+    """
+    if df is None or df.empty:
+        return []
+    spec = PLATFORMS[platform]
+    frame, _ = prepare_frame(df, platform)
+    if dates is not None:
+        frame = frame[frame[spec['date']].isin(set(dates))]
+    if frame.empty:
+        return []
+
+    grouped = frame.groupby([spec['date'], spec['type']], sort=True)
+    sums = grouped[list(ROLLUP_METRICS.values())].sum()
+    sums['posts'] = grouped.size()
+
+    timestamp = datetime.now(pytz.timezone('Asia/Jerusalem')).strftime('%Y-%m-%d %H:%M')
+    rows = []
+    for (day, content_type), values in sums.iterrows():
+        rows.append(
+            [day, platform, content_type, int(values['posts'])]
+            + [int(values[source]) for source in ROLLUP_METRICS.values()]
+            + [timestamp]
+        )
+    return rows
+
+
+def _normalize_row(row):
+    """שורת רולאפ באורך מלא, עם העמודות המספריות כמספרים שלמים"""
+    row = list(row) + [''] * (len(ROLLUP_COLUMNS) - len(row))
+    numbers = [int(float(str(value).replace(',', '') or 0)) for value in row[3:9]]
+    return [str(row[0]), str(row[1]), str(row[2])] + numbers + [str(row[9])]
+
+
+def upsert_rollup(sh, platform, rows, dates):
+    """
+    עדכון הגיליון רק בשורות של הפלטפורמה בתאריכים dates: מפתח קיים (תאריך, פלטפורמה, סוג)
+    מתעדכן במקומו, מפתח חדש נוסף בסוף, ושורה של סוג שכבר אין לו פוסטים בתאריך מתרוקנת.
+    שאר הגיליון לא נכתב, כך שכשל או עצירה באמצע לא מוחקים את הסיכום.
+    השורות החדשות לא ממוינות - get_rollup מסנן לפי תאריך, ו---rebuild ממיין מחדש.
+    """
+    worksheet = get_rollup_worksheet(sh)
+    values = with_retries(worksheet.get_all_values, 'read')
+    dates = {str(day) for day in dates}
+    # מספרי השורות של כל מפתח של הפלטפורמה בתאריכים האלה (כפילויות - כולן)
+    row_numbers = {}
+    for number, row in enumerate(values[1:], start=2):
+        if len(row) >= 3 and row[1] == platform and row[0] in dates:
+            row_numbers.setdefault(tuple(row[:3]), []).append(number)
+
+    updates, new_rows, stale = [], [], []
+    for row in map(_normalize_row, rows):
+        numbers = row_numbers.pop(tuple(row[:3]), [])
+        if numbers:
+            updates.append({'range': f"A{numbers[0]}", 'values': [row]})
+            stale += numbers[1:]
+        else:
+            new_rows.append(row)
+    # סוגים שכבר אין להם פוסטים בתאריכים האלה
+    stale += [number for numbers in row_numbers.values() for number in numbers]
+
+    if updates:
+        with_retries(lambda: worksheet.batch_update(updates, value_input_option='RAW'), 'update')
+    if new_rows:
+        # INSERT_ROWS - שורות ריקות באמצע (מ-stale) לא נדרסות
+        with_retries(lambda: worksheet.append_rows(new_rows, value_input_option='RAW',
+                                                   insert_data_option='INSERT_ROWS', table_range='A1'), 'append')
+    if stale:
+        last = len(ROLLUP_COLUMNS)
+        with_retries(lambda: worksheet.batch_clear(
+            [f"{rowcol_to_a1(number, 1)}:{rowcol_to_a1(number, last)}" for number in stale]), 'clear')
+    print(f"   📊 Rollup: {len(rows)} rows for {len(dates)} date(s) of {platform} "
+          f"({len(updates)} updated, {len(new_rows)} added, {len(stale)} cleared)")
+
+
+def update_rollup(sh, platform, final_df, touched_dates):
+    """
+    עדכון הסיכום היומי מתוך collector, אחרי שמירת הגיליון הגולמי.
+    כשל כאן לא מפיל את האיסוף - רק מדפיס אזהרה; בלי זמן לסיים לפני סוף הריצה - מדולג.
+    """
+    touched_dates = sorted({str(day) for day in touched_dates if day})
+    if not touched_dates:
+        return
+    # עצירה באמצע העדכון משאירה את הסיכום חלקי - התאריכים מתעדכנים שוב בריצה הבאה שנוגעת בהם
+    if not can_finish('the rollup update', ROLLUP_RESERVE_SEC):
+        return
+    try:
+        rows = build_rollup_rows(final_df, platform, touched_dates)
+        upsert_rollup(sh, platform, rows, touched_dates)
+    except Exception as e:
+        print(f"⚠️ Failed to update rollup for {platform}: {e}")
+
+
+def get_rollup(days_back=7, sh=None):
+    """שורות הסיכום היומי של X הימים האחרונים (DataFrame; ריק אם אין)"""
+    try:
+        sh = sh or get_spreadsheet()
+        worksheet = sh.worksheet(ROLLUP_SHEET)
+        df = pd.DataFrame(worksheet.get_all_records(numericise_ignore=[1, 3]))
+    except Exception as e:
+        print(f"⚠️ Error fetching rollup: {e}")
+        return pd.DataFrame()
+    if df.empty:
+        return df
+
+    cutoff = (datetime.now(pytz.timezone('Asia/Jerusalem')) - timedelta(days=days_back)).strftime('%Y-%m-%d')
+    df = df[df['date'].astype(str) >= cutoff].copy()
+    for col in ['posts'] + list(ROLLUP_METRICS):
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('int64')
+    return df
+
+
+def summarize_rollup(rollup_df):
+    """
+    סיכום תקופה מהרולאפ: לכל פלטפורמה - סה"כ וסכומים לפי סוג תוכן.
+    מחזיר {platform: {'totals': {...}, 'by_type': DataFrame}}
+    """
+    if rollup_df is None or rollup_df.empty:
+        return {}
+    columns = ['posts'] + list(ROLLUP_METRICS)
+    by_platform_type = rollup_df.groupby(['platform', 'content_type'])[columns].sum()
+    result = {}
+    for platform in by_platform_type.index.get_level_values(0).unique():
+        by_type = by_platform_type.loc[platform]
+        totals = by_type.sum()
+        result[platform] = {
+            'totals': {col: int(totals[col]) for col in columns},
+            'by_type': by_type,
+        }
+    return result
+
+
+def rebuild_rollup():
+    """בנייה מחדש של כל הסיכום מהגיליונות הגולמיים"""
+    sh = get_spreadsheet()
+    rows = []
+    for platform, sheet_name in SOURCE_SHEETS.items():
+        try:
+            df = pd.DataFrame(sh.worksheet(sheet_name).get_all_records())
+        except Exception as e:
+            print(f"⚠️ Skipping {sheet_name}: {e}")
+            continue
+        platform_rows = build_rollup_rows(df, platform)
+        print(f"   {platform}: {len(df)} posts -> {len(platform_rows)} rollup rows")
+        rows += platform_rows
+
+    rows.sort(key=lambda row: (row[0], row[1], row[2]), reverse=True)
+    worksheet = get_rollup_worksheet(sh)
+    worksheet.clear()
+    worksheet.update([ROLLUP_COLUMNS] + rows)
+    print(f"✅ Rollup rebuilt: {len(rows)} rows")
+
+
+if __name__ == "__main__":
+    if '--rebuild' in sys.argv:
+        rebuild_rollup()
+    else:
+        print(__doc__)
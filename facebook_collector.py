@@ -4,10 +4,20 @@ import pandas as pd
 import gspread
 from google.oauth2.service_account import Credentials
 from datetime import datetime, timedelta
+from daily_rollup import update_rollup
+from run_telemetry import track_run, stage, mark_failed
+from run_scheduler import (is_priority, should_defer, record_deferred, can_finish, install_stop_handler,
+                           load_priority_ids, save_priority_ids)
+from collector_checkpoint import CollectorCheckpoint
+from sheet_journal import flush, write_sheet
+from sheet_stream import SheetChunkWriter
+from profiling import profile_run
+import sys
 import time
 import json
 import pytz
 import re
+from itertools import chain
 
 # Load .env file if exists
 try:
@@ -20,21 +30,32 @@ except ImportError:
 ACCESS_TOKEN = os.environ.get('FACEBOOK_TOKEN')
 PAGE_ID = "220634478361516"
 API_VERSION = "v24.0"
-DAYS_BACK = 7
+# כתובת ה-Graph API (לבדיקות עומס: סימולטור מקומי, ראו benchmarks/graph_simulator.py)
+GRAPH_API_BASE = os.environ.get('GRAPH_API_BASE', 'https://graph.facebook.com').rstrip('/')
+DAYS_BACK = int(os.environ.get('DAYS_BACK') or 7)
+# מגביל קצב משותף (rate_limiter.RateLimiter) - כשמוגדר (backfill.py, כמה חלונות במקביל),
+# כל קריאה ל-Graph ממתינה ל-token במקום ההשהיה הקבועה בין פוסטים
+RATE_LIMITER = None
 
 SPREADSHEET_ID = "1WB0cFc2RgR1Z-crjhtkSqLKp1mMdFoby8NwV7h3UN6c"
 SHEET_NAME = "נתוני פייסבוק"
 
 # --- Functions ---
 
+def graph_get(url, params):
+    """GET ל-Graph API (JSON) - דרך RATE_LIMITER כשהוגדר"""
+    if RATE_LIMITER is not None:
+        RATE_LIMITER.acquire()
+    return requests.get(url, params=params).json()
+
 def get_video_direct_metrics(video_id):
     """משיכת צפיות ישירות מאובייקט הוידאו (גיבוי)"""
     if not video_id:
         return 0
-    url = f"https://graph.facebook.com/{API_VERSION}/{video_id}"
+    url = f"{GRAPH_API_BASE}/{API_VERSION}/{video_id}"
     params = {'access_token': ACCESS_TOKEN, 'fields': 'views'}
     try:
-        res = requests.get(url, params=params).json()
+        res = graph_get(url, params)
         return res.get('views', 0)
     except:
         return 0
@@ -43,7 +64,7 @@ def get_base_insights(post_id):
     """
     משיכת מדדים בסיסיים - עובד לכל סוגי הפוסטים
     """
-    url = f"https://graph.facebook.com/{API_VERSION}/{post_id}/insights"
+    url = f"{GRAPH_API_BASE}/{API_VERSION}/{post_id}/insights"
     params = {
         'access_token': ACCESS_TOKEN,
         'metric': 'post_impressions_unique,post_clicks',
@@ -53,7 +74,7 @@ def get_base_insights(post_id):
     result = {'reach': 0, 'clicks': 0}
     
     try:
-        res = requests.get(url, params=params).json()
+        res = graph_get(url, params)
         
         if 'error' in res:
             # לא מדפיסים שגיאה - זה צפוי לפעמים
@@ -87,7 +108,7 @@ def get_video_insights(post_id):
         'total_watch_min': 0,
     }
     
-    url = f"https://graph.facebook.com/{API_VERSION}/{post_id}/insights"
+    url = f"{GRAPH_API_BASE}/{API_VERSION}/{post_id}/insights"
     
     # ניסיון 1: מדדי Reels חדשים
     params = {
@@ -97,7 +118,7 @@ def get_video_insights(post_id):
     }
     
     try:
-        res = requests.get(url, params=params).json()
+        res = graph_get(url, params)
         
         if 'data' in res:
             for item in res.get('data', []):
@@ -119,7 +140,7 @@ def get_video_insights(post_id):
             'metric': 'post_video_views_30s,post_video_view_time',
             'period': 'lifetime'
         }
-        res2 = requests.get(url, params=params2).json()
+        res2 = graph_get(url, params2)
         
         if 'data' in res2:
             for item in res2.get('data', []):
@@ -142,7 +163,7 @@ def get_video_insights(post_id):
                 'metric': 'post_media_view',
                 'period': 'lifetime'
             }
-            res3 = requests.get(url, params=params3).json()
+            res3 = graph_get(url, params3)
             
             if 'data' in res3:
                 for item in res3.get('data', []):
@@ -157,13 +178,13 @@ def get_video_insights(post_id):
 
 def get_public_metrics(post_id):
     """משיכת מדדים ציבוריים - לייקים, תגובות, שיתופים"""
-    url = f"https://graph.facebook.com/{API_VERSION}/{post_id}"
+    url = f"{GRAPH_API_BASE}/{API_VERSION}/{post_id}"
     params = {
         'access_token': ACCESS_TOKEN,
         'fields': 'shares,comments.summary(true).limit(0),reactions.summary(true).limit(0)'
     }
     try:
-        res = requests.get(url, params=params).json()
+        res = graph_get(url, params)
         likes = 0
         if 'reactions' in res and 'summary' in res['reactions']:
             likes = res['reactions']['summary']['total_count']
@@ -202,53 +223,81 @@ def detect_media_type(post):
     return 'Status'
 
 
-def fetch_facebook_data():
-    print(f"🚀 Facebook Collector - {datetime.now()}")
-
-    since_unix = int((datetime.now() - timedelta(days=DAYS_BACK)).timestamp())
-    all_posts = []
+def iter_facebook_posts(checkpoint, since=None, until=None):
+    """
+    generator: דף מה-feed -> העשרה -> שורה מוכנה לגיליון, פוסט אחרי פוסט.
+    checkpoint - יומן הריצה (collector_checkpoint): כל פוסט ו-cursor נרשמים בו,
+    וריצה חוזרת ממשיכה מהמקום שבו הקודמת נפלה (פוסטים שכבר ביומן לא חוזרים).
+    since / until (datetime) - חלון הזמן; ברירת המחדל: DAYS_BACK הימים האחרונים.
+    """
+    since_unix = int((since or datetime.now() - timedelta(days=DAYS_BACK)).timestamp())
+    until_unix = int(until.timestamp()) if until else None
+    il_tz = pytz.timezone('Asia/Jerusalem')
+    leaders = load_priority_ids('facebook_collector')
 
-    url = f"https://graph.facebook.com/{API_VERSION}/{PAGE_ID}/feed"
+    url = f"{GRAPH_API_BASE}/{API_VERSION}/{PAGE_ID}/feed"
     params = {
         'access_token': ACCESS_TOKEN,
         'limit': 25,
         'fields': 'id,created_time,message,permalink_url,attachments',
         'since': since_unix
     }
-
-    while True:
-        res = requests.get(url, params=params).json()
+    if until_unix:
+        params['until'] = until_unix
+    if checkpoint.cursor:
+        url, params = checkpoint.cursor, {'access_token': ACCESS_TOKEN}
+
+    while not checkpoint.complete:
+        with stage('fetch'):
+            res = graph_get(url, params)
         
         if 'error' in res:
             print(f"❌ API Error: {res['error']['message']}")
             break
             
+        # סוף ה-feed - האיסוף הושלם (שגיאת API לא מסמנת, וריצה חוזרת תמשיך מה-cursor)
         if 'data' not in res or not res['data']:
+            checkpoint.mark_complete()
             break
 
         for post in res['data']:
             post_id = post['id']
+            if checkpoint.has(post_id):
+                continue
             media_type = detect_media_type(post)
 
-            # 1. משיכת מדדים בסיסיים (עובד לכולם)
-            base = get_base_insights(post_id)
+            # המרת זמן
+            created_time = post['created_time']
+            ts_normalized = re.sub(r'\+0000$', '+00:00', created_time.replace('Z', '+00:00'))
+            post_datetime = datetime.fromisoformat(ts_normalized).astimezone(il_tz)
+            if until_unix and post_datetime.timestamp() >= until_unix:
+                continue  # שייך לחלון הבא (backfill)
+
+            # תחת תקציב זמן (run_scheduler) - פוסטים ישנים נדחים לריצה הבאה (חוץ מהמובילים בדלתא)
+            if should_defer(priority=is_priority(post_datetime, post_id, leaders)):
+                checkpoint.add_deferred(post_id)
+                continue
+
+            with stage('enrich'):
+                # 1. משיכת מדדים בסיסיים (עובד לכולם)
+                base = get_base_insights(post_id)
             
-            # 2. משיכת מדדי וידאו (רק לוידאו/Reels)
-            video = {'views': 0, 'avg_watch_sec': 0, 'views_30s': 0, 'total_watch_min': 0}
-            if media_type in ['Video', 'Reel']:
-                video = get_video_insights(post_id)
+                # 2. משיכת מדדי וידאו (רק לוידאו/Reels)
+                video = {'views': 0, 'avg_watch_sec': 0, 'views_30s': 0, 'total_watch_min': 0}
+                if media_type in ['Video', 'Reel']:
+                    video = get_video_insights(post_id)
                 
-                # fallback לצפיות ישירות מהוידאו
-                if video['views'] == 0:
-                    try:
-                        if 'attachments' in post:
-                            vid_id = post['attachments']['data'][0]['target']['id']
-                            video['views'] = get_video_direct_metrics(vid_id)
-                    except:
-                        pass
+                    # fallback לצפיות ישירות מהוידאו
+                    if video['views'] == 0:
+                        try:
+                            if 'attachments' in post:
+                                vid_id = post['attachments']['data'][0]['target']['id']
+                                video['views'] = get_video_direct_metrics(vid_id)
+                        except:
+                            pass
             
-            # 3. משיכת מדדים ציבוריים
-            public = get_public_metrics(post_id)
+                # 3. משיכת מדדים ציבוריים
+                public = get_public_metrics(post_id)
 
             # 4. חישובים
             reach = base['reach']
@@ -268,13 +317,7 @@ def fetch_facebook_data():
             if views > 0 and video['views_30s'] > 0:
                 completion_rate = round((video['views_30s'] / views) * 100, 1)
 
-            # 5. המרת זמן
-            il_tz = pytz.timezone('Asia/Jerusalem')
-            created_time = post['created_time']
-            ts_normalized = re.sub(r'\+0000$', '+00:00', created_time.replace('Z', '+00:00'))
-            post_datetime = datetime.fromisoformat(ts_normalized).astimezone(il_tz)
-            
-            all_posts.append({
+            row = {
                 'post_id': post_id,
                 'date': post_datetime.strftime('%Y-%m-%d'),
                 'time': post_datetime.strftime('%H:%M'),
@@ -294,49 +337,56 @@ def fetch_facebook_data():
                 'engagement_rate': engagement_rate,
                 'permalink': post.get('permalink_url', ''),
                 'pulled_at': datetime.now(il_tz).strftime('%Y-%m-%d %H:%M')
-            })
+            }
+            checkpoint.add_item(post_id, row)
+            yield row
             
-            time.sleep(0.2)  # Rate limiting - קצת יותר איטי בגלל הקריאות הנוספות
+            if RATE_LIMITER is None:
+                time.sleep(0.2)  # Rate limiting - קצת יותר איטי בגלל הקריאות הנוספות
 
         if 'paging' in res and 'next' in res['paging']:
             url = res['paging']['next']
             params = {}
+            checkpoint.set_cursor(url)
         else:
+            checkpoint.mark_complete()
             break
 
-    print(f"📊 Fetched {len(all_posts)} posts")
-    return pd.DataFrame(all_posts)
 
+def fetch_facebook_data(checkpoint=None):
+    """משיכת כל הפוסטים בחלון לטבלה אחת (כולל פוסטים מיומן של ריצה קודמת)"""
+    print(f"🚀 Facebook Collector - {datetime.now()}")
+    if checkpoint is None:
+        checkpoint = CollectorCheckpoint('facebook_collector', persist=False)
 
-def save_to_sheets(new_df):
-    """שמירה לגוגל שיטס"""
-    creds_json = os.environ.get('GCP_SERVICE_ACCOUNT')
-    if not creds_json:
-        creds_json = os.environ.get('GOOGLE_CREDENTIALS')
+    for _ in iter_facebook_posts(checkpoint):
+        pass
 
-    creds_dict = json.loads(creds_json)
-    scopes = [
-        'https://www.googleapis.com/auth/spreadsheets',
-        'https://www.googleapis.com/auth/drive'
-    ]
-    creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-    gc = gspread.authorize(creds)
-    sh = gc.open_by_key(SPREADSHEET_ID)
+    all_posts = checkpoint.rows()
+    print(f"📊 Fetched {len(all_posts)} posts")
+    record_deferred('facebook_collector', checkpoint.deferred)
+    df = pd.DataFrame(all_posts)
+    df.attrs['deferred_ids'] = checkpoint.deferred
+    return df
 
-    try:
-        worksheet = sh.worksheet(SHEET_NAME)
-    except:
-        worksheet = sh.add_worksheet(title=SHEET_NAME, rows=1000, cols=25)
 
-    # קריאת היסטוריה
-    try:
-        existing_data = worksheet.get_all_records()
-        existing_df = pd.DataFrame(existing_data)
-    except Exception as e:
-        print(f"⚠️ Warning reading existing data: {e}")
-        existing_df = pd.DataFrame()
+def fetch_today_posts():
+    """
+    הפוסטים של היום בלבד (מחצות שעון ישראל), לעדכון במהלך היום (telegram_reporter --intraday).
+    בלי יומן, בלי merge ובלי כתיבה לגיליון - views_delta / reach_delta נשארים מול הריצה היומית.
+    """
+    midnight = datetime.now(pytz.timezone('Asia/Jerusalem')).replace(hour=0, minute=0, second=0, microsecond=0)
+    checkpoint = CollectorCheckpoint('facebook_collector', persist=False)
+    return pd.DataFrame(list(iter_facebook_posts(checkpoint, since=midnight)))
 
-    # מיזוג
+
+def merge_posts(new_df, existing_df):
+    """
+    מיזוג הפוסטים שנאספו עם ההיסטוריה מהגיליון (בלי גישה לגיליון):
+    views_delta / reach_delta מול ההרצה הקודמת, איחוד לפי post_id (הנתון החדש גובר), מיון וניקוי.
+    פוסטים שנדחו בריצה הזו (new_df.attrs['deferred_ids']) נשארים כמו שהם, עם דלתא 0.
+    """
+    deferred = [str(post_id) for post_id in new_df.attrs.get('deferred_ids', [])]
     if not existing_df.empty:
         new_df['post_id'] = new_df['post_id'].astype(str)
         existing_df['post_id'] = existing_df['post_id'].astype(str)
@@ -374,28 +424,124 @@ def save_to_sheets(new_df):
         new_df['reach_delta'] = 0
         final_df = new_df
 
+    # בלי מדידה חדשה אין דלתא - אחרת הדוח יספור שוב את הגידול של הריצה הקודמת
+    if deferred:
+        final_df.loc[final_df['post_id'].isin(deferred), ['views_delta', 'reach_delta']] = 0
+
     # ניקוי ומיון
     final_df = final_df.sort_values(by='date', ascending=False)
     final_df = final_df.fillna(0).replace([float('inf'), float('-inf')], 0)
+    return final_df
+
+
+def open_worksheet():
+    """(spreadsheet, worksheet) של גיליון הפייסבוק - נוצר אם חסר"""
+    creds_json = os.environ.get('GCP_SERVICE_ACCOUNT')
+    if not creds_json:
+        creds_json = os.environ.get('GOOGLE_CREDENTIALS')
+
+    creds_dict = json.loads(creds_json)
+    scopes = [
+        'https://www.googleapis.com/auth/spreadsheets',
+        'https://www.googleapis.com/auth/drive'
+    ]
+    creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
+    gc = gspread.authorize(creds)
+    sh = gc.open_by_key(SPREADSHEET_ID)
+
+    try:
+        worksheet = sh.worksheet(SHEET_NAME)
+    except:
+        worksheet = sh.add_worksheet(title=SHEET_NAME, rows=1000, cols=25)
+    return sh, worksheet
+
+
+def save_to_sheets(new_df):
+    """שמירה לגוגל שיטס. מחזיר האם הנתונים נשמרו (או נרשמו ביומן הכתיבות)"""
+    # אין זמן לסיים את השמירה לפני שה-scheduler עוצר את הריצה - היומן נשאר לריצה הבאה
+    if not can_finish('the sheet write'):
+        return False
+    sh, worksheet = open_worksheet()
+
+    # קריאת היסטוריה - אחרי שליחת כתיבות שנשארו ביומן מריצה קודמת. אם הן לא נשלחו, ההיסטוריה
+    # לא כוללת אותן והכתיבה החדשה הייתה גוברת עליהן ביומן - לכן לא שומרים (היומן נשאר לריצה הבאה)
+    with stage('sheet_read'):
+        if not flush(sh):
+            mark_failed('sheet_journal_pending')
+            return False
+        try:
+            existing_data = worksheet.get_all_records()
+            existing_df = pd.DataFrame(existing_data)
+        except gspread.exceptions.APIError:
+            # Sheets לא זמין - בלי ההיסטוריה הכתיבה הייתה דורסת את הגיליון
+            raise
+        except Exception as e:
+            print(f"⚠️ Warning reading existing data: {e}")
+            existing_df = pd.DataFrame()
+
+    with stage('merge'):
+        final_df = merge_posts(new_df, existing_df)
 
     # שמירה
-    worksheet.clear()
-    worksheet.update([final_df.columns.tolist()] + final_df.values.tolist())
-    print(f"✅ Saved {len(final_df)} rows to {SHEET_NAME}")
+    with stage('sheet_write'):
+        # דרך יומן הכתיבות - אם Sheets נופל, הנתונים נשלחים בריצה הבאה
+        if write_sheet(sh, SHEET_NAME, [final_df.columns.tolist()] + final_df.values.tolist()):
+            print(f"✅ Saved {len(final_df)} rows to {SHEET_NAME}")
+        save_priority_ids('facebook_collector', final_df, 'post_id')
+
+        # עדכון הסיכום היומי - רק לתאריכים של הפוסטים שנאספו בריצה הזו
+        update_rollup(sh, 'facebook', final_df, new_df['date'])
+    return True
+
+
+def stream_to_sheets(checkpoint):
+    """
+    מצב streaming (--stream): כל CHUNK_ROWS פוסטים שנאספו נכתבים מיד לגיליון (upsert לפי post_id),
+    בזיכרון חסום - לאיסוף של חלון ארוך. פוסטים מיומן של ריצה שנפלה שלא הגיעו לגיליון נכתבים שוב.
+    מחזיר האם הכתיבה הושלמה (האיסוף החלקי שנכתב לא נחשב - היומן נשאר לריצה הבאה).
+    """
+    print(f"🚀 Facebook Collector (streaming) - {datetime.now()}")
+    sh, worksheet = open_worksheet()
+    # כתיבה מלאה שממתינה ביומן הייתה דורסת את מה שנכתב כאן
+    if not flush(sh):
+        mark_failed('sheet_journal_pending')
+        return False
+
+    writer = SheetChunkWriter(sh, worksheet, 'facebook', 'post_id', {'views_delta': 'views', 'reach_delta': 'reach'},
+                              checkpoint=checkpoint)
+    writer.write(chain(checkpoint.journal_rows(), iter_facebook_posts(checkpoint)))
+    record_deferred('facebook_collector', checkpoint.deferred)
+    writer.reset_deltas(checkpoint.deferred)
+    writer.close()
+    return checkpoint.complete
 
 
 def main():
     if not ACCESS_TOKEN:
         print("❌ Missing FACEBOOK_TOKEN environment variable")
+        mark_failed('missing_token')
+        return
+
+    if '--stream' in sys.argv:
+        checkpoint = CollectorCheckpoint('facebook_collector', keep_rows=False)
+        checkpoint.finish(stream_to_sheets(checkpoint))
         return
 
-    df = fetch_facebook_data()
+    # יומן הריצה נמחק רק אחרי שמירה מוצלחת - ריצה חוזרת אחרי כשל ממשיכה ממנו
+    checkpoint = CollectorCheckpoint('facebook_collector')
+    df = fetch_facebook_data(checkpoint)
+    saved = True
     if not df.empty:
-        save_to_sheets(df)
-        print(f"✅ Done! {len(df)} posts processed.")
+        saved = save_to_sheets(df)
+        if saved:
+            checkpoint.mark_saved()
+            print(f"✅ Done! {len(df)} posts processed.")
     else:
         print("❌ No data collected.")
+    checkpoint.finish(saved)
 
 
 if __name__ == "__main__":
-    main()
+    install_stop_handler()
+    with track_run('facebook_collector'), profile_run('facebook_collector'):
+        main()
@@ -1,16 +1,21 @@
 """
 Followers Tracker - מעקב אחרי עוקבים בכל הפלטפורמות
 מבנה Wide Format: שורה אחת לכל תאריך עם עמודות לכל פלטפורמה
+הרצה עם --backfill ממלאת ימים חסרים בנתוני הדף היומיים
 """
 
 import os
+import sys
 import json
 import requests
 import gspread
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
+from run_telemetry import track_run, stage, mark_failed
+from run_scheduler import install_stop_handler
+from profiling import profile_run
 
 # Load .env file if exists (for local development)
 try:
@@ -23,12 +28,30 @@ except ImportError:
 SPREADSHEET_ID = "1WB0cFc2RgR1Z-crjhtkSqLKp1mMdFoby8NwV7h3UN6c"
 SHEET_NAME = "מעקב עוקבים"
 
+# אינדקס מקומי תאריך->שורה (חוסך הורדה של כל הגיליון בכל ריצה)
+INDEX_FILE = os.environ.get('FOLLOWERS_INDEX_FILE', '.followers_index.json')
+
 # YouTube
 YOUTUBE_CHANNEL_ID = 'UC_HwfTAcjBESKZRJq6BTCpg'
 
 # Facebook
 FACEBOOK_PAGE_ID = "220634478361516"
 FACEBOOK_API_VERSION = "v24.0"
+# כתובת ה-Graph API (לבדיקות עומס: סימולטור מקומי, ראו benchmarks/graph_simulator.py)
+GRAPH_API_BASE = os.environ.get('GRAPH_API_BASE', 'https://graph.facebook.com').rstrip('/')
+
+# מדדי דף יומיים -> שם השדה (בעמודות fb_*)
+FB_DAILY_METRICS = {
+    'page_fan_adds': 'fan_adds',
+    'page_fan_removes': 'fan_removes',
+    'page_impressions_unique': 'daily_reach',
+    'page_post_engagements': 'daily_engagements',
+    'page_video_views': 'daily_video_views',
+}
+
+# Backfill: כמה ימים אחורה לחפש חורים, וגודל חלון מקסימלי לבקשת insights אחת
+BACKFILL_MAX_DAYS = 90
+FB_INSIGHTS_MAX_RANGE_DAYS = 90
 
 # --- Wide Format Headers ---
 HEADERS = [
@@ -111,7 +134,7 @@ def get_facebook_stats():
         return None
     
     try:
-        url = f"https://graph.facebook.com/{FACEBOOK_API_VERSION}/{FACEBOOK_PAGE_ID}"
+        url = f"{GRAPH_API_BASE}/{FACEBOOK_API_VERSION}/{FACEBOOK_PAGE_ID}"
         params = {
             'access_token': access_token,
             'fields': 'name,fan_count,followers_count'
@@ -127,7 +150,7 @@ def get_facebook_stats():
         
         # אם אין followers_count, ננסה דרך insights
         if followers_count == 0:
-            insights_url = f"https://graph.facebook.com/{FACEBOOK_API_VERSION}/{FACEBOOK_PAGE_ID}/insights"
+            insights_url = f"{GRAPH_API_BASE}/{FACEBOOK_API_VERSION}/{FACEBOOK_PAGE_ID}/insights"
             insights_params = {
                 'access_token': access_token,
                 'metric': 'page_follows',
@@ -159,29 +182,17 @@ def get_facebook_daily_insights():
         return None
 
     try:
-        url = f"https://graph.facebook.com/{FACEBOOK_API_VERSION}/{FACEBOOK_PAGE_ID}/insights"
+        url = f"{GRAPH_API_BASE}/{FACEBOOK_API_VERSION}/{FACEBOOK_PAGE_ID}/insights"
         params = {
             'access_token': access_token,
-            'metric': ','.join([
-                'page_fan_adds',
-                'page_fan_removes',
-                'page_impressions_unique',
-                'page_post_engagements',
-                'page_video_views'
-            ]),
+            'metric': ','.join(FB_DAILY_METRICS),
             'period': 'day',
             'date_preset': 'yesterday'
         }
 
         res = requests.get(url, params=params).json()
 
-        result = {
-            'fan_adds': 0,
-            'fan_removes': 0,
-            'daily_reach': 0,
-            'daily_engagements': 0,
-            'daily_video_views': 0
-        }
+        result = {key: 0 for key in FB_DAILY_METRICS.values()}
 
         if 'data' in res:
             for item in res['data']:
@@ -189,16 +200,8 @@ def get_facebook_daily_insights():
                 values = item.get('values', [])
                 value = values[0].get('value', 0) if values else 0
 
-                if name == 'page_fan_adds':
-                    result['fan_adds'] = value
-                elif name == 'page_fan_removes':
-                    result['fan_removes'] = value
-                elif name == 'page_impressions_unique':
-                    result['daily_reach'] = value
-                elif name == 'page_post_engagements':
-                    result['daily_engagements'] = value
-                elif name == 'page_video_views':
-                    result['daily_video_views'] = value
+                if name in FB_DAILY_METRICS:
+                    result[FB_DAILY_METRICS[name]] = value
 
         return result
 
@@ -206,6 +209,56 @@ def get_facebook_daily_insights():
         print(f"❌ Facebook Daily Insights Error: {e}")
         return None
 
+
+def get_facebook_daily_insights_range(since_date, until_date):
+    """
+    משיכת נתונים יומיים ברמת הדף לטווח תאריכים (כולל) בבקשת since/until אחת
+    לכל חלון של עד FB_INSIGHTS_MAX_RANGE_DAYS ימים.
+    מחזיר מילון: תאריך (YYYY-MM-DD) -> נתוני היום
+    """
+    access_token = os.environ.get('FACEBOOK_TOKEN')
+    if not access_token:
+        return {}
+
+    url = f"{GRAPH_API_BASE}/{FACEBOOK_API_VERSION}/{FACEBOOK_PAGE_ID}/insights"
+    since = datetime.strptime(since_date, '%Y-%m-%d')
+    until = datetime.strptime(until_date, '%Y-%m-%d')
+    days = {}
+
+    while since <= until:
+        window_end = min(since + timedelta(days=FB_INSIGHTS_MAX_RANGE_DAYS - 1), until)
+        params = {
+            'access_token': access_token,
+            'metric': ','.join(FB_DAILY_METRICS),
+            'period': 'day',
+            'since': since.strftime('%Y-%m-%d'),
+            # until לא כולל את היום עצמו
+            'until': (window_end + timedelta(days=1)).strftime('%Y-%m-%d'),
+        }
+
+        try:
+            res = requests.get(url, params=params).json()
+            if 'error' in res:
+                print(f"❌ Facebook Insights Range Error: {res['error']['message']}")
+            for item in res.get('data', []):
+                key = FB_DAILY_METRICS.get(item.get('name'))
+                if not key:
+                    continue
+                for value in item.get('values', []):
+                    # end_time הוא סוף היום - היום עצמו הוא יום קודם
+                    end_time = value.get('end_time', '')[:10]
+                    if not end_time:
+                        continue
+                    day = (datetime.strptime(end_time, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+                    days.setdefault(day, {k: 0 for k in FB_DAILY_METRICS.values()})
+                    days[day][key] = value.get('value', 0)
+        except Exception as e:
+            print(f"❌ Facebook Insights Range Error: {e}")
+
+        since = window_end + timedelta(days=1)
+
+    return days
+
 # --- Instagram Functions ---
 
 def get_instagram_account_id():
@@ -214,7 +267,7 @@ def get_instagram_account_id():
     if not access_token:
         return None
     
-    url = f"https://graph.facebook.com/{FACEBOOK_API_VERSION}/me"
+    url = f"{GRAPH_API_BASE}/{FACEBOOK_API_VERSION}/me"
     params = {
         'access_token': access_token,
         'fields': 'id,name,instagram_business_account'
@@ -251,7 +304,7 @@ def get_instagram_stats():
         return None
     
     try:
-        url = f"https://graph.facebook.com/{FACEBOOK_API_VERSION}/{ig_account_id}"
+        url = f"{GRAPH_API_BASE}/{FACEBOOK_API_VERSION}/{ig_account_id}"
         params = {
             'access_token': access_token,
             'fields': 'followers_count,media_count'
@@ -285,7 +338,7 @@ def get_instagram_daily_insights():
         return None
     
     try:
-        url = f"https://graph.facebook.com/{FACEBOOK_API_VERSION}/{ig_account_id}/insights"
+        url = f"{GRAPH_API_BASE}/{FACEBOOK_API_VERSION}/{ig_account_id}/insights"
         params = {
             'access_token': access_token,
             'metric': 'reach,impressions',
@@ -336,41 +389,136 @@ def get_sheet_client():
     creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
     return gspread.authorize(creds)
 
+# --- Date Index (date -> row) ---
+
+def _last_column():
+    """אות העמודה האחרונה בפורמט Wide (לפי מספר הכותרות)"""
+    return gspread.utils.rowcol_to_a1(1, len(HEADERS)).rstrip('0123456789')
+
+
+def _row_range(row_number):
+    """טווח A1 של שורה שלמה"""
+    return f"A{row_number}:{_last_column()}{row_number}"
+
+
+def load_date_index():
+    """טעינת אינדקס תאריך->שורה מהקובץ המקומי (אם קיים ושייך לגיליון הנוכחי)"""
+    try:
+        with open(INDEX_FILE, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('sheet') == f"{SPREADSHEET_ID}/{SHEET_NAME}":
+            return {date: int(row) for date, row in data.get('rows', {}).items()}
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {}
+
+
+def save_date_index(index):
+    """שמירת אינדקס תאריך->שורה לקובץ המקומי"""
+    try:
+        with open(INDEX_FILE, 'w', encoding='utf-8') as f:
+            json.dump({'sheet': f"{SPREADSHEET_ID}/{SHEET_NAME}", 'rows': index}, f)
+    except OSError as e:
+        print(f"⚠️ Could not save date index: {e}")
+
+
+def build_date_index(worksheet):
+    """בניית אינדקס מעמודה A בלבד - קריאה אחת בלי שאר העמודות"""
+    dates = worksheet.col_values(1)
+    index = {}
+    for row_number, date in enumerate(dates[1:], start=2):
+        if date and date not in index:
+            index[date] = row_number
+    return index
+
+
+def read_upsert_context(worksheet, index, today):
+    """
+    קריאה ממוקדת אחת (batch_get) של: כותרות, השורה הקודמת, תא התאריך של היום
+    והתא הראשון אחרי השורה האחרונה.
+    מחזיר None אם האינדקס לא תואם את הגיליון (צריך לבנות מחדש).
+    """
+    prev_dates = [d for d in index if d < today]
+    prev_date = max(prev_dates) if prev_dates else None
+    next_row = max(index.values()) + 1 if index else 2
+
+    ranges = [_row_range(1), f"A{next_row}"]
+    if prev_date:
+        ranges.append(_row_range(index[prev_date]))
+    if today in index:
+        ranges.append(f"A{index[today]}")
+
+    results = worksheet.batch_get(ranges)
+    header_row = results[0][0] if results[0] else []
+    after_last = results[1][0][0] if results[1] and results[1][0] else ''
+    if after_last:
+        return None
+
+    prev_row = None
+    if prev_date:
+        prev_values = results[2]
+        prev_row = prev_values[0] if prev_values else []
+        if not prev_row or prev_row[0] != prev_date:
+            return None
+
+    today_row = None
+    if today in index:
+        today_values = results[-1]
+        if not today_values or not today_values[0] or today_values[0][0] != today:
+            return None
+        today_row = index[today]
+
+    return {
+        'header_row': header_row,
+        'prev_row': prev_row,
+        'today_row': today_row,
+        'next_row': next_row,
+    }
+
+
 def save_followers_data(youtube_stats, facebook_stats, instagram_stats):
-    """שמירת נתוני העוקבים לגיליון בפורמט Wide"""
+    """
+    שמירת נתוני העוקבים לגיליון בפורמט Wide.
+    upsert לפי תאריך: אינדקס תאריך->שורה, קריאה של השורה הקודמת בלבד וכתיבה של טווח אחד.
+    """
     gc = get_sheet_client()
     sh = gc.open_by_key(SPREADSHEET_ID)
     
     # יצירת/פתיחת הגיליון
+    index = load_date_index()
     try:
         worksheet = sh.worksheet(SHEET_NAME)
     except:
         worksheet = sh.add_worksheet(title=SHEET_NAME, rows=1000, cols=len(HEADERS))
         worksheet.update('A1', [HEADERS])
+        index = {}
         print(f"✅ Created new sheet: {SHEET_NAME}")
     
-    # קריאת נתונים קיימים
+    today = get_israel_date()
+    pulled_at = get_israel_datetime()
+    
+    # קריאה ממוקדת לפי האינדקס; אם הוא חסר או לא מעודכן - בנייה מחדש מעמודה A
+    context = None
     try:
-        all_values = worksheet.get_all_values()
-        if not all_values or all_values[0] != HEADERS:
-            # עדכון כותרות אם השתנו
-            worksheet.update('A1', [HEADERS])
-            all_values = worksheet.get_all_values()
+        if index:
+            context = read_upsert_context(worksheet, index, today)
+        if context is None:
+            index = build_date_index(worksheet)
+            context = read_upsert_context(worksheet, index, today)
     except Exception as e:
         print(f"⚠️ Warning reading existing data: {e}")
-        worksheet.clear()
-        worksheet.update('A1', [HEADERS])
-        all_values = [HEADERS]
     
-    today = get_israel_date()
-    pulled_at = get_israel_datetime()
+    if context is None:
+        index = build_date_index(worksheet)
+        context = {'header_row': [], 'prev_row': None, 'today_row': index.get(today),
+                   'next_row': max(index.values()) + 1 if index else 2}
     
-    # מציאת השורה הקודמת (לא של היום) לחישוב שינוי
-    prev_row = None
-    for row in reversed(all_values[1:]):
-        if row and len(row) > 0 and row[0] != today:
-            prev_row = row
-            break
+    if context['header_row'] != HEADERS:
+        # עדכון כותרות אם השתנו
+        worksheet.update('A1', [HEADERS])
+    
+    # השורה הקודמת (לא של היום) לחישוב שינוי
+    prev_row = context['prev_row']
     
     # חישוב שינויים
     yt_subscribers_change = 0
@@ -427,20 +575,19 @@ def save_followers_data(youtube_stats, facebook_stats, instagram_stats):
         '', '', '',
     ]
     
-    # בדיקה אם כבר יש שורה להיום
-    row_index = None
-    for i, row in enumerate(all_values[1:], start=2):
-        if row and len(row) > 0 and row[0] == today:
-            row_index = i
-            break
+    # כתיבה של טווח אחד - עדכון השורה של היום או השורה הבאה אחרי האחרונה
+    row_index = context['today_row']
+    target_row = row_index or context['next_row']
+    if target_row > worksheet.row_count:
+        worksheet.add_rows(max(100, target_row - worksheet.row_count))
+    worksheet.update(_row_range(target_row), [new_row])
+    
+    index[today] = target_row
+    save_date_index(index)
     
     if row_index:
-        # עדכון שורה קיימת
-        worksheet.update(f'A{row_index}', [new_row])
         print(f"🔄 Updated existing row for {today}")
     else:
-        # הוספת שורה חדשה
-        worksheet.append_row(new_row)
         print(f"✅ Added new row for {today}")
     
     # הדפסת סיכום
@@ -458,6 +605,120 @@ def save_followers_data(youtube_stats, facebook_stats, instagram_stats):
     
     return True
 
+# --- Backfill ---
+
+def _fb_daily_columns():
+    """טווח העמודות של נתוני הדף היומיים (fb_fan_adds ... fb_daily_video_views)"""
+    first = HEADERS.index('fb_fan_adds') + 1
+    last = HEADERS.index('fb_daily_video_views') + 1
+    first_col = gspread.utils.rowcol_to_a1(1, first).rstrip('0123456789')
+    last_col = gspread.utils.rowcol_to_a1(1, last).rstrip('0123456789')
+    return first_col, last_col, last - first + 1
+
+
+def find_followers_gaps(worksheet, max_days=BACKFILL_MAX_DAYS):
+    """
+    זיהוי חורים בסדרת הזמן: תאריכים בלי שורה, ושורות בלי נתוני דף יומיים.
+    קורא רק את עמודת התאריך ואת עמודות fb היומיות.
+    מחזיר (index, missing_dates, empty_dates)
+    """
+    first_col, last_col, width = _fb_daily_columns()
+    dates_range, fb_range = worksheet.batch_get(["A2:A", f"{first_col}2:{last_col}"])
+
+    index = {}
+    empty_dates = []
+    for offset, date_row in enumerate(dates_range):
+        date = date_row[0] if date_row else ''
+        if not date or date in index:
+            continue
+        index[date] = offset + 2
+        fb_values = fb_range[offset] if offset < len(fb_range) else []
+        if not any(str(v).strip() for v in fb_values[:width]):
+            empty_dates.append(date)
+
+    today = datetime.strptime(get_israel_date(), '%Y-%m-%d')
+    first_date = today - timedelta(days=max_days)
+    if index:
+        first_date = max(first_date, datetime.strptime(min(index), '%Y-%m-%d'))
+
+    missing_dates = []
+    day = first_date
+    while day < today:
+        date = day.strftime('%Y-%m-%d')
+        if date not in index:
+            missing_dates.append(date)
+        day += timedelta(days=1)
+
+    cutoff = first_date.strftime('%Y-%m-%d')
+    today_str = today.strftime('%Y-%m-%d')
+    empty_dates = [d for d in empty_dates if cutoff <= d < today_str]
+    return index, missing_dates, empty_dates
+
+
+def backfill_followers_gaps():
+    """
+    מילוי חורים בנתוני הדף היומיים: בקשת insights אחת לטווח כולו
+    וכתיבה של כל השורות שמולאו ב-batch_update אחד.
+    """
+    gc = get_sheet_client()
+    sh = gc.open_by_key(SPREADSHEET_ID)
+    worksheet = sh.worksheet(SHEET_NAME)
+
+    index, missing_dates, empty_dates = find_followers_gaps(worksheet)
+    target_dates = sorted(set(missing_dates) | set(empty_dates))
+    print(f"🔍 Found {len(missing_dates)} missing days and {len(empty_dates)} rows without daily data")
+    if not target_dates:
+        print("✅ No gaps to backfill")
+        return 0
+
+    # שורה של יום D מכילה את נתוני "אתמול" ביחס ל-D
+    def insights_day(date):
+        return (datetime.strptime(date, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+
+    daily = get_facebook_daily_insights_range(insights_day(target_dates[0]), insights_day(target_dates[-1]))
+
+    first_col, last_col, _ = _fb_daily_columns()
+    fb_start = HEADERS.index('fb_fan_adds')
+    pulled_at = get_israel_datetime()
+    next_row = max(index.values()) + 1 if index else 2
+    updates = []
+    appended = 0
+
+    for date in target_dates:
+        fb = daily.get(insights_day(date))
+        if not fb:
+            continue
+        fb_values = [fb[key] for key in FB_DAILY_METRICS.values()]
+
+        if date in index:
+            row_number = index[date]
+            updates.append({'range': f"{first_col}{row_number}:{last_col}{row_number}", 'values': [fb_values]})
+        else:
+            new_row = [''] * len(HEADERS)
+            new_row[0] = date
+            new_row[1] = pulled_at
+            new_row[fb_start:fb_start + len(fb_values)] = fb_values
+            updates.append({'range': _row_range(next_row), 'values': [new_row]})
+            next_row += 1
+            appended += 1
+
+    if not updates:
+        print("⚠️ No insights returned for the missing days")
+        return 0
+
+    if next_row - 1 > worksheet.row_count:
+        worksheet.add_rows(next_row - 1 - worksheet.row_count + 100)
+    worksheet.batch_update(updates)
+
+    if appended:
+        # שורות חדשות נוספו בסוף - מיון לפי תאריך כדי לשמור על סדר כרונולוגי
+        worksheet.sort((1, 'asc'), range=f"A2:{_last_column()}{next_row - 1}")
+        # מיקומי השורות השתנו - האינדקס ייבנה מחדש בריצה הבאה
+        save_date_index({})
+
+    print(f"✅ Backfilled {len(updates)} days ({appended} new rows)")
+    return len(updates)
+
 # --- Main ---
 
 def main():
@@ -465,22 +726,32 @@ def main():
     print(f"📊 Followers Tracker (Wide Format) - {get_israel_datetime()}")
     print(f"{'='*50}\n")
     
+    # מצב Backfill: מילוי ימים חסרים בלבד
+    if '--backfill' in sys.argv:
+        backfill_followers_gaps()
+        return
+    
     # משיכת נתונים מכל הפלטפורמות
-    youtube_stats = get_youtube_stats()
-    facebook_stats = get_facebook_stats()
-    instagram_stats = get_instagram_stats()
+    with stage('fetch'):
+        youtube_stats = get_youtube_stats()
+        facebook_stats = get_facebook_stats()
+        instagram_stats = get_instagram_stats()
     
     # בדיקה שיש לפחות פלטפורמה אחת עם נתונים
     if not youtube_stats and not facebook_stats and not instagram_stats:
         print("❌ No data collected from any platform!")
+        mark_failed('no_data')
         return
     
     # שמירה לשיטס
-    save_followers_data(youtube_stats, facebook_stats, instagram_stats)
+    with stage('sheet_write'):
+        save_followers_data(youtube_stats, facebook_stats, instagram_stats)
     
     print(f"\n{'='*50}")
     print("✅ Followers tracking complete!")
     print(f"{'='*50}\n")
 
 if __name__ == "__main__":
-    main()
+    install_stop_handler()
+    with track_run('followers_tracker'), profile_run('followers_tracker'):
+        main()
@@ -0,0 +1,454 @@
+"""
+Gemini Utils - עזרים משותפים לקריאות Gemini בדוחות
+Cache מקומי לתשובות, לפי hash של (מודל, פרומפט, הגדרות יצירה)
+ו-hedging: מודל הגיבוי מתחיל במקביל אם הראשי לא החזיר chunk ראשון בזמן
+ו-context caching: ההוראות הקבועות של הדוח נשמרות ב-cached content בצד של Gemini
+ו-Reflection: טיוטה ממודל מהיר ואז ביקורת ותיקון תחת deadline קשיח
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import hashlib
+import threading
+from google.genai import types
+from run_telemetry import count
+
+# --- הגדרות ---
+CACHE_DIR = os.environ.get('GEMINI_CACHE_DIR', '.gemini_cache')
+CACHE_TTL_HOURS = float(os.environ.get('GEMINI_CACHE_TTL_HOURS', '12'))
+
+# Hedging: אחרי כמה שניות בלי chunk ראשון מפעילים את המודל הבא במקביל
+HEDGE_AFTER_SEC = float(os.environ.get('GEMINI_HEDGE_AFTER_SEC', '20'))
+# זמן מקסימלי לתשובה מלאה ממודל אחד
+MODEL_DEADLINE_SEC = float(os.environ.get('GEMINI_MODEL_DEADLINE_SEC', '240'))
+
+# Context caching להוראות הקבועות (GEMINI_CONTEXT_CACHE=0 לביטול)
+CONTEXT_CACHE_ENABLED = os.environ.get('GEMINI_CONTEXT_CACHE', '1') != '0'
+# קצת יותר מיממה - כדי שהריצה של מחר תמצא את ה-cache של היום
+CONTEXT_CACHE_TTL_SEC = int(os.environ.get('GEMINI_CONTEXT_CACHE_TTL_SEC', str(26 * 3600)))
+CONTEXT_CACHE_PREFIX = 'kan-report'
+# הוראות שקטנות מהמינימום של המודל ל-cached content - נזכרות כאן (ב-CACHE_DIR, שנשמר בין ריצות)
+CONTEXT_CACHE_SKIP_FILE = 'context_cache_too_small.json'
+
+# Reflection: מודל מהיר לטיוטה, וזמן מקסימלי לשלב הביקורת
+DRAFT_MODELS = ["gemini-2.5-flash"]
+REFLECTION_DEADLINE_SEC = float(os.environ.get('GEMINI_REFLECTION_DEADLINE_SEC', '90'))
+
+CRITIQUE_PROMPT = """אתה עורך ביקורתי. קיבלת את הנתונים ואת טיוטת הדוח שנכתבה מהם.
+בדוק את הטיוטה מול הנתונים ומול ההוראות, ותקן:
+- כל מספר, מזהה או לינק שלא מופיע בנתונים - תקן או הסר
+- תובנות כלליות או השערות שלא מבוססות על הנתונים - החלף בתובנה ספציפית או הסר
+- תובנות שחוזרות על אותו נושא - גוון
+- "הפתעות" שהן בעצם המחזור הרגיל (למשל סרטון מאתמול בערב שהוביל) - תקן
+החזר את הדוח המתוקן בלבד, באותו פורמט בדיוק כמו הטיוטה, בלי הערות.
+"""
+
+# (model, hash) -> שם ה-cached content, או None אם לא ניתן ליצור
+_context_caches = {}
+_context_cache_lock = threading.Lock()
+
+
+def is_force_refresh():
+    """דילוג על ה-cache: --no-cache בשורת הפקודה או GEMINI_FORCE_REFRESH=1"""
+    return '--no-cache' in sys.argv or os.environ.get('GEMINI_FORCE_REFRESH') == '1'
+
+
+def cache_key(model, prompt, config=None):
+    """מפתח תוכן: sha256 של המודל, הפרומפט והגדרות היצירה"""
+    payload = json.dumps(
+        {'model': model, 'prompt': prompt, 'config': config or {}},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def get_cached_response(model, prompt, config=None, ttl_hours=None):
+    """החזרת תשובה שמורה אם קיימת ולא פג תוקפה, אחרת None"""
+    ttl_hours = CACHE_TTL_HOURS if ttl_hours is None else ttl_hours
+    try:
+        with open(_cache_path(cache_key(model, prompt, config)), encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if time.time() - entry.get('created_at', 0) > ttl_hours * 3600:
+        return None
+    return entry.get('response') or None
+
+
+def save_cached_response(model, prompt, response_text, config=None):
+    """שמירת תשובה ל-cache"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        path = _cache_path(cache_key(model, prompt, config))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model': model, 'created_at': time.time(), 'response': response_text}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"   ⚠️ Could not write Gemini cache: {e}")
+
+
+def is_valid_response(response_text, config=None):
+    """תשובה שנשמרת ל-cache: כשהתבקש JSON - רק JSON תקין (אחרת כל ריצה חוזרת הייתה מקבלת אותה שוב)"""
+    if (config or {}).get('response_mime_type') != 'application/json':
+        return True
+    try:
+        json.loads(response_text)
+    except ValueError:
+        return False
+    return True
+
+
+def _skip_path():
+    return os.path.join(CACHE_DIR, CONTEXT_CACHE_SKIP_FILE)
+
+
+def _load_too_small():
+    """{'model:hash': זמן} של הוראות שקטנות מדי ל-context cache"""
+    try:
+        with open(_skip_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remember_too_small(skip_key):
+    """רישום ההוראות כקטנות מדי - ריצות הבאות לא יקראו ל-caches.list / create בשבילן"""
+    skipped = _load_too_small()
+    skipped[skip_key] = time.time()
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{_skip_path()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(skipped, f)
+        os.replace(tmp_path, _skip_path())
+    except OSError as e:
+        print(f"   ⚠️ Could not write Gemini cache: {e}")
+
+
+def get_context_cache(client, model_name, system_instruction):
+    """
+    החזרת שם ה-cached content של ההוראות הקבועות למודל, ויצירה לפי הצורך.
+    ה-cache מזוהה לפי hash של ההוראות - שינוי בהוראות יוצר cache חדש
+    (הישן פג לפי ה-TTL). מחזיר None אם לא ניתן (למשל מתחת למינימום הטוקנים של המודל).
+    הוראות שנדחו כקטנות מדי נזכרות על הדיסק לפי ה-hash, ולא מנסים ליצור להן cache שוב.
+    """
+    if not CONTEXT_CACHE_ENABLED:
+        return None
+
+    digest = hashlib.sha256(system_instruction.encode('utf-8')).hexdigest()[:16]
+    memo_key = (model_name, digest)
+    with _context_cache_lock:
+        if memo_key in _context_caches:
+            return _context_caches[memo_key]
+    skip_key = f"{model_name}:{digest}"
+    if skip_key in _load_too_small():
+        with _context_cache_lock:
+            _context_caches[memo_key] = None
+        return None
+
+    display_name = f"{CONTEXT_CACHE_PREFIX}-{digest}"
+    ttl = f"{CONTEXT_CACHE_TTL_SEC}s"
+    name = None
+    try:
+        for cached in client.caches.list():
+            if cached.display_name == display_name and (cached.model or '').endswith(model_name):
+                name = cached.name
+                # הארכת התוקף כדי שה-cache ימשיך לשמש בריצות הבאות
+                client.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=ttl))
+                break
+
+        if not name:
+            cached = client.caches.create(
+                model=model_name,
+                config=types.CreateCachedContentConfig(
+                    display_name=display_name,
+                    system_instruction=system_instruction,
+                    ttl=ttl,
+                ),
+            )
+            name = cached.name
+            print(f"   🗄️ Created context cache for {model_name}: {name}")
+    except Exception as e:
+        print(f"   ⚠️ Context cache unavailable for {model_name}, sending instructions inline: {e}")
+        # "Cached content is too small" - קבוע עד שההוראות משתנות (hash אחר)
+        if 'too small' in str(e).lower():
+            _remember_too_small(skip_key)
+
+    with _context_cache_lock:
+        _context_caches[memo_key] = name
+    return name
+
+
+def build_generation_config(client, model_name, config=None, system_instruction=None):
+    """הגדרות יצירה למודל: ההוראות הקבועות דרך cached content, או inline כגיבוי"""
+    config = dict(config or {})
+    if system_instruction:
+        cache_name = get_context_cache(client, model_name, system_instruction)
+        if cache_name:
+            config['cached_content'] = cache_name
+        else:
+            config['system_instruction'] = system_instruction
+    return types.GenerateContentConfig(**config) if config else None
+
+
+def stream_model(client, model_name, prompt, config=None, on_chunk=None, cancel_event=None,
+                 system_instruction=None, usage=None):
+    """
+    יצירת תשובה מלאה ממודל אחד (streaming).
+    on_chunk נקרא עם הטקסט המצטבר אחרי כל chunk; cancel_event עוצר את הקריאה.
+    usage (dict) מתמלא בספירת הטוקנים מה-chunk האחרון.
+    """
+    contents = [
+        types.Content(
+            role="user",
+            parts=[types.Part.from_text(text=prompt)],
+        ),
+    ]
+    response_text = ""
+    for chunk in client.models.generate_content_stream(
+        model=model_name,
+        contents=contents,
+        config=build_generation_config(client, model_name, config, system_instruction),
+    ):
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        if chunk.text:
+            response_text += chunk.text
+            if on_chunk:
+                on_chunk(response_text)
+        metadata = getattr(chunk, 'usage_metadata', None)
+        if usage is not None and metadata:
+            usage['prompt_tokens'] = metadata.prompt_token_count or 0
+            usage['output_tokens'] = metadata.candidates_token_count or 0
+            usage['cached_tokens'] = getattr(metadata, 'cached_content_token_count', None) or 0
+    return response_text
+
+
+def generate_hedged(client, models_to_try, prompt, config=None, on_chunk=None,
+                    hedge_after=None, deadline=None, system_instruction=None,
+                    total_deadline=None, usage=None):
+    """
+    הרצת מודלים עם hedging במקום fallback סדרתי.
+    המודל הראשון מתחיל מיד; אם לא הגיע ממנו chunk ראשון תוך hedge_after שניות
+    (או שנכשל) - המודל הבא מתחיל במקביל. התשובה המלאה הראשונה מנצחת.
+    עם on_chunk: רק המודל הראשון שהתחיל להחזיר טקסט מוזרם. אם מודל אחר מסיים לפניו - הוא
+    מנצח, הזרם נעצר, והתשובה שלו נשלחת ל-on_chunk ומחליפה את הטקסט המוזרם (העריכה הסופית
+    של StreamingMessage.finish עושה את זה בכל מקרה עם editMessageText).
+    מודל שלא סיים תוך deadline שניות נחשב כנכשל; total_deadline עוצר את כל הניסיונות.
+    usage (dict) מתמלא בטוקנים ובזמן של המודל המנצח; כשנגמר total_deadline - של המודל האחרון
+    שהופעל, עם timed_out=True.
+    מחזיר (model_name, text) או (None, None).
+    """
+    hedge_after = HEDGE_AFTER_SEC if hedge_after is None else hedge_after
+    deadline = MODEL_DEADLINE_SEC if deadline is None else deadline
+
+    results = queue.Queue()
+    cancel_event = threading.Event()
+    first_chunk = {}
+    started_at = {}
+    model_usage = {}
+    give_up_at = time.monotonic() + total_deadline if total_deadline else None
+    # on_chunk מקבל רק את הזרם של המודל הראשון שהתחיל להחזיר טקסט, ורק עד שנבחר מנצח
+    streaming_model = []
+    winner = []
+    lock = threading.Lock()
+
+    def worker(model_name):
+        def chunk_callback(text):
+            first_chunk[model_name].set()
+            if on_chunk:
+                with lock:
+                    if winner:
+                        return
+                    if not streaming_model:
+                        streaming_model.append(model_name)
+                    if streaming_model[0] == model_name:
+                        on_chunk(text)
+
+        model_usage[model_name] = {}
+        try:
+            text = stream_model(client, model_name, prompt, config, chunk_callback, cancel_event,
+                                system_instruction, model_usage[model_name])
+            results.put((model_name, text, None))
+        except Exception as e:
+            results.put((model_name, None, e))
+
+    def launch(model_name):
+        print(f"   Trying model: {model_name}")
+        first_chunk[model_name] = threading.Event()
+        started_at[model_name] = time.monotonic()
+        threading.Thread(target=worker, args=(model_name,), daemon=True).start()
+
+    pending = set()
+    next_model = 0
+
+    def finish(model_name, text):
+        cancel_event.set()
+        elapsed = time.monotonic() - started_at[model_name]
+        print(f"   ✅ {model_name} answered in {elapsed:.1f}s")
+        with lock:
+            winner.append(model_name)
+            streamed = streaming_model[0] if streaming_model else None
+        if on_chunk and streamed != model_name:
+            # הזרם הציג מודל אחר (איטי או שנכשל) - מחליפים בתשובה המנצחת
+            if streamed:
+                print(f"   {model_name} finished before the streamed {streamed} - replacing the streamed text")
+            on_chunk(text)
+        if usage is not None:
+            usage.update(model_usage.get(model_name, {}), model=model_name, seconds=round(elapsed, 1))
+        return model_name, text
+
+    def launch_next():
+        nonlocal next_model
+        model_name = models_to_try[next_model]
+        if next_model:
+            count('llm_hedges')
+        next_model += 1
+        pending.add(model_name)
+        launch(model_name)
+
+    launch_next()
+
+    while pending:
+        now = time.monotonic()
+        last_model = models_to_try[next_model - 1]
+        can_hedge = next_model < len(models_to_try) and not first_chunk[last_model].is_set()
+
+        # המתנה עד לנקודת ההחלטה הבאה: hedge או deadline של אחד המודלים
+        wake_times = [started_at[m] + deadline for m in pending]
+        if can_hedge:
+            wake_times.append(started_at[last_model] + hedge_after)
+        if give_up_at:
+            if now >= give_up_at:
+                print(f"   ⏱️ Total deadline of {total_deadline:g}s reached")
+                if usage is not None:
+                    usage.update(model_usage.get(last_model, {}), model=last_model, timed_out=True,
+                                 seconds=round(now - started_at[last_model], 1))
+                break
+            wake_times.append(give_up_at)
+        timeout = max(0.0, min(wake_times) - now)
+
+        try:
+            model_name, text, error = results.get(timeout=timeout)
+        except queue.Empty:
+            now = time.monotonic()
+            for m in list(pending):
+                if now - started_at[m] >= deadline:
+                    print(f"   Model {m} failed: deadline of {deadline:g}s exceeded")
+                    pending.discard(m)
+            if can_hedge and now - started_at[last_model] >= hedge_after:
+                print(f"   ⏱️ No first chunk from {last_model} after {hedge_after:g}s - hedging")
+                launch_next()
+            elif not pending and next_model < len(models_to_try):
+                launch_next()
+            continue
+
+        if model_name not in pending:
+            continue
+        pending.discard(model_name)
+
+        if text:
+            return finish(model_name, text)
+
+        print(f"   Model {model_name} failed: {error or 'empty response'}")
+        if next_model < len(models_to_try) and models_to_try[next_model] not in pending:
+            launch_next()
+
+    cancel_event.set()
+    return None, None
+
+
+def generate_with_fallback(client, models_to_try, prompt, config=None, force_refresh=None, on_chunk=None,
+                           system_instruction=None, total_deadline=None, usage=None):
+    """
+    יצירת תשובה עם hedging בין המודלים (ראה generate_hedged).
+    system_instruction - החלק הקבוע של הפרומפט, נשלח דרך context cache.
+    תשובה זהה (אותו מודל, פרומפט והגדרות) נשלפת מה-cache בלי קריאה למודל.
+    מחזיר None אם כל המודלים נכשלו.
+    """
+    if force_refresh is None:
+        force_refresh = is_force_refresh()
+
+    # מפתח ה-cache המקומי כולל גם את ההוראות הקבועות
+    cache_config = dict(config or {}, system_instruction=system_instruction) if system_instruction else config
+
+    if not force_refresh:
+        for model_name in models_to_try:
+            cached = get_cached_response(model_name, prompt, cache_config)
+            if cached:
+                print(f"   ⚡ Using cached response ({model_name})")
+                if usage is not None:
+                    usage.update(model=model_name, cached=True, seconds=0)
+                return cached
+
+    model_name, response_text = generate_hedged(client, models_to_try, prompt, config, on_chunk,
+                                                system_instruction=system_instruction,
+                                                total_deadline=total_deadline, usage=usage)
+    if response_text:
+        if is_valid_response(response_text, config):
+            save_cached_response(model_name, prompt, response_text, cache_config)
+        else:
+            print(f"   ⚠️ Invalid JSON from {model_name} - not caching the response")
+        return response_text
+
+    return None
+
+
+def _log_stage(stage, usage):
+    """הדפסת זמן וטוקנים של שלב ביצירה"""
+    if usage.get('cached'):
+        print(f"   📊 {stage}: cached ({usage.get('model')})")
+        return
+    print(f"   📊 {stage}: {usage.get('model')} | {usage.get('seconds', 0)}s | "
+          f"{usage.get('prompt_tokens', 0):,} in / {usage.get('output_tokens', 0):,} out tokens")
+
+
+def generate_with_reflection(client, critique_models, prompt, config=None, system_instruction=None,
+                             on_chunk=None, draft_models=None, deadline=None):
+    """
+    Reflection בשני שלבים: מודל מהיר כותב טיוטה, ואז מודל חזק מבקר ומתקן אותה.
+    שלב הביקורת רץ תחת deadline קשיח - אם הוא לא מסתיים בזמן, הטיוטה נשלחת כמו שהיא.
+    מחזיר None רק אם גם הטיוטה נכשלה.
+    """
+    draft_models = draft_models or DRAFT_MODELS
+    deadline = REFLECTION_DEADLINE_SEC if deadline is None else deadline
+
+    # שלב 1: טיוטה (עם המודלים החזקים כגיבוי אם המהיר נכשל)
+    draft_usage = {}
+    draft = generate_with_fallback(client, draft_models + critique_models, prompt, config,
+                                   on_chunk=on_chunk, system_instruction=system_instruction,
+                                   usage=draft_usage)
+    if not draft:
+        return None
+    _log_stage("Draft", draft_usage)
+
+    # שלב 2: ביקורת ותיקון תחת deadline
+    critique_prompt = f"""{CRITIQUE_PROMPT}
+=== 📊 נתונים ===
+{prompt}
+
+=== 📝 טיוטה ===
+{draft}
+"""
+    critique_usage = {}
+    revised = generate_with_fallback(client, critique_models, critique_prompt, config,
+                                     system_instruction=system_instruction,
+                                     total_deadline=deadline, usage=critique_usage)
+    if critique_usage.get('model'):
+        _log_stage("Critique", critique_usage)
+    if not revised:
+        if critique_usage.get('timed_out'):
+            print(f"   ⏱️ Critique did not finish within {deadline:g}s - shipping the draft")
+        else:
+            print("   ⚠️ Critique failed (all models returned errors) - shipping the draft")
+        return draft
+    return revised
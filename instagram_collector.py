@@ -9,10 +9,20 @@ import pandas as pd
 import gspread
 from google.oauth2.service_account import Credentials
 from datetime import datetime, timedelta
+from daily_rollup import update_rollup
+from run_telemetry import track_run, stage, mark_failed
+from run_scheduler import (is_priority, should_defer, record_deferred, can_finish, install_stop_handler,
+                           load_priority_ids, save_priority_ids)
+from collector_checkpoint import CollectorCheckpoint
+from sheet_journal import flush, write_sheet
+from sheet_stream import SheetChunkWriter
+from profiling import profile_run
+import sys
 import time
 import json
 import re  # for timestamp parsing
 import pytz  # for Israel timezone
+from itertools import chain
 
 # Load .env file if exists (for local development)
 try:
@@ -24,29 +34,40 @@ except ImportError:
 # --- Config ---
 ACCESS_TOKEN = os.environ.get('FACEBOOK_TOKEN')
 API_VERSION = "v24.0"
+# כתובת ה-Graph API (לבדיקות עומס: סימולטור מקומי, ראו benchmarks/graph_simulator.py)
+GRAPH_API_BASE = os.environ.get('GRAPH_API_BASE', 'https://graph.facebook.com').rstrip('/')
 
-# ימים אחורה: 16 להרצה ראשונה, 3 לאוטומציה יומית
-# לשנות ל-3 אחרי ההרצה הראשונה
-DAYS_BACK = 7
+# ימים אחורה (DAYS_BACK בסביבה); היסטוריה ארוכה נטענת עם backfill.py
+DAYS_BACK = int(os.environ.get('DAYS_BACK') or 7)
+# מגביל קצב משותף (rate_limiter.RateLimiter) - כשמוגדר (backfill.py, כמה חלונות במקביל),
+# כל קריאה ל-Graph ממתינה ל-token במקום ההשהיה הקבועה בין פוסטים
+RATE_LIMITER = None
 
 SPREADSHEET_ID = "1WB0cFc2RgR1Z-crjhtkSqLKp1mMdFoby8NwV7h3UN6c"
 SHEET_NAME = "נתוני אינסטגרם"
 
 # --- Functions ---
 
+def graph_get(url, params):
+    """GET ל-Graph API (JSON) - דרך RATE_LIMITER כשהוגדר"""
+    if RATE_LIMITER is not None:
+        RATE_LIMITER.acquire()
+    return requests.get(url, params=params).json()
+
+
 def get_instagram_account_id():
     """משיכת ה-Instagram Business Account ID מהדף המחובר"""
     
     # נסיון 1: אם יש לנו Page Token, ננסה לשלוף ישירות את ה-IG account
     # קודם נגלה את ה-Page ID מה-token
-    url = f"https://graph.facebook.com/{API_VERSION}/me"
+    url = f"{GRAPH_API_BASE}/{API_VERSION}/me"
     params = {
         'access_token': ACCESS_TOKEN,
         'fields': 'id,name,instagram_business_account'
     }
     
     try:
-        res = requests.get(url, params=params).json()
+        res = graph_get(url, params)
         
         if 'error' in res:
             print(f"❌ Error: {res['error']['message']}")
@@ -62,12 +83,12 @@ def get_instagram_account_id():
         page_id = res.get('id')
         if page_id:
             # ננסה לשלוף את ה-Instagram account מה-Page
-            page_url = f"https://graph.facebook.com/{API_VERSION}/{page_id}"
+            page_url = f"{GRAPH_API_BASE}/{API_VERSION}/{page_id}"
             page_params = {
                 'access_token': ACCESS_TOKEN,
                 'fields': 'instagram_business_account'
             }
-            page_res = requests.get(page_url, params=page_params).json()
+            page_res = graph_get(page_url, page_params)
             
             ig_account = page_res.get('instagram_business_account')
             if ig_account:
@@ -116,7 +137,7 @@ def get_media_insights(media_id, media_type):
             'total_interactions',
         ]
     
-    url = f"https://graph.facebook.com/{API_VERSION}/{media_id}/insights"
+    url = f"{GRAPH_API_BASE}/{API_VERSION}/{media_id}/insights"
     params = {
         'access_token': ACCESS_TOKEN,
         'metric': ','.join(metrics)
@@ -132,7 +153,7 @@ def get_media_insights(media_id, media_type):
     }
     
     try:
-        res = requests.get(url, params=params).json()
+        res = graph_get(url, params)
         
         if 'error' in res:
             # הדפסת השגיאה כדי להבין מה לא עובד
@@ -163,31 +184,42 @@ def get_media_insights(media_id, media_type):
     return result
 
 
-def fetch_instagram_media(ig_account_id):
-    """משיכת פוסטים ורילסים מאינסטגרם"""
-    print(f"🚀 Instagram Collector - Fetching last {DAYS_BACK} days")
-    
-    since_date = datetime.now() - timedelta(days=DAYS_BACK)
+def iter_instagram_media(ig_account_id, checkpoint, since=None, until=None):
+    """
+    generator: דף מדיה -> insights -> שורה מוכנה לגיליון, פריט אחרי פריט.
+    checkpoint - יומן הריצה (collector_checkpoint): כל פריט ו-cursor נרשמים בו,
+    וריצה חוזרת ממשיכה מהמקום שבו הקודמת נפלה (פריטים שכבר ביומן לא חוזרים).
+    since / until (datetime) - חלון הזמן; ברירת המחדל: DAYS_BACK הימים האחרונים.
+    """
+    since_date = since or datetime.now() - timedelta(days=DAYS_BACK)
     since_unix = int(since_date.timestamp())
-    
-    all_media = []
+    until_unix = int(until.timestamp()) if until else None
+    leaders = load_priority_ids('instagram_collector')
     
     # שליפת מדיה
-    url = f"https://graph.facebook.com/{API_VERSION}/{ig_account_id}/media"
+    url = f"{GRAPH_API_BASE}/{API_VERSION}/{ig_account_id}/media"
     params = {
         'access_token': ACCESS_TOKEN,
         'fields': 'id,caption,media_type,media_url,permalink,thumbnail_url,timestamp,like_count,comments_count',
         'limit': 50,
     }
+    if until_unix:
+        # חלון של backfill - ה-API מדלג ישר לתחילת החלון
+        params.update({'since': since_unix, 'until': until_unix})
+    if checkpoint.cursor:
+        url, params = checkpoint.cursor, {'access_token': ACCESS_TOKEN}
     
-    while True:
-        res = requests.get(url, params=params).json()
+    # סוף הרשימה / החלון מסמן שהאיסוף הושלם (שגיאת API לא, וריצה חוזרת תמשיך מה-cursor)
+    while not checkpoint.complete:
+        with stage('fetch'):
+            res = graph_get(url, params)
         
         if 'error' in res:
             print(f"❌ API Error: {res['error']['message']}")
             break
             
         if 'data' not in res or not res['data']:
+            checkpoint.mark_complete()
             break
         
         for media in res['data']:
@@ -202,10 +234,18 @@ def fetch_instagram_media(ig_account_id):
                     break
             
             media_id = media['id']
+            if checkpoint.has(media_id) or (until_unix and timestamp and media_date.timestamp() >= until_unix):
+                continue
             media_type = media.get('media_type', 'IMAGE')
             
-            # משיכת insights
-            insights = get_media_insights(media_id, media_type)
+            # תחת תקציב זמן (run_scheduler) - מדיה ישנה נדחית לריצה הבאה (חוץ מהמובילים בדלתא)
+            if should_defer(priority=not timestamp or is_priority(media_date, media_id, leaders)):
+                checkpoint.add_deferred(media_id)
+                continue
+            
+            with stage('enrich'):
+                # משיכת insights
+                insights = get_media_insights(media_id, media_type)
             
             # קביעת סוג תוכן
             if media_type == 'VIDEO':
@@ -215,7 +255,15 @@ def fetch_instagram_media(ig_account_id):
             else:
                 content_type = 'Photo'
             
-            all_media.append({
+            # חישוב engagement rate
+            engagement_rate = 0
+            reach = insights.get('reach', 0)
+            if reach > 0:
+                total_eng = (media.get('like_count', 0) + media.get('comments_count', 0)
+                             + insights.get('saved', 0) + insights.get('shares', 0))
+                engagement_rate = round((total_eng / reach) * 100, 2)
+
+            row = {
                 'media_id': media_id,
                 'date': media_date.astimezone(pytz.timezone('Asia/Jerusalem')).strftime('%Y-%m-%d') if timestamp else '',
                 'time': media_date.astimezone(pytz.timezone('Asia/Jerusalem')).strftime('%H:%M') if timestamp else '',
@@ -229,12 +277,15 @@ def fetch_instagram_media(ig_account_id):
                 'shares': insights.get('shares', 0),
                 'total_interactions': insights.get('total_interactions', 0),
                 'avg_watch_sec': insights.get('avg_watch_sec', 0),
-                'engagement_rate': 0,  # יחושב אחר כך
+                'engagement_rate': engagement_rate,
                 'permalink': media.get('permalink', ''),
                 'pulled_at': datetime.now(pytz.timezone('Asia/Jerusalem')).strftime('%Y-%m-%d %H:%M')
-            })
+            }
+            checkpoint.add_item(media_id, row)
+            yield row
             
-            time.sleep(0.15)  # Rate limiting
+            if RATE_LIMITER is None:
+                time.sleep(0.15)  # Rate limiting
         
         # בדיקה אם הגענו לתאריך היעד
         if res['data']:
@@ -244,62 +295,54 @@ def fetch_instagram_media(ig_account_id):
                 ts_normalized = re.sub(r'\+0000$', '+00:00', last_timestamp.replace('Z', '+00:00'))
                 last_date = datetime.fromisoformat(ts_normalized)
                 if last_date.timestamp() < since_unix:
+                    checkpoint.mark_complete()
                     break
         
         # דף הבא
         if 'paging' in res and 'next' in res['paging']:
             url = res['paging']['next']
             params = {}
+            checkpoint.set_cursor(url)
         else:
+            checkpoint.mark_complete()
             break
-    
-    print(f"📊 Fetched {len(all_media)} media items")
-    
-    # חישוב engagement rate
-    for item in all_media:
-        reach = item.get('reach', 0)
-        if reach > 0:
-            total_eng = item['likes'] + item['comments'] + item['saved'] + item['shares']
-            item['engagement_rate'] = round((total_eng / reach) * 100, 2)
-    
-    return pd.DataFrame(all_media)
 
 
-def save_to_sheets(new_df):
-    """שמירה חכמה לגוגל שיטס עם מיזוג נתונים"""
-    if new_df.empty:
-        print("⚠️ No data to save")
-        return
-    
-    creds_json = os.environ.get('GCP_SERVICE_ACCOUNT')
-    if not creds_json:
-        creds_json = os.environ.get('GOOGLE_CREDENTIALS')
+def fetch_instagram_media(ig_account_id, checkpoint=None):
+    """משיכת כל הפוסטים והרילסים בחלון לטבלה אחת (כולל פריטים מיומן של ריצה קודמת)"""
+    print(f"🚀 Instagram Collector - Fetching last {DAYS_BACK} days")
+    if checkpoint is None:
+        checkpoint = CollectorCheckpoint('instagram_collector', persist=False)
 
-    creds_dict = json.loads(creds_json)
-    scopes = [
-        'https://www.googleapis.com/auth/spreadsheets',
-        'https://www.googleapis.com/auth/drive'
-    ]
-    creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-    gc = gspread.authorize(creds)
-    sh = gc.open_by_key(SPREADSHEET_ID)
+    for _ in iter_instagram_media(ig_account_id, checkpoint):
+        pass
 
-    try:
-        worksheet = sh.worksheet(SHEET_NAME)
-    except:
-        # יצירת גיליון חדש
-        worksheet = sh.add_worksheet(title=SHEET_NAME, rows=1000, cols=20)
-        print(f"✅ Created new sheet: {SHEET_NAME}")
+    all_media = checkpoint.rows()
+    print(f"📊 Fetched {len(all_media)} media items")
+    record_deferred('instagram_collector', checkpoint.deferred)
+
+    df = pd.DataFrame(all_media)
+    df.attrs['deferred_ids'] = checkpoint.deferred
+    return df
 
-    # קריאת היסטוריה
-    try:
-        existing_data = worksheet.get_all_records()
-        existing_df = pd.DataFrame(existing_data)
-    except Exception as e:
-        print(f"⚠️ Warning reading existing data: {e}")
-        existing_df = pd.DataFrame()
 
-    # מיזוג
+def fetch_today_media(ig_account_id):
+    """
+    המדיה של היום בלבד (מחצות שעון ישראל), לעדכון במהלך היום (telegram_reporter --intraday).
+    בלי יומן, בלי merge ובלי כתיבה לגיליון - views_delta / reach_delta נשארים מול הריצה היומית.
+    """
+    midnight = datetime.now(pytz.timezone('Asia/Jerusalem')).replace(hour=0, minute=0, second=0, microsecond=0)
+    checkpoint = CollectorCheckpoint('instagram_collector', persist=False)
+    return pd.DataFrame(list(iter_instagram_media(ig_account_id, checkpoint, since=midnight)))
+
+
+def merge_media(new_df, existing_df):
+    """
+    מיזוג המדיה שנאספה עם ההיסטוריה מהגיליון (בלי גישה לגיליון):
+    views_delta / reach_delta מול ההרצה הקודמת, איחוד לפי media_id (הנתון החדש גובר), מיון וניקוי.
+    מדיה שנדחתה בריצה הזו (new_df.attrs['deferred_ids']) נשארת כמו שהיא, עם דלתא 0.
+    """
+    deferred = [str(media_id) for media_id in new_df.attrs.get('deferred_ids', [])]
     if not existing_df.empty:
         new_df['media_id'] = new_df['media_id'].astype(str)
         existing_df['media_id'] = existing_df['media_id'].astype(str)
@@ -339,14 +382,102 @@ def save_to_sheets(new_df):
         new_df['reach_delta'] = 0
         final_df = new_df
 
+    # בלי מדידה חדשה אין דלתא - אחרת הדוח יספור שוב את הגידול של הריצה הקודמת
+    if deferred:
+        final_df.loc[final_df['media_id'].astype(str).isin(deferred), ['views_delta', 'reach_delta']] = 0
+
     # ניקוי ומיון
     final_df = final_df.sort_values(by='date', ascending=False)
     final_df = final_df.fillna(0).replace([float('inf'), float('-inf')], 0)
+    return final_df
+
+
+def open_worksheet():
+    """(spreadsheet, worksheet) של גיליון האינסטגרם - נוצר אם חסר"""
+    creds_json = os.environ.get('GCP_SERVICE_ACCOUNT')
+    if not creds_json:
+        creds_json = os.environ.get('GOOGLE_CREDENTIALS')
+
+    creds_dict = json.loads(creds_json)
+    scopes = [
+        'https://www.googleapis.com/auth/spreadsheets',
+        'https://www.googleapis.com/auth/drive'
+    ]
+    creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
+    gc = gspread.authorize(creds)
+    sh = gc.open_by_key(SPREADSHEET_ID)
+
+    try:
+        worksheet = sh.worksheet(SHEET_NAME)
+    except:
+        # יצירת גיליון חדש
+        worksheet = sh.add_worksheet(title=SHEET_NAME, rows=1000, cols=20)
+        print(f"✅ Created new sheet: {SHEET_NAME}")
+    return sh, worksheet
+
+
+def save_to_sheets(new_df):
+    """שמירה חכמה לגוגל שיטס עם מיזוג נתונים. מחזיר האם הנתונים נשמרו (או נרשמו ביומן הכתיבות)"""
+    if new_df.empty:
+        print("⚠️ No data to save")
+        return False
+    # אין זמן לסיים את השמירה לפני שה-scheduler עוצר את הריצה - היומן נשאר לריצה הבאה
+    if not can_finish('the sheet write'):
+        return False
+
+    sh, worksheet = open_worksheet()
+
+    # קריאת היסטוריה - אחרי שליחת כתיבות שנשארו ביומן מריצה קודמת. אם הן לא נשלחו, ההיסטוריה
+    # לא כוללת אותן והכתיבה החדשה הייתה גוברת עליהן ביומן - לכן לא שומרים (היומן נשאר לריצה הבאה)
+    with stage('sheet_read'):
+        if not flush(sh):
+            mark_failed('sheet_journal_pending')
+            return False
+        try:
+            existing_data = worksheet.get_all_records()
+            existing_df = pd.DataFrame(existing_data)
+        except gspread.exceptions.APIError:
+            # Sheets לא זמין - בלי ההיסטוריה הכתיבה הייתה דורסת את הגיליון
+            raise
+        except Exception as e:
+            print(f"⚠️ Warning reading existing data: {e}")
+            existing_df = pd.DataFrame()
+
+    with stage('merge'):
+        final_df = merge_media(new_df, existing_df)
 
     # שמירה
-    worksheet.clear()
-    worksheet.update([final_df.columns.tolist()] + final_df.values.tolist())
-    print(f"✅ Saved {len(final_df)} rows to {SHEET_NAME}")
+    with stage('sheet_write'):
+        # דרך יומן הכתיבות - אם Sheets נופל, הנתונים נשלחים בריצה הבאה
+        if write_sheet(sh, SHEET_NAME, [final_df.columns.tolist()] + final_df.values.tolist()):
+            print(f"✅ Saved {len(final_df)} rows to {SHEET_NAME}")
+        save_priority_ids('instagram_collector', final_df, 'media_id')
+
+        # עדכון הסיכום היומי - רק לתאריכים של הפוסטים שנאספו בריצה הזו
+        update_rollup(sh, 'instagram', final_df, new_df['date'])
+    return True
+
+
+def stream_to_sheets(ig_account_id, checkpoint):
+    """
+    מצב streaming (--stream): כל CHUNK_ROWS פריטים שנאספו נכתבים מיד לגיליון (upsert לפי media_id),
+    בזיכרון חסום - לאיסוף של חלון ארוך. פריטים מיומן של ריצה שנפלה שלא הגיעו לגיליון נכתבים שוב.
+    מחזיר האם הכתיבה הושלמה (האיסוף החלקי שנכתב לא נחשב - היומן נשאר לריצה הבאה).
+    """
+    print(f"🚀 Instagram Collector (streaming) - Fetching last {DAYS_BACK} days")
+    sh, worksheet = open_worksheet()
+    # כתיבה מלאה שממתינה ביומן הייתה דורסת את מה שנכתב כאן
+    if not flush(sh):
+        mark_failed('sheet_journal_pending')
+        return False
+
+    writer = SheetChunkWriter(sh, worksheet, 'instagram', 'media_id', {'views_delta': 'views', 'reach_delta': 'reach'},
+                              checkpoint=checkpoint)
+    writer.write(chain(checkpoint.journal_rows(), iter_instagram_media(ig_account_id, checkpoint)))
+    record_deferred('instagram_collector', checkpoint.deferred)
+    writer.reset_deltas(checkpoint.deferred)
+    writer.close()
+    return checkpoint.complete
 
 
 def main():
@@ -356,22 +487,36 @@ def main():
     
     if not ACCESS_TOKEN:
         print("❌ Missing FACEBOOK_TOKEN environment variable")
+        mark_failed('missing_token')
         return
     
     # מציאת ה-Instagram Account ID
     ig_account_id = get_instagram_account_id()
     if not ig_account_id:
+        mark_failed('no_instagram_account')
+        return
+
+    if '--stream' in sys.argv:
+        checkpoint = CollectorCheckpoint('instagram_collector', keep_rows=False)
+        checkpoint.finish(stream_to_sheets(ig_account_id, checkpoint))
         return
     
-    # משיכת נתונים
-    df = fetch_instagram_media(ig_account_id)
+    # משיכת נתונים - יומן הריצה נמחק רק אחרי שמירה מוצלחת, וריצה חוזרת אחרי כשל ממשיכה ממנו
+    checkpoint = CollectorCheckpoint('instagram_collector')
+    df = fetch_instagram_media(ig_account_id, checkpoint)
     
+    saved = True
     if not df.empty:
-        save_to_sheets(df)
-        print(f"\n✅ Done! {len(df)} media items processed.")
+        saved = save_to_sheets(df)
+        if saved:
+            checkpoint.mark_saved()
+            print(f"\n✅ Done! {len(df)} media items processed.")
     else:
         print("❌ No data collected.")
+    checkpoint.finish(saved)
 
 
 if __name__ == "__main__":
-    main()
+    install_stop_handler()
+    with track_run('instagram_collector'), profile_run('instagram_collector'):
+        main()
@@ -0,0 +1,144 @@
+"""
+Profiling - מצב פרופיילינג אופציונלי לכל נקודות הכניסה
+מופעל עם --profile בשורת הפקודה או PROFILE_RUN=1 בסביבה, בלי שינוי קוד.
+בסוף הריצה נכתבים ל-PROFILE_DIR:
+- <script>-<time>.prof        - cProfile (pstats; snakeviz / gprof2dot) של ה-thread הראשי
+- <script>-<time>.cprofile.txt - 40 הפונקציות המובילות לפי זמן מצטבר
+- <script>-<time>.folded      - דגימת wall-clock של כל ה-threads בפורמט folded stacks
+                                (flamegraph.pl / speedscope) - כולל זמן המתנה לרשת
+- <script>-<time>.tracemalloc.txt - ההקצאות הגדולות (לפי שורה ולפי traceback)
+
+שימוש:
+    from profiling import profile_run
+
+    with profile_run('facebook_collector'):
+        main()
+"""
+
+import os
+import sys
+import time
+import cProfile
+import pstats
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# --- הגדרות ---
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '.profile')
+# מרווח הדגימה של ה-sampler (שניות)
+SAMPLE_INTERVAL_SEC = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_SEC', '0.01'))
+# עומק ה-traceback שנשמר לכל הקצאה ב-tracemalloc
+TRACEMALLOC_FRAMES = int(os.environ.get('PROFILE_TRACEMALLOC_FRAMES', '10'))
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+
+
+def is_enabled():
+    return '--profile' in sys.argv or os.environ.get('PROFILE_RUN', '') not in ('', '0')
+
+
+class StackSampler:
+    """
+    דגימת wall-clock: thread ברקע שמצלם את המחסנית של כל thread כל interval שניות
+    (sys._current_frames) וסופר מחסניות זהות. בניגוד ל-cProfile רואים גם המתנה ל-I/O.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL_SEC):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        """שורה לכל מחסנית: 'thread;file:func;...;file:func count'"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _tracemalloc_report(snapshot):
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ])
+    lines = [f"Top {TOP_ALLOCATIONS} allocations by line:"]
+    for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+        lines.append(f"  {stat.size / 1024:10,.1f} KiB  {stat.count:8,} blocks  {stat.traceback[0]}")
+    lines.append(f"\nTop {TOP_ALLOCATIONS // 5} allocations by traceback:")
+    for stat in snapshot.statistics('traceback')[:TOP_ALLOCATIONS // 5]:
+        lines.append(f"\n  {stat.size / 1024:,.1f} KiB in {stat.count:,} blocks")
+        lines.extend(f"    {line}" for line in stat.traceback.format())
+    return '\n'.join(lines) + '\n'
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+@contextmanager
+def profile_run(script):
+    """
+    פרופיילינג של ריצה שלמה - רק אם הופעל (--profile / PROFILE_RUN=1); אחרת לא עושה כלום.
+    הקבצים נכתבים גם אם הריצה נכשלה.
+    """
+    if not is_enabled():
+        yield
+        return
+
+    print(f"🔬 Profiling {script} (cProfile + sampler every {SAMPLE_INTERVAL_SEC * 1000:g}ms + tracemalloc)")
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    sampler = StackSampler()
+    sampler.start()
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - started
+        sampler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            base = os.path.join(PROFILE_DIR, f"{script}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+            profiler.dump_stats(f"{base}.prof")
+            with open(f"{base}.cprofile.txt", 'w', encoding='utf-8') as f:
+                stats = pstats.Stats(profiler, stream=f)
+                stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            _write(f"{base}.folded", sampler.folded())
+            _write(f"{base}.tracemalloc.txt",
+                   f"Peak traced memory: {peak / 1024 / 1024:,.1f} MiB\n\n" + _tracemalloc_report(snapshot))
+            print(f"🔬 Profile: {elapsed:.1f}s, {sampler.samples:,} samples, "
+                  f"peak {peak / 1024 / 1024:,.1f} MiB -> {base}.*")
+        except OSError as e:
+            print(f"⚠️ Could not write profile: {e}")
@@ -0,0 +1,158 @@
+"""
+Prompt Builder - בניית פרומפט עם תקציב טוקנים לכל קטע
+מזהים קצרים במקום לינקים מלאים, קיצור טקסטים ומדידת גודל הפרומפט עם count_tokens
+(קריאה אחת לכל פרומפט - שאר הגדלים מוערכים מיחס התווים/טוקן שנמדד בה)
+"""
+
+import re
+
+# --- הגדרות ---
+# תקציב טוקנים לכל קטע נתונים בפרומפט
+SECTION_BUDGETS = {
+    'youtube': 1500,
+    'facebook': 1500,
+    'instagram': 1500,
+    'followers': 200,
+}
+# אורך מקסימלי לכותרת/כיתוב בשורת נתונים
+TEXT_MAX_CHARS = 120
+# הערכה גסה כשאין אפשרות למדוד (בערך 3 תווים לטוקן בעברית)
+CHARS_PER_TOKEN_ESTIMATE = 3.0
+# טקסט קצר מזה לא מספיק למדידת יחס התווים/טוקן
+MIN_CALIBRATION_CHARS = 200
+
+
+def compact_text(text, max_chars=TEXT_MAX_CHARS):
+    """קיצור טקסט לשורה אחת באורך מוגבל"""
+    text = ' '.join(str(text or '').split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1].rstrip() + '…'
+
+
+class PromptBuilder:
+    """
+    מנהל את הלינקים והתקציב של פרומפט אחד.
+    כל לינק מקבל מזהה קצר (Y1, F2, I3...) שנשלח למודל במקום ה-URL המלא,
+    ומוחזר ל-URL אחרי היצירה עם expand_links.
+    items ו-totals שומרים את הנתונים עצמם, כדי לרנדר דוח מתשובת JSON בלי שהמודל יעתיק מספרים.
+    """
+
+    def __init__(self, client=None, model=None, section_budgets=None):
+        self.client = client
+        self.model = model
+        self.section_budgets = dict(section_budgets or SECTION_BUDGETS)
+        self.links = {}
+        self.items = {}
+        self.totals = {}
+        self._refs = {}
+        self._counters = {}
+        self.section_tokens = {}
+        self.prompt_tokens = 0
+        # יחס תווים/טוקן מה-count_tokens הראשון (None - עוד לא נמדד)
+        self.chars_per_token = None
+
+    def link(self, url, prefix='L', item=None):
+        """
+        החזרת מזהה קצר ל-URL (אותו URL מקבל תמיד אותו מזהה).
+        item - נתוני הפריט (title, type, value, metric) לרינדור מקומי
+        """
+        if not url:
+            return ''
+        if url not in self._refs:
+            self._counters[prefix] = self._counters.get(prefix, 0) + 1
+            ref = f"{prefix}{self._counters[prefix]}"
+            self._refs[url] = ref
+            self.links[ref] = url
+        ref = self._refs[url]
+        if item:
+            self.items[ref] = dict(item, url=url)
+        return ref
+
+    def set_totals(self, platform, **totals):
+        """שמירת סיכומי הפלטפורמה (כמות, צפיות וכו') לרינדור מקומי"""
+        self.totals[platform] = totals
+
+    def expand_links(self, text):
+        """החלפת המזהים הקצרים בתשובת המודל בלינקים המלאים"""
+        if not text or not self.links:
+            return text
+
+        def replace(match):
+            return match.group(1) + self.links.get(match.group(2), match.group(2))
+
+        # לינקים של Markdown - [כותרת](Y1), ומזהים שנשארו בפורמט LINK: Y1
+        text = re.sub(r'(\]\()([A-Z]\d+)(?=\))', replace, text)
+        return re.sub(r'(LINK:\s*)([A-Z]\d+)\b', replace, text)
+
+    def count_tokens(self, text):
+        """מדידת טוקנים עם count_tokens של ה-SDK, או הערכה אם אין חיבור"""
+        if self.client and self.model:
+            try:
+                return self.client.models.count_tokens(model=self.model, contents=text).total_tokens
+            except Exception as e:
+                print(f"   ⚠️ count_tokens failed, estimating: {e}")
+                self.client = None
+        return int(len(text) / CHARS_PER_TOKEN_ESTIMATE) + 1
+
+    def estimate_tokens(self, text):
+        """
+        גודל טקסט בטוקנים: הטקסט הראשון שארוך מספיק נמדד עם count_tokens, והיחס
+        תווים/טוקן שלו משמש להערכת כל השאר - בלי קריאת HTTP לכל קטע ולכל קיצור.
+        """
+        if self.chars_per_token is None and len(text) >= MIN_CALIBRATION_CHARS:
+            tokens = self.count_tokens(text)
+            self.chars_per_token = len(text) / max(tokens, 1)
+            return tokens
+        return int(len(text) / (self.chars_per_token or CHARS_PER_TOKEN_ESTIMATE)) + 1
+
+    @staticmethod
+    def _bullet_groups(lines):
+        """רשימות ה-• בקטע (רצפים של שורות •) - אינדקסים של השורות בכל רשימה"""
+        groups = []
+        for i, line in enumerate(lines):
+            if not line.startswith('•'):
+                continue
+            if groups and groups[-1][-1] == i - 1:
+                groups[-1].append(i)
+            else:
+                groups.append([i])
+        return groups
+
+    def fit_section(self, name, text, budget=None):
+        """
+        התאמת קטע לתקציב שלו: הסרת שורות נתונים (•) עד שהקטע נכנס.
+        ההסרה היא מסוף הרשימה הארוכה ביותר בקטע (למשל הטופ מול הסרטונים הישנים שצוברים צפיות),
+        כך שכל רשימה שומרת את הפריטים המובילים שלה. שורות הסיכום נשמרות.
+        """
+        budget = budget or self.section_budgets.get(name)
+        tokens = self.estimate_tokens(text)
+        if not budget or tokens <= budget:
+            self.section_tokens[name] = (tokens, budget)
+            return text
+
+        chars_per_token = self.chars_per_token or CHARS_PER_TOKEN_ESTIMATE
+        max_chars = int(budget * chars_per_token)
+        lines = text.split('\n')
+        while len('\n'.join(lines)) > max_chars:
+            groups = self._bullet_groups(lines)
+            if not groups:
+                break
+            # הרשימה הארוכה ביותר (בתיקו - המאוחרת יותר)
+            longest = max(reversed(groups), key=len)
+            del lines[longest[-1]]
+
+        fitted = '\n'.join(lines)[:max_chars]
+        fitted_tokens = self.estimate_tokens(fitted)
+        self.section_tokens[name] = (fitted_tokens, budget)
+        print(f"   ✂️ Section '{name}' trimmed: ~{tokens} -> ~{fitted_tokens} tokens (budget {budget})")
+        return fitted
+
+    def measure_prompt(self, prompt):
+        """גודל הפרומפט המלא (הערכה מהיחס שנמדד) והדפסת גודל לכל קטע"""
+        self.prompt_tokens = self.estimate_tokens(prompt)
+        sections = ' | '.join(
+            f"{name} {tokens}/{budget}" for name, (tokens, budget) in self.section_tokens.items()
+        )
+        print(f"   📏 Prompt size: ~{self.prompt_tokens:,} tokens, {len(prompt):,} chars ({sections})")
+        return self.prompt_tokens
@@ -0,0 +1,64 @@
+"""
+Rate Limiter - הגבלת קצב קריאות (token bucket)
+thread-safe, לשימוש משותף בין threads ששולחים לאותו API
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    token bucket: עד capacity קריאות ברצף, ואז rate קריאות לשנייה.
+    acquire() חוסם עד שיש token פנוי.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """המתנה ל-token פנוי; מחזיר את זמן ההמתנה בשניות"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds):
+        """חסימה לזמן נתון (למשל אחרי 429 עם retry_after) - token אחד יתפנה בסופו"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class KeyedRateLimiter:
+    """RateLimiter נפרד לכל מפתח (למשל לכל צ'אט), נוצר בשימוש הראשון"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.limiters:
+                self.limiters[key] = RateLimiter(self.rate, self.capacity)
+            return self.limiters[key]
+
+    def acquire(self, key):
+        return self.get(key).acquire()
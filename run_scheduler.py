@@ -0,0 +1,271 @@
+"""
+Run Scheduler - הרצה יומית עם דדליין כולל (היעד במפרט: פחות מ-5 דקות)
+השלבים רצים לפי סדר ערך, כל אחד מקבל נתח מהזמן שנשאר לאיסוף, והדוח תמיד רץ בסוף
+עם זמן שמור (REPORT_RESERVE_SEC) - גם כשה-Graph איטי, הדוח יוצא בזמן עם הנתונים הכי טריים שיש.
+
+בתוך ה-collectors (דרך משתני סביבה שה-scheduler מעביר):
+- פריטים חדשים / של אתמול (PRIORITY_HOURS) נאספים תמיד, עד סוף זמן האיסוף
+- גם המובילים בדלתא של הריצה הקודמת (PRIORITY_TOP_N, נשמרים ב-CHECKPOINT_DIR) בעדיפות
+- ה-long tail (פוסטים ישנים יותר בחלון) נדחה כשנגמר הנתח של השלב ומתרענן בריצה הבאה
+שלב שלא נשאר לו זמן בכלל מדולג. כל מה שנדחה או דולג נרשם ל-TELEMETRY_DIR (schedule-*.json).
+
+שלב שלא סיים עד סוף זמן האיסוף מקבל SIGTERM ועוד STOP_GRACE_SEC לסיים את השמירה, ורק אז
+SIGKILL. לפני כל שלב כתיבה ה-collector בודק שיספיק לסיים אותו (can_finish) - ואם לא, מדלג
+עליו במקום להיקטע באמצע (היומן נשאר לריצה הבאה). הדוח יכול להתחיל עד STOP_GRACE_SEC מאוחר.
+
+הרצה:
+    python run_scheduler.py             # איסוף יומי + דוח בוקר
+    python run_scheduler.py --intraday  # עדכון הדוח מהפוסטים של היום (בלי collectors)
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+from datetime import datetime
+import pytz
+import pandas as pd
+from collector_checkpoint import CHECKPOINT_DIR
+from run_telemetry import TELEMETRY_DIR, count, write_run_record
+
+# --- הגדרות ---
+# תקציב הזמן הכולל של ריצה (שניות)
+RUN_BUDGET_SEC = float(os.environ.get('RUN_BUDGET_SEC') or 300)
+# זמן שמור לדוח בסוף הריצה
+REPORT_RESERVE_SEC = float(os.environ.get('REPORT_RESERVE_SEC') or 75)
+# שלב שנשאר לו פחות מזה - מדולג
+MIN_STEP_SEC = 15
+# זמן שה-collector משאיר לעצמו לקריאה/כתיבה לגיליון אחרי האיסוף - יותר ממחזור backoff
+# שלם של with_retries (2+4+8+16 שניות) ועוד הקריאות עצמן
+WRITE_RESERVE_SEC = 45
+# זמן לעדכון הסיכום היומי (קריאה + עד שלוש כתיבות)
+ROLLUP_RESERVE_SEC = 30
+# אחרי SIGTERM בסוף זמן האיסוף - זמן לסיים את השמירה לפני SIGKILL
+STOP_GRACE_SEC = float(os.environ.get('STOP_GRACE_SEC') or 45)
+# פריטים שפורסמו בשעות האחרונות - בעדיפות
+PRIORITY_HOURS = int(os.environ.get('PRIORITY_HOURS') or 48)
+# המובילים בדלתא הצפיות של הריצה הקודמת - בעדיפות גם כשהם ישנים יותר
+PRIORITY_TOP_N = int(os.environ.get('PRIORITY_TOP_N') or 20)
+
+# השלבים לפי סדר ערך; weight - החלק היחסי מזמן האיסוף
+DAILY_STEPS = [
+    {'script': 'followers_tracker.py', 'weight': 1},
+    {'script': 'youtube_collector.py', 'weight': 1},
+    {'script': 'facebook_collector.py', 'weight': 3},
+    {'script': 'instagram_collector.py', 'weight': 2},
+]
+# בעדכון במהלך היום אין collectors: הדוח מושך בעצמו רק את הפוסטים של היום, בלי לכתוב לגיליונות
+# הגולמיים - אחרת הדלתא בגיליון הייתה נמדדת מול הריצה השעתית ולא מול הריצה היומית
+INTRADAY_STEPS = []
+
+# משתני הסביבה שה-scheduler מעביר לשלבים (epoch seconds / נתיב)
+DEADLINE_ENV = 'RUN_DEADLINE'
+STEP_DEADLINE_ENV = 'RUN_STEP_DEADLINE'
+SKIP_LOG_ENV = 'RUN_SKIP_LOG'
+
+
+# --- בתוך ה-collectors ---
+
+def _env_time(name):
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+
+def is_priority(published, item_id=None, leaders=()):
+    """
+    האם פריט לא נדחה: חדש מספיק (published - datetime עם אזור זמן), או אחד המובילים
+    בדלתא של הריצה הקודמת (leaders - מ-load_priority_ids)
+    """
+    if item_id is not None and str(item_id) in leaders:
+        return True
+    age = datetime.now(pytz.utc) - published
+    return age.total_seconds() <= PRIORITY_HOURS * 3600
+
+
+def _priority_path(script):
+    return os.path.join(CHECKPOINT_DIR, f"priority-{script}.json")
+
+
+def save_priority_ids(script, df, id_column, delta_column='views_delta'):
+    """שמירת PRIORITY_TOP_N המובילים בדלתא של הריצה - בריצה הבאה הם לא נדחים"""
+    if df is None or df.empty or delta_column not in df.columns:
+        return
+    deltas = pd.to_numeric(df[delta_column], errors='coerce').fillna(0)
+    leaders = df.loc[deltas[deltas > 0].nlargest(PRIORITY_TOP_N).index, id_column]
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    path = _priority_path(script)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump([str(item_id) for item_id in leaders], f)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_priority_ids(script):
+    """המובילים בדלתא מהריצה הקודמת (set של מזהים; ריק אם אין)"""
+    try:
+        with open(_priority_path(script), encoding='utf-8') as f:
+            return set(json.load(f))
+    except (OSError, ValueError):
+        return set()
+
+
+def should_defer(priority=False):
+    """
+    האם לדחות את הפריט הבא. long tail - כשנגמר הנתח של השלב; פריט בעדיפות - רק כשלא
+    נשאר זמן לכתיבה לגיליון לפני סוף זמן האיסוף. בלי scheduler - אף פעם.
+    """
+    now = time.time()
+    deadline = _env_time(DEADLINE_ENV)
+    if deadline is not None and now > deadline - WRITE_RESERVE_SEC:
+        return True
+    step_deadline = _env_time(STEP_DEADLINE_ENV)
+    return not priority and step_deadline is not None and now > step_deadline
+
+
+def time_left():
+    """שניות עד שה-scheduler הורג את התהליך (SIGKILL אחרי STOP_GRACE_SEC); None בלי scheduler"""
+    deadline = _env_time(DEADLINE_ENV)
+    return None if deadline is None else deadline + STOP_GRACE_SEC - time.time()
+
+
+def can_finish(phase, reserve_sec=WRITE_RESERVE_SEC):
+    """
+    האם יש זמן לסיים שלב כתיבה שלם (phase) לפני ה-SIGKILL. אם לא - מדפיס, והשלב מדולג
+    כולו: כתיבה שנקטעת באמצע גרועה מכתיבה שלא התחילה.
+    """
+    left = time_left()
+    if left is None or left >= reserve_sec:
+        return True
+    print(f"⏭️ Skipping {phase} - {max(left, 0):.0f}s left before the run is stopped")
+    count('skipped_writes')
+    return False
+
+
+def install_stop_handler():
+    """
+    SIGTERM מה-scheduler (סוף זמן האיסוף) לא הורג את ה-collector: האיסוף כבר נעצר (should_defer),
+    והשמירה ממשיכה עד STOP_GRACE_SEC - שלבים שלא יספיקו מדולגים (can_finish).
+    """
+    def handle(signum, frame):
+        print("⏰ Stop requested by the scheduler - finishing the current write")
+    signal.signal(signal.SIGTERM, handle)
+
+
+def record_deferred(script, item_ids):
+    """רישום הפריטים שנדחו (מודפס, מונה בטלמטריה ושורה ביומן של ה-scheduler)"""
+    if not item_ids:
+        return
+    print(f"⏭️ Deferred {len(item_ids)} items to the next run (time budget)")
+    count('deferred_items', len(item_ids))
+    path = os.environ.get(SKIP_LOG_ENV)
+    if path:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'script': script, 'items': [str(i) for i in item_ids]}) + '\n')
+
+
+# --- ה-scheduler ---
+
+def run_step(args, deadline=None, step_deadline=None, skip_log=None):
+    """הרצת סקריפט כתהליך נפרד. מחזיר (status, שניות)"""
+    env = dict(os.environ)
+    if deadline is not None:
+        env[DEADLINE_ENV] = str(deadline)
+    if step_deadline is not None:
+        env[STEP_DEADLINE_ENV] = str(step_deadline)
+    if skip_log:
+        env[SKIP_LOG_ENV] = skip_log
+
+    started = time.time()
+    timeout = None if deadline is None else max(deadline - started, 1)
+    process = subprocess.Popen([sys.executable] + args, env=env)
+    try:
+        status = 'ok' if process.wait(timeout=timeout) == 0 else 'failed'
+    except subprocess.TimeoutExpired:
+        # SIGTERM - השלב מסיים את הכתיבה שהתחיל (install_stop_handler); SIGKILL רק אם לא סיים
+        print(f"⏰ {args[0]} reached the collection deadline - stopping ({STOP_GRACE_SEC:.0f}s to finish writing)")
+        process.terminate()
+        try:
+            status = 'stopped' if process.wait(timeout=STOP_GRACE_SEC) == 0 else 'timed_out'
+        except subprocess.TimeoutExpired:
+            print(f"⏰ {args[0]} did not stop in {STOP_GRACE_SEC:.0f}s - killed")
+            process.kill()
+            process.wait()
+            status = 'timed_out'
+    return status, round(time.time() - started, 1)
+
+
+def read_skip_log(path):
+    deferred = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                deferred.setdefault(entry['script'], []).extend(entry['items'])
+        os.remove(path)
+    return deferred
+
+
+def main():
+    intraday = '--intraday' in sys.argv
+    steps = INTRADAY_STEPS if intraday else DAILY_STEPS
+    report = ['telegram_reporter.py', '--intraday'] if intraday else ['telegram_reporter.py']
+
+    run_at = datetime.now(pytz.timezone('Asia/Jerusalem'))
+    started = time.time()
+    deadline = started + RUN_BUDGET_SEC
+    collect_deadline = deadline - REPORT_RESERVE_SEC
+    os.makedirs(TELEMETRY_DIR, exist_ok=True)
+    skip_log = os.path.join(TELEMETRY_DIR, f"schedule-{os.getpid()}.skips.jsonl")
+
+    print(f"🗓️ Run scheduler - budget {RUN_BUDGET_SEC:.0f}s "
+          f"(report reserve {REPORT_RESERVE_SEC:.0f}s) - {run_at.strftime('%Y-%m-%d %H:%M')}")
+
+    results = []
+    for index, step in enumerate(steps):
+        now = time.time()
+        remaining = collect_deadline - now
+        if remaining < MIN_STEP_SEC:
+            print(f"\n⏭️ Skipping {step['script']} - {max(remaining, 0):.0f}s left for collection")
+            results.append({'script': step['script'], 'status': 'skipped', 'sec': 0})
+            continue
+        # נתח יחסי מהזמן שנשאר; מה ששלב לא ניצל עובר לשלבים הבאים
+        weights = sum(s['weight'] for s in steps[index:])
+        step_deadline = now + remaining * step['weight'] / weights
+        print(f"\n▶️ {step['script']} - {step_deadline - now:.0f}s slice, {remaining:.0f}s until collection deadline")
+        status, sec = run_step([step['script']], collect_deadline, step_deadline, skip_log)
+        results.append({'script': step['script'], 'status': status, 'sec': sec})
+
+    # הדוח רץ תמיד, בלי הגבלת זמן - עדיף דוח מאוחר מבלי דוח
+    print(f"\n▶️ {' '.join(report)} - {deadline - time.time():.0f}s left in budget")
+    status, sec = run_step(report)
+    results.append({'script': report[0], 'status': status, 'sec': sec})
+
+    total = round(time.time() - started, 1)
+    deferred = read_skip_log(skip_log)
+    record = {
+        'script': 'schedule-intraday' if intraday else 'schedule-daily',
+        'run_at': run_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'budget_sec': RUN_BUDGET_SEC,
+        'report_reserve_sec': REPORT_RESERVE_SEC,
+        'duration_sec': total,
+        'over_budget': total > RUN_BUDGET_SEC,
+        'steps': results,
+        'deferred': deferred,
+    }
+    write_run_record(record)
+
+    print(f"\n{'='*50}")
+    print(f"🗓️ Finished in {total:.0f}s of {RUN_BUDGET_SEC:.0f}s budget")
+    for result in results:
+        icon = {'ok': '✅', 'skipped': '⏭️', 'stopped': '⏹️', 'timed_out': '⏰'}.get(result['status'], '❌')
+        items = deferred.get(os.path.splitext(result['script'])[0], [])
+        extra = f" | {len(items)} deferred" if items else ''
+        print(f"   {icon} {result['script']}: {result['status']} ({result['sec']:.0f}s){extra}")
+
+    failed = [r['script'] for r in results if r['status'] in ('failed', 'timed_out')]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
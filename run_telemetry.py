@@ -0,0 +1,349 @@
+"""
+Run Telemetry - מדידת ריצה של כל סקריפט: זמני שלבים, קריאות HTTP ושגיאות
+כל הקריאות (Graph ו-Telegram דרך requests, YouTube דרך httplib2, Gemini דרך httpx, Sheets
+דרך requests) נמדדות בנקודה אחת לכל ספרייה, בלי לגעת בקוד הקריאה עצמו.
+
+בסוף הריצה נכתבים:
+- רשומת JSON מלאה ל-TELEMETRY_DIR (שלבים, endpoints עם היסטוגרמת זמנים, מונים ושגיאות)
+- שורת סיכום לגיליון run_metrics (מגמות לאורך שבועות ב-Looker)
+
+שימוש:
+    from run_telemetry import track_run, stage
+
+    with track_run('facebook_collector'):
+        with stage('fetch'):
+            ...
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlsplit
+import pytz
+
+# --- הגדרות ---
+TELEMETRY_DIR = os.environ.get('TELEMETRY_DIR', '.telemetry')
+# TELEMETRY_SHEET=0 - בלי שורה בגיליון (למשל בהרצה מקומית או ב-replay)
+SHEET_ENABLED = os.environ.get('TELEMETRY_SHEET', '1') != '0'
+RUN_METRICS_SHEET = 'run_metrics'
+# השלבים שמקבלים עמודה בגיליון (זמן כולל לשלב, כולל שלבים מקוננים)
+STAGES = ['fetch', 'enrich', 'merge', 'sheet_read', 'sheet_write', 'llm', 'telegram']
+# גבולות עליונים (ms) של תאי היסטוגרמת הזמנים; התא האחרון - כל השאר
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+RUN_METRICS_COLUMNS = (
+    ['run_at', 'script', 'status', 'duration_sec']
+    + [f"{name}_sec" for name in STAGES]
+    + ['http_calls', 'http_errors', 'throttled', 'retries', 'errors',
+       'slowest_endpoint', 'slowest_endpoint_p95_ms', 'run_id']
+)
+BOT_TOKEN_PATTERN = re.compile(r'/bot[^/]+/')
+
+_current = None
+
+
+def endpoint_name(method, url):
+    """שם endpoint לסטטיסטיקה: מזהים, טווחי Sheets וטוקן הבוט מוחלפים בתבנית"""
+    parts = urlsplit(url)
+    segments = []
+    after_values = False
+    for segment in BOT_TOKEN_PATTERN.sub('/bot{token}/', parts.path).split('/'):
+        if after_values:
+            segments.append('{range}')
+            break
+        if re.fullmatch(r'[\d_]{5,}|[A-Za-z0-9_-]{20,}', segment):
+            segment = '{id}'
+        after_values = segment == 'values'
+        segments.append(segment)
+    return f"{method} {parts.netloc}{'/'.join(segments)}"
+
+
+def _bucket(ms):
+    for index, limit in enumerate(LATENCY_BUCKETS_MS):
+        if ms <= limit:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+def _percentile(histogram, fraction):
+    """אומדן אחוזון מההיסטוגרמה (הגבול העליון של התא)"""
+    total = sum(histogram)
+    if not total:
+        return 0
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if seen >= total * fraction:
+            return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else LATENCY_BUCKETS_MS[-1] * 2
+    return LATENCY_BUCKETS_MS[-1] * 2
+
+
+class RunTelemetry:
+    """המדידות של ריצה אחת (thread-safe - הקריאות יכולות להגיע מכמה threads)"""
+
+    def __init__(self, script):
+        self.script = script
+        self.run_id = uuid.uuid4().hex[:12]
+        self.run_at = datetime.now(pytz.timezone('Asia/Jerusalem'))
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.spans = []
+        self.stage_totals = defaultdict(float)
+        self.endpoints = {}
+        self.counters = Counter()
+        self.errors = Counter()
+        self.status = 'ok'
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            with self.lock:
+                self.stage_totals[name] += seconds
+                self.spans.append({'stage': name, 'start': round(started - self.started, 3),
+                                   'sec': round(seconds, 3)})
+
+    def record_call(self, endpoint, ms, status=None, error=None):
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, {
+                'calls': 0, 'errors': 0, 'throttled': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            })
+            stats['calls'] += 1
+            stats['total_ms'] += ms
+            stats['max_ms'] = max(stats['max_ms'], ms)
+            stats['histogram'][_bucket(ms)] += 1
+            if status == 429:
+                stats['throttled'] += 1
+            if error or status is None or status >= 400:
+                stats['errors'] += 1
+                self.errors[f"http {status or type(error).__name__}"] += 1
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def error(self, name):
+        with self.lock:
+            self.errors[name] += 1
+
+    def record(self):
+        """רשומת הריצה המלאה (dict שנכתב כ-JSON)"""
+        with self.lock:
+            endpoints = {}
+            for name, stats in sorted(self.endpoints.items(), key=lambda item: -item[1]['total_ms']):
+                endpoints[name] = dict(
+                    stats,
+                    total_ms=round(stats['total_ms'], 1),
+                    max_ms=round(stats['max_ms'], 1),
+                    avg_ms=round(stats['total_ms'] / stats['calls'], 1),
+                    p50_ms=_percentile(stats['histogram'], 0.5),
+                    p95_ms=_percentile(stats['histogram'], 0.95),
+                )
+            return {
+                'run_id': self.run_id,
+                'script': self.script,
+                'run_at': self.run_at.strftime('%Y-%m-%d %H:%M:%S'),
+                'status': self.status,
+                'duration_sec': round(time.perf_counter() - self.started, 3),
+                'stages': {name: round(sec, 3) for name, sec in self.stage_totals.items()},
+                'spans': list(self.spans),
+                'endpoints': endpoints,
+                'latency_buckets_ms': LATENCY_BUCKETS_MS,
+                'counters': dict(self.counters),
+                'errors': dict(self.errors),
+            }
+
+
+# --- HTTP hooks ---
+
+def _install_http_hooks(telemetry):
+    """עטיפת נקודת השליחה של requests / httplib2 / httpx. מחזיר פונקציה שמחזירה את המקור"""
+    restore = []
+
+    def timed(method, url, call):
+        started = time.perf_counter()
+        try:
+            response = call()
+        except Exception as e:
+            telemetry.record_call(endpoint_name(method, url), (time.perf_counter() - started) * 1000, error=e)
+            raise
+        status = getattr(response, 'status_code', None) or getattr(response, 'status', None)
+        telemetry.record_call(endpoint_name(method, url), (time.perf_counter() - started) * 1000, status)
+        return response
+
+    import requests
+    requests_send = requests.Session.send
+
+    def send(self, request, **kwargs):
+        return timed(request.method, request.url, lambda: requests_send(self, request, **kwargs))
+
+    requests.Session.send = send
+    restore.append(lambda: setattr(requests.Session, 'send', requests_send))
+
+    try:
+        import httplib2
+        httplib2_request = httplib2.Http.request
+
+        # httplib2 מחזיר (response, content) - הסטטוס נמצא ב-response
+        def http_request(self, uri, method='GET', *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                response, content = httplib2_request(self, uri, method, *args, **kwargs)
+            except Exception as e:
+                telemetry.record_call(endpoint_name(method, uri), (time.perf_counter() - started) * 1000, error=e)
+                raise
+            telemetry.record_call(endpoint_name(method, uri), (time.perf_counter() - started) * 1000,
+                                  response.status)
+            return response, content
+
+        httplib2.Http.request = http_request
+        restore.append(lambda: setattr(httplib2.Http, 'request', httplib2_request))
+    except ImportError:
+        pass
+
+    try:
+        import httpx
+        httpx_send = httpx.Client.send
+
+        def client_send(self, request, **kwargs):
+            return timed(request.method, str(request.url), lambda: httpx_send(self, request, **kwargs))
+
+        httpx.Client.send = client_send
+        restore.append(lambda: setattr(httpx.Client, 'send', httpx_send))
+    except ImportError:
+        pass
+
+    def uninstall():
+        for undo in reversed(restore):
+            undo()
+
+    return uninstall
+
+
+# --- פלט ---
+
+def write_run_record(record):
+    """כתיבת רשומת ה-JSON ל-TELEMETRY_DIR. מחזיר את הנתיב (או None)"""
+    try:
+        os.makedirs(TELEMETRY_DIR, exist_ok=True)
+        stamp = record['run_at'].replace('-', '').replace(':', '').replace(' ', '-')
+        path = os.path.join(TELEMETRY_DIR, f"{record['script']}-{stamp}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        return path
+    except OSError as e:
+        print(f"⚠️ Could not write run record: {e}")
+        return None
+
+
+def run_metrics_row(record):
+    """שורת הסיכום לגיליון run_metrics (בסדר של RUN_METRICS_COLUMNS)"""
+    endpoints = record['endpoints']
+    slowest = max(endpoints, key=lambda name: endpoints[name]['total_ms'], default='')
+    return (
+        [record['run_at'], record['script'], record['status'], record['duration_sec']]
+        + [round(record['stages'].get(name, 0), 2) for name in STAGES]
+        + [
+            sum(stats['calls'] for stats in endpoints.values()),
+            sum(stats['errors'] for stats in endpoints.values()),
+            sum(stats['throttled'] for stats in endpoints.values()),
+            sum(count for name, count in record['counters'].items() if name.endswith('retries')),
+            sum(record['errors'].values()),
+            slowest,
+            endpoints[slowest]['p95_ms'] if slowest else 0,
+            record['run_id'],
+        ]
+    )
+
+
+def append_run_metrics(record):
+    """הוספת שורת הסיכום לגיליון run_metrics (נוצר בשימוש הראשון). כשל כאן רק מודפס"""
+    if not SHEET_ENABLED or not os.environ.get('GCP_SERVICE_ACCOUNT'):
+        return
+    try:
+        import gspread
+        from daily_rollup import get_spreadsheet
+        sh = get_spreadsheet()
+        try:
+            worksheet = sh.worksheet(RUN_METRICS_SHEET)
+        except gspread.exceptions.WorksheetNotFound:
+            worksheet = sh.add_worksheet(title=RUN_METRICS_SHEET, rows=1000, cols=len(RUN_METRICS_COLUMNS))
+            worksheet.update([RUN_METRICS_COLUMNS])
+        worksheet.append_row(run_metrics_row(record), value_input_option='RAW')
+    except Exception as e:
+        print(f"⚠️ Could not append run metrics: {e}")
+
+
+def print_summary(record):
+    stages = ' | '.join(f"{name} {sec:.1f}s" for name, sec in record['stages'].items())
+    calls = sum(stats['calls'] for stats in record['endpoints'].values())
+    print(f"\n⏱️ {record['script']}: {record['duration_sec']:.1f}s ({record['status']})"
+          + (f" | {stages}" if stages else ''))
+    print(f"   🌐 {calls:,} HTTP calls across {len(record['endpoints'])} endpoints"
+          + (f" | errors: {record['errors']}" if record['errors'] else ''))
+    for name, stats in list(record['endpoints'].items())[:3]:
+        print(f"   {name}: {stats['calls']:,} calls, {stats['total_ms'] / 1000:.1f}s total, "
+              f"p95 ≤ {stats['p95_ms']:,}ms")
+
+
+# --- API ---
+
+@contextmanager
+def track_run(script):
+    """
+    מדידת ריצה שלמה של סקריפט: HTTP hooks פעילים בזמן הריצה, ובסוף נכתבות
+    רשומת ה-JSON ושורת run_metrics. חריגה מסמנת את הריצה כ-failed וממשיכה לעלות.
+    """
+    global _current
+    telemetry = RunTelemetry(script)
+    previous, _current = _current, telemetry
+    uninstall = _install_http_hooks(telemetry)
+    try:
+        yield telemetry
+    except SystemExit as e:
+        if e.code:
+            telemetry.status = 'failed'
+        raise
+    except BaseException as e:
+        telemetry.status = 'failed'
+        telemetry.error(type(e).__name__)
+        raise
+    finally:
+        uninstall()
+        _current = previous
+        record = telemetry.record()
+        print_summary(record)
+        write_run_record(record)
+        append_run_metrics(record)
+
+
+@contextmanager
+def stage(name):
+    """שלב בריצה (fetch / enrich / merge / sheet_read / sheet_write / llm / telegram); בלי track_run - לא נמדד"""
+    if _current is None:
+        yield
+        return
+    with _current.stage(name):
+        yield
+
+
+def count(name, n=1):
+    """מונה חופשי (למשל telegram_retries)"""
+    if _current is not None:
+        _current.count(name, n)
+
+
+def mark_failed(reason):
+    """סימון הריצה ככושלת בלי חריגה (למשל כשהדוח לא נשלח)"""
+    if _current is not None:
+        _current.status = 'failed'
+        _current.error(reason)
@@ -0,0 +1,176 @@
+"""
+Sheet Journal - יומן write-ahead לכתיבות לגוגל שיטס
+כל כתיבה של collector נרשמת קודם לדיסק (קובץ JSON לכל כתיבה), ורק אז נשלחת.
+ה-flusher מאחד את כל הכתיבות הממתינות לאותו גיליון (האחרונה גוברת) ושולח את כל
+הגיליונות של ה-spreadsheet בקריאת batch אחת, עם retry ו-backoff על 429/5xx.
+כשל של Sheets משאיר את הכתיבה ביומן - היא נשלחת בריצה הבאה, בלי לאסוף שוב מה-API.
+
+החלפת גיליון נכתבת קודם ורק אחר כך נמחקות השורות/העמודות העודפות, כך שהגיליון אף פעם
+לא נשאר ריק באמצע (כמו ב-clear + update).
+
+שימוש:
+    from sheet_journal import write_sheet
+    write_sheet(sh, SHEET_NAME, [headers] + rows)
+
+שליחה ידנית של כתיבות ממתינות:
+    python sheet_journal.py
+"""
+
+import os
+import json
+import time
+import random
+import uuid
+import gspread
+from gspread.utils import absolute_range_name, rowcol_to_a1
+from run_telemetry import count
+
+# --- הגדרות ---
+SHEET_JOURNAL_DIR = os.environ.get('SHEET_JOURNAL_DIR', '.sheet_journal')
+FLUSH_RETRIES = 5
+# backoff אקספוננציאלי: 2, 4, 8, 16 שניות (+ jitter)
+FLUSH_BACKOFF_SEC = 2
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _json_default(value):
+    # מספרים של numpy (ערכים מ-DataFrame)
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def enqueue_replace(sh, sheet_name, values, value_input_option='RAW'):
+    """רישום החלפה מלאה של גיליון ביומן (כתיבה אטומית). מחזיר את נתיב הרשומה"""
+    os.makedirs(SHEET_JOURNAL_DIR, exist_ok=True)
+    entry = {
+        'op': 'replace',
+        'spreadsheet_id': sh.id,
+        'sheet': sheet_name,
+        'value_input_option': value_input_option,
+        'values': values,
+        'at': time.time(),
+    }
+    path = os.path.join(SHEET_JOURNAL_DIR, f"{time.time_ns()}-{uuid.uuid4().hex[:8]}.json")
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(entry, f, ensure_ascii=False, default=_json_default)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def pending_entries(spreadsheet_id=None):
+    """הרשומות הממתינות לפי סדר הכתיבה: [(path, entry)]"""
+    if not os.path.isdir(SHEET_JOURNAL_DIR):
+        return []
+    entries = []
+    for name in sorted(os.listdir(SHEET_JOURNAL_DIR)):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(SHEET_JOURNAL_DIR, name)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Skipping unreadable journal entry {name}: {e}")
+            continue
+        if spreadsheet_id is None or entry['spreadsheet_id'] == spreadsheet_id:
+            entries.append((path, entry))
+    return entries
+
+
+def coalesce(entries):
+    """רשומה אחת לכל גיליון - ההחלפה האחרונה גוברת על כל מה שלפניה"""
+    latest = {}
+    for _, entry in entries:
+        latest[entry['sheet']] = entry
+    return latest
+
+
+def with_retries(call, description):
+    """קריאה ל-Sheets עם retry ו-backoff על 429/5xx ושגיאות רשת"""
+    for attempt in range(FLUSH_RETRIES):
+        try:
+            return call()
+        except gspread.exceptions.APIError as e:
+            status = e.response.status_code
+            if status not in RETRYABLE_STATUS or attempt == FLUSH_RETRIES - 1:
+                raise
+            reason = f"HTTP {status}"
+        except OSError as e:  # כולל שגיאות רשת של requests
+            if attempt == FLUSH_RETRIES - 1:
+                raise
+            reason = type(e).__name__
+        wait = FLUSH_BACKOFF_SEC * 2 ** attempt * random.uniform(0.8, 1.2)
+        print(f"   ⏳ Sheets {description} failed ({reason}), retrying in {wait:.0f}s...")
+        count('sheet_flush_retries')
+        time.sleep(wait)
+
+
+def _trim_ranges(sh, writes):
+    """הטווחים שנשארו מעבר לנתונים החדשים (שורות מתחת ועמודות מימין) - לפי גודל ה-grid"""
+    grids = {
+        sheet['properties']['title']: sheet['properties']['gridProperties']
+        for sheet in with_retries(sh.fetch_sheet_metadata, 'metadata')['sheets']
+    }
+    ranges = []
+    for sheet_name, entry in writes.items():
+        grid = grids.get(sheet_name)
+        if not grid:
+            continue
+        rows = len(entry['values'])
+        cols = max((len(row) for row in entry['values']), default=0)
+        if grid['rowCount'] > rows:
+            ranges.append(absolute_range_name(
+                sheet_name, f"A{rows + 1}:{rowcol_to_a1(grid['rowCount'], grid['columnCount'])}"))
+        if grid['columnCount'] > cols and rows:
+            ranges.append(absolute_range_name(
+                sheet_name, f"{rowcol_to_a1(1, cols + 1)}:{rowcol_to_a1(rows, grid['columnCount'])}"))
+    return ranges
+
+
+def flush(sh):
+    """
+    שליחת כל הכתיבות הממתינות ל-spreadsheet: batch update אחד לכל value_input_option
+    ו-batch clear אחד לעודפים. מחזיר True אם היומן התרוקן.
+    """
+    entries = pending_entries(sh.id)
+    if not entries:
+        return True
+    writes = coalesce(entries)
+    try:
+        for option in sorted({entry['value_input_option'] for entry in writes.values()}):
+            data = [{'range': absolute_range_name(name, 'A1'), 'values': entry['values']}
+                    for name, entry in writes.items() if entry['value_input_option'] == option]
+            with_retries(lambda: sh.values_batch_update(
+                body={'valueInputOption': option, 'data': data}), 'write')
+        ranges = _trim_ranges(sh, writes)
+        if ranges:
+            with_retries(lambda: sh.values_batch_clear(body={'ranges': ranges}), 'trim')
+    except Exception as e:
+        print(f"⚠️ Sheets unavailable ({e}) - {len(writes)} sheet write(s) kept in "
+              f"{SHEET_JOURNAL_DIR}, will flush on the next run")
+        count('sheet_flush_failures')
+        return False
+
+    for path, _ in entries:
+        os.remove(path)
+    if len(entries) > len(writes):
+        print(f"   📒 Flushed {len(entries)} journaled writes as {len(writes)} sheet update(s)")
+    return True
+
+
+def write_sheet(sh, sheet_name, values, value_input_option='RAW'):
+    """החלפת תוכן הגיליון דרך היומן (במקום worksheet.clear() + worksheet.update()). מחזיר האם נשלח"""
+    enqueue_replace(sh, sheet_name, values, value_input_option)
+    return flush(sh)
+
+
+if __name__ == "__main__":
+    from daily_rollup import get_spreadsheet
+
+    pending = pending_entries()
+    if not pending:
+        print("✅ Sheet journal is empty")
+    else:
+        print(f"📒 {len(pending)} pending sheet write(s)")
+        flush(get_spreadsheet())
@@ -0,0 +1,186 @@
+"""
+Sheet Stream - כתיבה של שורות לגיליון בחתיכות, תוך כדי האיסוף
+ה-collectors במצב streaming (--stream) מייצרים שורות ב-generator (דף -> העשרה -> שורה),
+והכותב אוסף CHUNK_ROWS שורות ועושה upsert לפי מזהה: שורות קיימות מתעדכנות במקומן
+(batch_update אחד), חדשות נוספות בסוף (append אחד). הזיכרון חסום בגודל החתיכה, וההתקדמות
+נכנסת לגיליון כל הזמן - גם איסוף של חודשים אחורה.
+
+מהגיליון נקראים רק השורה הראשונה ועמודות המזהה ומקורות הדלתא (views / reach).
+הדלתא מחושבת כמו במיזוג הרגיל. בסוף, הרולאפ של התאריכים שנכתבו מחושב מעמודות התאריך,
+הסוג והמדדים בגיליון (כל הפוסטים של התאריך, לא רק אלה שנאספו).
+שורות חדשות נוספות בסוף הגיליון - המיון לפי תאריך חוזר בריצה הרגילה הבאה.
+עם checkpoint, אחרי כל chunk נרשמת ביומן רשומת written - ריצה שממשיכה אחרי קריסה
+כותבת מחדש רק את השורות שנרשמו ביומן אחריה (checkpoint.journal_rows).
+
+שימוש:
+    writer = SheetChunkWriter(sh, worksheet, 'facebook', 'post_id', {'views_delta': 'views', 'reach_delta': 'reach'},
+                              checkpoint=checkpoint)
+    writer.write(chain(checkpoint.journal_rows(), iter_facebook_posts(checkpoint)))
+    writer.close()
+"""
+
+import re
+from itertools import islice
+import pandas as pd
+from gspread.utils import rowcol_to_a1
+from daily_rollup import ROLLUP_METRICS, update_rollup
+from summary_engine import PLATFORMS
+from sheet_journal import with_retries
+from run_telemetry import stage
+
+# --- הגדרות ---
+CHUNK_ROWS = 100
+
+
+def chunked(iterable, size):
+    """רשימות של עד size פריטים מתוך iterable (בלי לקרוא אותו כולו)"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _normalize_id(value):
+    # מזהים מספריים חוזרים מ-UNFORMATTED_VALUE כ-int/float
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _number(value):
+    try:
+        return float(str(value).replace(',', ''))
+    except ValueError:
+        return None
+
+
+class SheetChunkWriter:
+    """upsert של שורות (dict) לגיליון לפי id_column, בחתיכות של chunk_rows"""
+
+    def __init__(self, sh, worksheet, platform, id_column, delta_columns, chunk_rows=CHUNK_ROWS, checkpoint=None):
+        self.sh = sh
+        self.worksheet = worksheet
+        self.platform = platform
+        self.id_column = id_column
+        # עמודת דלתא <- עמודת המקור שלה (למשל views_delta <- views)
+        self.delta_columns = delta_columns
+        self.chunk_rows = chunk_rows
+        self.checkpoint = checkpoint
+        self.updated = 0
+        self.appended = 0
+        self.chunks = 0
+        self.dates = set()
+        self.header = with_retries(lambda: self.worksheet.row_values(1), 'read')
+        self._load_index()
+
+    def _read_columns(self, names):
+        """עמודות שלמות מהגיליון (בלי הכותרת) בקריאת batch אחת: {שם: [ערכים]}"""
+        present = [col for col in names if col in self.header]
+        ranges = []
+        for col in present:
+            letter = re.sub(r'\d', '', rowcol_to_a1(1, self.header.index(col) + 1))
+            ranges.append(f"{letter}2:{letter}")
+        if not ranges:
+            return {}
+        columns = with_retries(lambda: self.worksheet.batch_get(
+            ranges, value_render_option='UNFORMATTED_VALUE'), 'read')
+        return {col: [cells[0] if cells else '' for cells in column] for col, column in zip(present, columns)}
+
+    def _load_index(self):
+        """מיקום כל מזהה בגיליון והערך הקודם של עמודות המקור לדלתא"""
+        values = self._read_columns([self.id_column] + list(self.delta_columns.values()))
+        ids = values.get(self.id_column, [])
+        self.row_of = {_normalize_id(value): index + 2 for index, value in enumerate(ids) if value != ''}
+        self.previous = {}
+        for source in self.delta_columns.values():
+            column = values.get(source, [])
+            self.previous[source] = {
+                _normalize_id(ids[index]): _number(value)
+                for index, value in enumerate(column) if index < len(ids) and ids[index] != ''
+            }
+
+    def _ensure_header(self, rows):
+        missing = [key for row in rows for key in row if key not in self.header]
+        if not missing:
+            return
+        self.header += list(dict.fromkeys(missing))
+        with_retries(lambda: self.worksheet.update(
+            values=[self.header], range_name='A1', value_input_option='RAW'), 'header')
+
+    def write_chunk(self, rows):
+        with stage('sheet_write'):
+            self._write_chunk(rows)
+
+    def _write_chunk(self, rows):
+        for row in rows:
+            row_id = _normalize_id(row[self.id_column])
+            for delta_col, source in self.delta_columns.items():
+                previous = self.previous[source].get(row_id)
+                row[delta_col] = int(row[source] - previous) if previous is not None else 0
+                self.previous[source][row_id] = row[source]
+        self._ensure_header(rows)
+
+        updates, new_rows = [], []
+        for row in rows:
+            values = [row.get(col, '') for col in self.header]
+            row_number = self.row_of.get(_normalize_id(row[self.id_column]))
+            if row_number:
+                updates.append({'range': f"A{row_number}", 'values': [values]})
+            else:
+                new_rows.append((row, values))
+
+        if updates:
+            with_retries(lambda: self.worksheet.batch_update(updates, value_input_option='RAW'), 'update')
+        if new_rows:
+            response = with_retries(lambda: self.worksheet.append_rows(
+                [values for _, values in new_rows], value_input_option='RAW', table_range='A1'), 'append')
+            # השורה שבה התחיל ה-append (למשל "'נתוני פייסבוק'!A1001:S1025")
+            first_row = int(re.search(r'!\$?[A-Z]+\$?(\d+)', response['updates']['updatedRange']).group(1))
+            for offset, (row, _) in enumerate(new_rows):
+                self.row_of[_normalize_id(row[self.id_column])] = first_row + offset
+
+        date_col = PLATFORMS[self.platform]['date']
+        self.dates.update(row[date_col] for row in rows if row.get(date_col))
+        self.updated += len(updates)
+        self.appended += len(new_rows)
+        self.chunks += 1
+        if self.checkpoint is not None:
+            self.checkpoint.mark_written()
+        print(f"   📝 Chunk {self.chunks}: {len(updates)} updated, {len(new_rows)} appended")
+
+    def write(self, rows):
+        """כתיבת כל השורות מה-generator, chunk_rows בכל פעם. מחזיר את מספר השורות"""
+        for chunk in chunked(rows, self.chunk_rows):
+            self.write_chunk(chunk)
+        return self.updated + self.appended
+
+    def reset_deltas(self, item_ids):
+        """דלתא 0 לפריטים שלא נמדדו בריצה (נדחו) - כמו במיזוג הרגיל"""
+        updates = []
+        for item_id in item_ids:
+            row_number = self.row_of.get(_normalize_id(item_id))
+            for delta_col in self.delta_columns:
+                if row_number and delta_col in self.header:
+                    updates.append({'range': rowcol_to_a1(row_number, self.header.index(delta_col) + 1),
+                                    'values': [[0]]})
+        if updates:
+            with_retries(lambda: self.worksheet.batch_update(updates, value_input_option='RAW'), 'update')
+
+    def close(self):
+        """עדכון הרולאפ לתאריכים שנכתבו. כשל כאן רק מודפס, כמו ב-update_rollup"""
+        print(f"✅ Streamed {self.updated + self.appended} rows to {self.worksheet.title} "
+              f"({self.updated} updated, {self.appended} appended, {self.chunks} chunks)")
+        if not self.dates:
+            return
+        spec = PLATFORMS[self.platform]
+        with stage('sheet_write'):
+            try:
+                columns = self._read_columns([spec['date'], spec['type']] + list(ROLLUP_METRICS.values()))
+            except Exception as e:
+                print(f"⚠️ Failed to update rollup for {self.platform}: {e}")
+                return
+            length = max((len(values) for values in columns.values()), default=0)
+            frame = pd.DataFrame({col: values + [''] * (length - len(values)) for col, values in columns.items()})
+            update_rollup(self.sh, self.platform, frame, self.dates)
@@ -0,0 +1,204 @@
+"""
+Summary Engine - אגרגציה וקטורית לנתוני הפלטפורמות
+המרה מספרית אחת לכל טבלה, groupby אחד לכל פלטפורמה (סיכומים, ממוצעים, טופ N
+ומובילים ישנים לפי דלתא), ופירמוט שורות עם פעולות מחרוזת על עמודות במקום iterrows.
+משמש את הדוח היומי (summarize_day) ואת הדוח השבועי (summarize_period).
+"""
+
+import numpy as np
+import pandas as pd
+from prompt_builder import compact_text
+
+# --- הגדרות ---
+# עמודות מספריות שמומרות פעם אחת (pd.to_numeric) בכל טבלה
+NUMERIC_COLUMNS = ['views', 'views_delta', 'reach', 'likes', 'comments', 'shares', 'saved',
+                   'clicks', 'like_rate', 'engagement_rate']
+# עמודות שנסכמות לכל קבוצה
+SUM_COLUMNS = ['views', 'views_delta', 'reach', 'likes', 'comments', 'shares', 'saved', 'clicks']
+
+PLATFORMS = {
+    'youtube': {
+        'date': 'published_at', 'rank_by': 'views', 'rate': 'like_rate',
+        'title': 'title', 'type': 'video_type', 'default_type': 'רגיל', 'url': 'video_url',
+        'prefix': 'Y', 'metric': 'צפיות',
+    },
+    'facebook': {
+        'date': 'date', 'rank_by': 'reach', 'rate': 'engagement_rate',
+        'title': 'title', 'type': 'type', 'default_type': '', 'url': 'permalink',
+        'prefix': 'F', 'metric': 'reach',
+    },
+    'instagram': {
+        'date': 'date', 'rank_by': 'views', 'rate': 'engagement_rate',
+        'title': 'caption', 'type': 'type', 'default_type': '', 'url': 'permalink',
+        'prefix': 'I', 'metric': 'views',
+    },
+}
+
+
+def prepare_frame(df, platform):
+    """
+    עותק של הטבלה מוכן לאגרגציה: כל העמודות המספריות מומרות פעם אחת,
+    ועמודות חסרות ממולאות (0 למספרים, ברירת מחדל לטקסט).
+    מחזיר (frame, original_columns)
+    """
+    spec = PLATFORMS[platform]
+    original_columns = set(df.columns)
+    frame = df.copy()
+    for col in NUMERIC_COLUMNS:
+        if col in original_columns:
+            frame[col] = pd.to_numeric(frame[col], errors='coerce').fillna(0)
+        else:
+            frame[col] = 0
+    for col, default in ((spec['title'], ''), (spec['type'], spec['default_type']), (spec['url'], '')):
+        if col not in original_columns:
+            frame[col] = default
+        frame[col] = frame[col].fillna(default).astype(str)
+    frame[spec['date']] = frame[spec['date']].astype(str)
+    return frame, original_columns
+
+
+def _group_totals(groups, key):
+    """סכומי SUM_COLUMNS של קבוצה אחת מתוך תוצאת ה-groupby (אפסים אם הקבוצה ריקה)"""
+    if key in groups.index:
+        return {col: int(groups.at[key, col]) for col in SUM_COLUMNS}
+    return dict.fromkeys(SUM_COLUMNS, 0)
+
+
+def summarize_day(df, platform, date, top_n=5, delta_n=3):
+    """
+    סיכום יום אחד בפלטפורמה - groupby אחד על תקופת הפריט (חדש / ישן / מאוחר יותר).
+    מחזיר dict עם count, totals, avg_rate, top (טופ N מהיום) ו-delta
+    (פריטים ישנים שצברו הכי הרבה צפיות חדשות), או None אם אין נתונים.
+    """
+    if df is None or df.empty:
+        return None
+    spec = PLATFORMS[platform]
+    frame, original_columns = prepare_frame(df, platform)
+
+    dates = frame[spec['date']]
+    period = np.select([dates == date, dates < date], ['new', 'old'], 'later')
+    grouped = frame.groupby(period, sort=False)
+    groups = grouped[SUM_COLUMNS].sum()
+    groups['count'] = grouped.size()
+    groups['avg_rate'] = grouped[spec['rate']].mean()
+
+    new = grouped.get_group('new') if 'new' in groups.index else frame.iloc[0:0]
+    old = grouped.get_group('old') if 'old' in groups.index else frame.iloc[0:0]
+    old = old[old['views_delta'] > 0]
+
+    avg_rate = 0
+    if spec['rate'] in original_columns and 'new' in groups.index:
+        avg_rate = round(float(groups.at['new', 'avg_rate']), 2)
+
+    return {
+        'platform': platform,
+        'count': int(groups.at['new', 'count']) if 'new' in groups.index else 0,
+        'totals': _group_totals(groups, 'new'),
+        'avg_rate': avg_rate,
+        'top': new.nlargest(top_n, spec['rank_by']),
+        'delta': old.nlargest(delta_n, 'views_delta'),
+    }
+
+
+def summarize_period(df, platform, top_n=5):
+    """
+    סיכום תקופה (כל השורות שבטבלה) - groupby אחד לפי סוג התוכן.
+    הסכומים הכוללים מחושבים מהסכומים לפי סוג, בלי מעבר נוסף על השורות.
+    מחזיר dict עם count, totals, by_type (ממוין לפי מטריקת הדירוג), top ו-columns, או None.
+    """
+    if df is None or df.empty:
+        return None
+    spec = PLATFORMS[platform]
+    frame, original_columns = prepare_frame(df, platform)
+
+    grouped = frame.groupby(spec['type'], sort=False)
+    by_type = grouped[SUM_COLUMNS].sum()
+    by_type['count'] = grouped.size()
+    by_type = by_type.sort_values(spec['rank_by'], ascending=False)
+    totals = by_type[SUM_COLUMNS].sum()
+
+    return {
+        'platform': platform,
+        'count': len(frame),
+        'totals': {col: int(totals[col]) for col in SUM_COLUMNS},
+        'by_type': by_type,
+        'top': frame.nlargest(top_n, spec['rank_by']),
+        'columns': original_columns,
+    }
+
+
+def _thousands(series):
+    """פורמט מספרים שלמים עם מפריד אלפים"""
+    return series.astype('int64').map('{:,}'.format)
+
+
+def _integers(series):
+    return series.astype('int64').astype(str)
+
+
+def _percent(series):
+    # round של פייתון (כמו בגרסה הקודמת) - Series.round מעגל אחרת חלק מהערכים (0.35, 7.45)
+    return series.map(lambda value: str(round(value, 1)))
+
+
+def link_refs(rows, platform, links=None, item_type=None, value_col=None, metric=None):
+    """
+    רישום הלינקים של השורות ב-PromptBuilder (מזהה קצר + נתוני הפריט לרינדור מקומי).
+    ללא links - מחזיר את ה-URL המלאים.
+    """
+    spec = PLATFORMS[platform]
+    urls = rows[spec['url']]
+    if not links:
+        return urls
+    value_col = value_col or spec['rank_by']
+    types = item_type if item_type is not None else rows[spec['type']]
+    refs = [
+        links.link(url, spec['prefix'], {
+            'title': title, 'type': kind, 'value': int(value), 'metric': metric or spec['metric'],
+        })
+        for url, title, kind, value in zip(urls, rows[spec['title']], types, rows[value_col])
+    ]
+    return pd.Series(refs, index=rows.index, dtype=object)
+
+
+def format_top_lines(summary, links=None):
+    """שורות הטופ של היום (• ... | LINK: ...) לפרומפט, בפורמט של כל פלטפורמה"""
+    top = summary['top']
+    if top.empty:
+        return ""
+    platform = summary['platform']
+    spec = PLATFORMS[platform]
+    refs = link_refs(top, platform, links)
+    titles = top[spec['title']].map(compact_text)
+
+    if platform == 'youtube':
+        lines = ('• ' + titles + ' | ' + top['video_type'] + ' | ' + _thousands(top['views']) + ' צפיות | '
+                 + _thousands(top['likes']) + ' לייקים (' + _percent(top['like_rate']) + '%) | '
+                 + _integers(top['comments']) + ' תגובות | LINK: ' + refs)
+    elif platform == 'facebook':
+        lines = ('• ' + titles + ' | ' + top['type'] + ' | ' + _thousands(top['reach']) + ' reach | '
+                 + _thousands(top['views']) + ' views | לייקים: ' + _thousands(top['likes'])
+                 + ' | תגובות: ' + _integers(top['comments']) + ' | שיתופים: ' + _integers(top['shares'])
+                 + ' | מעורבות: ' + _percent(top['engagement_rate']) + '% | LINK: ' + refs)
+    else:
+        lines = ('• ' + titles + ' | ' + top['type'] + ' | ' + _thousands(top['views']) + ' views | '
+                 + _thousands(top['reach']) + ' reach | לייקים: ' + _thousands(top['likes'])
+                 + ' | תגובות: ' + _integers(top['comments']) + ' | שמירות: ' + _integers(top['saved'])
+                 + ' | שיתופים: ' + _integers(top['shares'])
+                 + ' | מעורבות: ' + _percent(top['engagement_rate']) + '% | LINK: ' + refs)
+    return ''.join(lines + '\n')
+
+
+def format_delta_lines(summary, links=None):
+    """שורות הפריטים הישנים שממשיכים לצבור צפיות (• ... | +N צפיות חדשות | LINK: ...)"""
+    delta = summary['delta']
+    if delta.empty:
+        return ""
+    platform = summary['platform']
+    spec = PLATFORMS[platform]
+    published = 'מ-' + delta[spec['date']]
+    refs = link_refs(delta, platform, links, item_type=published, value_col='views_delta',
+                     metric='צפיות חדשות')
+    lines = ('• ' + delta[spec['title']].map(compact_text) + ' | ' + published + ' | +'
+             + _thousands(delta['views_delta']) + ' צפיות חדשות | LINK: ' + refs)
+    return ''.join(lines + '\n')
@@ -0,0 +1,442 @@
+"""
+Telegram Delivery - שליחת דוחות לטלגרם
+פיצול דוחות ארוכים לפי קטעי ━━━, שליחה לפי הסדר עם טיפול ב-429 retry_after
+וגיבוי לטקסט רגיל אם ה-Markdown לא תקין.
+fan-out: דוח אחד נשלח במקביל לכל הצ'אטים ב-TELEGRAM_CHAT_IDS, בכפוף למגבלות הקצב
+של טלגרם (גלובלית ולכל צ'אט).
+הודעה מתעדכנת (streaming): placeholder שנערך בהדרגה עם editMessageText בזמן שהדוח נוצר
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from run_telemetry import count
+from rate_limiter import RateLimiter, KeyedRateLimiter
+
+# --- הגדרות ---
+TELEGRAM_API_URL = "https://api.telegram.org/bot{token}/{method}"
+# מגבלת אורך הודעה בטלגרם היא 4096 תווים
+MAX_MESSAGE_CHARS = 4000
+# מרווח מינימלי בין עריכות של אותה הודעה (טלגרם מגביל ל-~20 הודעות/עריכות בדקה בקבוצה)
+EDIT_INTERVAL_SEC = float(os.environ.get('TELEGRAM_EDIT_INTERVAL_SEC', '3'))
+# מגבלות הקצב של טלגרם: ~30 הודעות בשנייה לבוט, ו-20 בדקה לקבוצה
+GLOBAL_RATE_PER_SEC = float(os.environ.get('TELEGRAM_GLOBAL_RATE_PER_SEC', '25'))
+CHAT_RATE_PER_MIN = float(os.environ.get('TELEGRAM_CHAT_RATE_PER_MIN', '20'))
+CHAT_BURST = 3
+FANOUT_WORKERS = int(os.environ.get('TELEGRAM_FANOUT_WORKERS', '8'))
+MAX_SEND_ATTEMPTS = 5
+SECTION_SEPARATOR = '━━━'
+MARKDOWN_LINK_PATTERN = re.compile(r'\[[^\]]*\]\([^)]*\)')
+
+GLOBAL_LIMITER = RateLimiter(GLOBAL_RATE_PER_SEC, capacity=GLOBAL_RATE_PER_SEC)
+CHAT_LIMITERS = KeyedRateLimiter(CHAT_RATE_PER_MIN / 60, capacity=CHAT_BURST)
+
+
+def get_chat_ids():
+    """רשימת הצ'אטים לשליחה: TELEGRAM_CHAT_IDS (מופרדים בפסיקים), או TELEGRAM_CHAT_ID"""
+    raw = os.environ.get('TELEGRAM_CHAT_IDS') or os.environ.get('TELEGRAM_CHAT_ID') or ''
+    chat_ids = []
+    for chat_id in raw.split(','):
+        chat_id = chat_id.strip()
+        if chat_id and chat_id not in chat_ids:
+            chat_ids.append(chat_id)
+    return chat_ids
+
+
+def telegram_api(token, method, payload):
+    """
+    קריאה ל-Bot API, אחרי המתנה למגבלת הקצב הגלובלית ולמגבלה של הצ'אט.
+    מחזיר (response_json, status_code); במקרה של שגיאת רשת - ({}, None)
+    """
+    url = TELEGRAM_API_URL.format(token=token, method=method)
+    chat_id = payload.get('chat_id')
+    if chat_id is not None:
+        CHAT_LIMITERS.acquire(chat_id)
+    GLOBAL_LIMITER.acquire()
+    try:
+        response = requests.post(url, json=payload)
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        # 429: הצ'אט מושהה עד retry_after, כך שגם threads אחרים ימתינו
+        retry_after = retry_after_seconds(data) if response.status_code == 429 else None
+        if retry_after and chat_id is not None:
+            CHAT_LIMITERS.get(chat_id).pause(retry_after)
+        return data, response.status_code
+    except Exception as e:
+        print(f"Telegram Error: {e}")
+        return {}, None
+
+
+def retry_after_seconds(data):
+    """זמן ההמתנה שטלגרם ביקש בתשובת 429, אם יש"""
+    return (data.get('parameters') or {}).get('retry_after')
+
+
+def is_parse_error(data):
+    """האם טלגרם דחה את ההודעה בגלל Markdown לא תקין"""
+    return "can't parse entities" in str(data.get('description', '')).lower()
+
+
+def is_valid_markdown(text):
+    """
+    בדיקה בסיסית ל-Markdown (legacy) של טלגרם: סימני הדגשה זוגיים וסוגריים מאוזנים.
+    כתובות הלינקים לא נבדקות (קו תחתון ב-URL הוא תקין).
+    """
+    without_urls = re.sub(r'\]\([^)]*\)', ']', text)
+    if without_urls.count('[') != without_urls.count(']'):
+        return False
+    for marker in ('*', '_', '`'):
+        if without_urls.count(marker) % 2:
+            return False
+    return True
+
+
+def truncate_message(text, limit=MAX_MESSAGE_CHARS):
+    """קיצור הודעה למגבלת האורך של טלגרם"""
+    if len(text) <= limit:
+        return text
+    return text[:limit - 100] + "\n\n... (הדוח קוצר עקב מגבלת אורך)"
+
+
+def fit_lines(text, limit=MAX_MESSAGE_CHARS, min_lines=1):
+    """
+    השורות הראשונות של text שנכנסות ב-limit תווים - שורות שלמות, כך שלינק לא נשבר באמצע.
+    None אם לא נכנסות אפילו min_lines שורות.
+    """
+    lines = []
+    length = -1
+    for line in text.split('\n'):
+        if length + 1 + len(line) > limit:
+            break
+        lines.append(line)
+        length += 1 + len(line)
+    if len(lines) < min_lines:
+        return None
+    return '\n'.join(lines)
+
+
+def split_sections(text):
+    """פיצול לקטעים: קטע חדש מתחיל בשורת הכותרת שמעל קו ━━━"""
+    lines = text.split('\n')
+    sections = []
+    current = []
+    for i, line in enumerate(lines):
+        is_title = (
+            i + 1 < len(lines)
+            and lines[i + 1].startswith(SECTION_SEPARATOR)
+            and not line.startswith(SECTION_SEPARATOR)
+        )
+        if is_title and current:
+            sections.append('\n'.join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append('\n'.join(current))
+    return sections
+
+
+def _safe_cut(line, limit):
+    """נקודת חיתוך בשורה ארוכה: רווח אחרון לפני המגבלה שלא נמצא בתוך לינק"""
+    link_spans = [m.span() for m in MARKDOWN_LINK_PATTERN.finditer(line)]
+    for cut in range(limit, 0, -1):
+        if line[cut - 1] == ' ' and not any(start < cut < end for start, end in link_spans):
+            return cut
+    return limit
+
+
+def _split_block(block, limit):
+    """פיצול קטע ארוך לפי שורות (ושורה ארוכה מדי - לפי רווחים מחוץ ללינקים)"""
+    pieces = []
+    current = ''
+    for line in block.split('\n'):
+        if len(line) > limit and current:
+            pieces.append(current)
+            current = ''
+        while len(line) > limit:
+            cut = _safe_cut(line, limit)
+            pieces.append(line[:cut])
+            line = line[cut:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) <= limit:
+            current = candidate
+        else:
+            pieces.append(current)
+            current = line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_message(text, limit=MAX_MESSAGE_CHARS):
+    """
+    פיצול דוח להודעות של עד limit תווים.
+    מחלקים לפי גבולות קטעי ━━━; קטע ארוך מדי מתפצל לפי שורות, כך שלינקים
+    ו-Markdown בתוך שורה לא נשברים.
+    """
+    parts = []
+    current = ''
+    for section in split_sections(text):
+        pieces = [section] if len(section) <= limit else _split_block(section, limit)
+        for piece in pieces:
+            candidate = f"{current}\n{piece}" if current else piece
+            if len(candidate) <= limit:
+                current = candidate
+            else:
+                if current.strip():
+                    parts.append(current.strip('\n'))
+                current = piece
+    if current.strip():
+        parts.append(current.strip('\n'))
+    return parts
+
+
+def send_message(token, chat_id, text, parse_mode="Markdown", reply_to=None):
+    """
+    שליחת הודעה אחת עם retry: המתנה לפי retry_after ב-429, backoff בשגיאות שרת,
+    ושליחה חוזרת כטקסט רגיל אם טלגרם לא מצליח לפרסר את ה-Markdown.
+    reply_to - message_id שההודעה נשלחת כתגובה אליו.
+    מחזיר את ה-message_id, או None בכשלון.
+    """
+    if parse_mode and not is_valid_markdown(text):
+        parse_mode = None
+
+    for attempt in range(MAX_SEND_ATTEMPTS):
+        if attempt:
+            count('telegram_retries')
+        payload = {
+            "chat_id": chat_id,
+            "text": text,
+            "disable_web_page_preview": True,
+        }
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        if reply_to:
+            payload["reply_to_message_id"] = reply_to
+        data, status = telegram_api(token, 'sendMessage', payload)
+
+        if status == 200 and data.get('ok'):
+            return data['result']['message_id']
+        if status == 429:
+            # עם retry_after - ההמתנה נעשית ב-rate limiter של הצ'אט
+            wait = retry_after_seconds(data)
+            print(f"   ⏳ Telegram rate limit - retrying in {wait or 2 ** attempt}s")
+            if not wait:
+                time.sleep(2 ** attempt)
+            continue
+        if status == 400 and parse_mode and is_parse_error(data):
+            print("   ⚠️ Markdown rejected - resending as plain text")
+            parse_mode = None
+            continue
+        if status is None or status >= 500:
+            time.sleep(2 ** attempt)
+            continue
+
+        print(f"   Error details: {str(data)[:200]}")
+        return None
+
+    return None
+
+
+def edit_message(token, chat_id, message_id, text, parse_mode="Markdown"):
+    """
+    עריכת הודעה קיימת (editMessageText) עם אותם כללי retry כמו send_message.
+    "message is not modified" נחשב הצלחה. מחזיר True/False.
+    """
+    if parse_mode and not is_valid_markdown(text):
+        parse_mode = None
+
+    for attempt in range(MAX_SEND_ATTEMPTS):
+        if attempt:
+            count('telegram_retries')
+        payload = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "text": text,
+            "disable_web_page_preview": True,
+        }
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        data, status = telegram_api(token, 'editMessageText', payload)
+
+        if status == 200 and data.get('ok'):
+            return True
+        if status == 400 and 'not modified' in str(data.get('description', '')):
+            return True
+        if status == 429:
+            if not retry_after_seconds(data):
+                time.sleep(2 ** attempt)
+            continue
+        if status == 400 and parse_mode and is_parse_error(data):
+            parse_mode = None
+            continue
+        if status is None or status >= 500:
+            time.sleep(2 ** attempt)
+            continue
+
+        print(f"   Error details: {str(data)[:200]}")
+        return False
+
+    return False
+
+
+def send_report(token, chat_id, text, parse_mode="Markdown"):
+    """
+    שליחת דוח מלא - מפוצל לפי קטעים, לפי הסדר.
+    מחזיר רשימת message_id (ריקה אם החלק הראשון נכשל).
+    """
+    parts = split_message(text)
+    if len(parts) > 1:
+        print(f"   ✂️ Report split into {len(parts)} messages")
+
+    return send_parts(token, chat_id, parts, parse_mode)
+
+
+def send_parts(token, chat_id, parts, parse_mode="Markdown"):
+    """שליחת חלקי דוח לצ'אט אחד לפי הסדר; עוצר בחלק הראשון שנכשל"""
+    message_ids = []
+    for i, part in enumerate(parts):
+        message_id = send_message(token, chat_id, part, parse_mode)
+        if message_id is None:
+            print(f"   ❌ Failed to send part {i + 1}/{len(parts)} to {chat_id}")
+            break
+        message_ids.append(message_id)
+    return message_ids
+
+
+def fan_out_report(token, chat_ids, text, parse_mode="Markdown"):
+    """
+    שליחת אותו דוח לכמה צ'אטים במקביל.
+    הדוח מפוצל פעם אחת; כל צ'אט מקבל את החלקים לפי הסדר.
+    מחזיר {chat_id: {'ok': bool, 'message_ids': [...]}} ומדפיס סטטוס לכל צ'אט.
+    """
+    parts = split_message(text)
+    if not chat_ids or not parts:
+        return {}
+    if len(parts) > 1:
+        print(f"   ✂️ Report split into {len(parts)} messages")
+
+    workers = max(1, min(FANOUT_WORKERS, len(chat_ids)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            chat_id: executor.submit(send_parts, token, chat_id, parts, parse_mode)
+            for chat_id in chat_ids
+        }
+        results = {}
+        for chat_id, future in futures.items():
+            try:
+                message_ids = future.result()
+            except Exception as e:
+                print(f"   ❌ {chat_id}: {e}")
+                message_ids = []
+            results[chat_id] = {
+                'ok': len(message_ids) == len(parts),
+                'message_ids': message_ids,
+            }
+
+    for chat_id, result in results.items():
+        icon = "✅" if result['ok'] else "❌"
+        print(f"   {icon} {chat_id}: {len(result['message_ids'])}/{len(parts)} parts delivered")
+    return results
+
+
+class StreamingMessage:
+    """
+    הודעת טלגרם שמתעדכנת בזמן יצירת הדוח.
+    start() שולח placeholder, update() עורך אותו לכל היותר פעם ב-EDIT_INTERVAL_SEC
+    (כטקסט רגיל, כי Markdown חלקי לא תקין), ו-finish() שולח עריכה סופית עם Markdown.
+    """
+
+    def __init__(self, token, chat_id, min_interval=EDIT_INTERVAL_SEC):
+        self.token = token
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.message_id = None
+        self.message_ids = []
+        self.last_text = None
+        self.next_edit_at = 0.0
+        self.edits = 0
+
+    def start(self, placeholder):
+        data, status = telegram_api(self.token, 'sendMessage', {
+            "chat_id": self.chat_id,
+            "text": placeholder,
+            "disable_web_page_preview": True,
+        })
+        if status == 200 and data.get('ok'):
+            self.message_id = data['result']['message_id']
+            self.message_ids = [self.message_id]
+            self.last_text = placeholder
+            self.next_edit_at = time.monotonic() + self.min_interval
+            print(f"   📨 Placeholder sent (message {self.message_id})")
+            return True
+        print(f"   ⚠️ Could not send placeholder: {status} {str(data)[:200]}")
+        return False
+
+    def _edit(self, text, parse_mode=None):
+        payload = {
+            "chat_id": self.chat_id,
+            "message_id": self.message_id,
+            "text": text,
+            "disable_web_page_preview": True,
+        }
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        data, status = telegram_api(self.token, 'editMessageText', payload)
+        if status == 429:
+            self.next_edit_at = time.monotonic() + (retry_after_seconds(data) or self.min_interval)
+        elif status == 200:
+            self.last_text = text
+            self.edits += 1
+            self.next_edit_at = time.monotonic() + self.min_interval
+        return data, status
+
+    def update(self, text):
+        """עריכת ביניים - מדלגת אם לא עבר מספיק זמן מהעריכה הקודמת"""
+        if self.message_id is None or time.monotonic() < self.next_edit_at:
+            return
+        text = truncate_message(text)
+        if text != self.last_text:
+            self._edit(text)
+
+    def finish(self, text):
+        """
+        עריכה סופית עם Markdown (אם תקין), וגיבוי לטקסט רגיל אם טלגרם דוחה.
+        דוח ארוך מתפצל: החלק הראשון נכנס להודעה הקיימת והשאר נשלח כהודעות חדשות.
+        """
+        if self.message_id is None:
+            return False
+        parts = split_message(text)
+        text = parts[0] if parts else ''
+
+        # המתנה לחלון העריכה הבא כדי לא לקבל 429 על העריכה הסופית
+        wait = self.next_edit_at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+        edited = False
+        parse_mode = "Markdown" if is_valid_markdown(text) else None
+        for attempt in range(MAX_SEND_ATTEMPTS):
+            data, status = self._edit(text, parse_mode)
+            if status == 200 or (status == 400 and 'not modified' in str(data.get('description', ''))):
+                edited = True
+                break
+            if status == 400 and parse_mode and is_parse_error(data):
+                parse_mode = None
+                continue
+            if status == 429:
+                if not retry_after_seconds(data):
+                    time.sleep(self.min_interval)
+                continue
+            print(f"   Error details: {str(data)[:200]}")
+            return False
+        if not edited:
+            return False
+        print(f"   ✅ Final edit sent ({self.edits} edits)")
+
+        sent = send_parts(self.token, self.chat_id, parts[1:])
+        self.message_ids = [self.message_id] + sent
+        return len(sent) == len(parts) - 1
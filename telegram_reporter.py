@@ -1,19 +1,33 @@
 """
 Telegram Reporter - דוח AI מאוחד לכל הפלטפורמות
 קורא נתונים מכל הגיליונות (YouTube, Facebook, Instagram) ויוצר דוח עם Gemini
+--intraday: עדכון במהלך היום - עריכת ההודעה של הדוח הבוקר עם המובילים של היום
+(הפוסטים של היום נמשכים ישירות מה-API; הגיליונות הגולמיים לא נקראים ולא נכתבים)
 """
 
 import os
 import sys
 import json
+import time
 import pandas as pd
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import pytz
-import requests
 from google import genai
-from google.genai import types
+from gemini_utils import generate_with_fallback, generate_with_reflection
+from prompt_builder import PromptBuilder, compact_text
+from summary_engine import summarize_day, format_top_lines, format_delta_lines
+from run_telemetry import track_run, stage, mark_failed
+from profiling import profile_run
+import facebook_collector
+import instagram_collector
+import youtube_collector
+from telegram_delivery import (
+    MAX_MESSAGE_CHARS, StreamingMessage, edit_message, fan_out_report, fit_lines, get_chat_ids,
+    send_message, split_message
+)
 
 # Fix encoding for Windows console
 if sys.stdout.encoding != 'utf-8':
@@ -30,6 +44,23 @@ except ImportError:
 SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/1WB0cFc2RgR1Z-crjhtkSqLKp1mMdFoby8NwV7h3UN6c/edit"
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
 
+# מצב יצירת הדוח: single (פרומפט אחד) או map_reduce (קטע לכל פלטפורמה במקביל)
+REPORT_MODE = os.environ.get('REPORT_MODE', 'single')
+# מצב משלוח: message (הודעה אחת בסוף) או stream (placeholder שנערך בזמן היצירה)
+REPORT_DELIVERY = os.environ.get('REPORT_DELIVERY', 'message')
+# פורמט הפלט מהמודל: json (סכמה + רינדור מקומי) או text (Markdown חופשי; תמיד במצב stream)
+REPORT_FORMAT = os.environ.get('REPORT_FORMAT', 'json')
+# Reflection: טיוטה ממודל מהיר + ביקורת ותיקון תחת deadline (REPORT_REFLECTION=1 או --reflect)
+REPORT_REFLECTION = os.environ.get('REPORT_REFLECTION') == '1'
+# עדכונים במהלך היום: גיליון עם מזהי ההודעות של הדוח הבוקר, ומספר המובילים לכל פלטפורמה
+REPORT_STATE_SHEET = 'מצב דוח'
+REPORT_STATE_COLUMNS = ['date', 'chat_id', 'message_id', 'base_text', 'leaders', 'comment', 'rendered', 'updated_at',
+                        'section_message_id']
+INTRADAY_LEADERS = 2
+INTRADAY_MODEL = "gemini-2.5-flash"
+# אורך מקסימלי לכותרת ולתובנות מפלט ה-JSON (1-2 משפטים)
+INSIGHT_MAX_CHARS = 400
+
 
 def get_sheet_client():
     creds_json = json.loads(os.environ['GCP_SERVICE_ACCOUNT'])
@@ -103,48 +134,23 @@ def get_followers_data():
         return pd.DataFrame()
 
 
-def summarize_youtube(df, yesterday_date):
+def summarize_youtube(df, yesterday_date, links=None):
     """יצירת סיכום יוטיוב לפרומפט - כולל מטריקות מעורבות לניתוח AI"""
-    if df.empty:
+    summary = summarize_day(df, 'youtube', yesterday_date)
+    if summary is None:
         return "אין נתונים"
     
-    # סרטונים חדשים מאתמול
-    new_yesterday = df[df['published_at'] == yesterday_date].copy()
-    new_count = len(new_yesterday)
-    total_views_new = int(new_yesterday['views'].sum()) if not new_yesterday.empty else 0
-    total_likes_new = int(new_yesterday['likes'].sum()) if 'likes' in new_yesterday.columns and not new_yesterday.empty else 0
-    total_comments_new = int(new_yesterday['comments'].sum()) if 'comments' in new_yesterday.columns and not new_yesterday.empty else 0
-    
-    # חישוב ממוצע like_rate לסרטונים החדשים
-    avg_like_rate = 0
-    if 'like_rate' in new_yesterday.columns and not new_yesterday.empty:
-        avg_like_rate = round(new_yesterday['like_rate'].mean(), 2)
-    
-    # טופ 5 מאתמול - עם מטריקות מעורבות לניתוח
-    top_new = ""
-    if not new_yesterday.empty:
-        new_yesterday = new_yesterday.sort_values('views', ascending=False)
-        for _, row in new_yesterday.head(5).iterrows():
-            likes = int(row.get('likes', 0))
-            comments = int(row.get('comments', 0))
-            like_rate = round(row.get('like_rate', 0), 1)
-            # פורמט מורחב לניתוח AI
-            video_url = row.get('video_url', '')
-            top_new += f"• {row['title']} | {row.get('video_type', 'רגיל')} | {int(row['views']):,} צפיות | {likes:,} לייקים ({like_rate}%) | {comments} תגובות | LINK: {video_url}\n"
-    
-    # סרטונים ישנים עם דלתא גבוהה
-    top_delta = ""
-    if 'views_delta' in df.columns:
-        old_videos = df[df['published_at'] < yesterday_date].copy()
-        if not old_videos.empty:
-            old_videos = old_videos[old_videos['views_delta'] > 0].sort_values('views_delta', ascending=False)
-            for _, row in old_videos.head(3).iterrows():
-                video_url = row.get('video_url', '')
-                top_delta += f"• {row['title']} | מ-{row['published_at']} | +{int(row['views_delta']):,} צפיות חדשות | LINK: {video_url}\n"
-    
-    return f"""סרטונים חדשים: {new_count}
-סה"כ צפיות חדשות: {total_views_new:,}
-סה"כ לייקים: {total_likes_new:,} | תגובות: {total_comments_new:,} | ממוצע like rate: {avg_like_rate}%
+    totals = summary['totals']
+    # טופ 5 מאתמול - עם מטריקות מעורבות לניתוח, וסרטונים ישנים עם דלתא גבוהה
+    top_new = format_top_lines(summary, links)
+    top_delta = format_delta_lines(summary, links)
+    
+    if links:
+        links.set_totals('youtube', count=summary['count'], views=totals['views'])
+    
+    return f"""סרטונים חדשים: {summary['count']}
+סה"כ צפיות חדשות: {totals['views']:,}
+סה"כ לייקים: {totals['likes']:,} | תגובות: {totals['comments']:,} | ממוצע like rate: {summary['avg_rate']}%
 
 טופ מאתמול (כולל מעורבות):
 {top_new if top_new else "אין סרטונים חדשים"}
@@ -153,92 +159,45 @@ def summarize_youtube(df, yesterday_date):
 {top_delta if top_delta else "אין מידע"}"""
 
 
-def summarize_facebook(df, yesterday_date):
+def summarize_facebook(df, yesterday_date, links=None):
     """יצירת סיכום פייסבוק לפרומפט - כולל מטריקות מעורבות לניתוח AI"""
-    if df.empty:
+    summary = summarize_day(df, 'facebook', yesterday_date)
+    if summary is None:
         return "אין נתונים"
     
-    # פוסטים מאתמול
-    new_yesterday = df[df['date'] == yesterday_date].copy()
-    new_count = len(new_yesterday)
-    total_reach = int(new_yesterday['reach'].sum()) if not new_yesterday.empty else 0
-    total_views = int(new_yesterday['views'].sum()) if not new_yesterday.empty else 0
-    
-    # מטריקות מעורבות מצטברות
-    total_likes = int(new_yesterday['likes'].sum()) if 'likes' in new_yesterday.columns and not new_yesterday.empty else 0
-    total_comments = int(new_yesterday['comments'].sum()) if 'comments' in new_yesterday.columns and not new_yesterday.empty else 0
-    total_shares = int(new_yesterday['shares'].sum()) if 'shares' in new_yesterday.columns and not new_yesterday.empty else 0
-    total_clicks = int(new_yesterday['clicks'].sum()) if 'clicks' in new_yesterday.columns and not new_yesterday.empty else 0
+    totals = summary['totals']
+    # טופ 5 לפי reach - עם מטריקות מעורבות לניתוח
+    top_posts = format_top_lines(summary, links)
     
-    # ממוצע engagement rate
-    avg_engagement = 0
-    if 'engagement_rate' in new_yesterday.columns and not new_yesterday.empty:
-        avg_engagement = round(new_yesterday['engagement_rate'].mean(), 2)
+    if links:
+        links.set_totals('facebook', count=summary['count'], reach=totals['reach'])
     
-    # טופ 5 לפי reach - עם מטריקות מעורבות לניתוח
-    top_posts = ""
-    if not new_yesterday.empty:
-        new_yesterday = new_yesterday.sort_values('reach', ascending=False)
-        for _, row in new_yesterday.head(5).iterrows():
-            title = (row.get('title', '') or '')
-            likes = int(row.get('likes', 0))
-            comments = int(row.get('comments', 0))
-            shares = int(row.get('shares', 0))
-            eng_rate = round(row.get('engagement_rate', 0), 1)
-            # פורמט מורחב לניתוח AI
-            permalink = row.get('permalink', '')
-            top_posts += f"• {title} | {row.get('type', '')} | {int(row['reach']):,} reach | {int(row['views']):,} views | לייקים: {likes:,} | תגובות: {comments} | שיתופים: {shares} | מעורבות: {eng_rate}% | LINK: {permalink}\n"
-    
-    return f"""פוסטים חדשים: {new_count}
-סה"כ Reach: {total_reach:,} | צפיות וידאו: {total_views:,}
-מעורבות: {total_likes:,} לייקים | {total_comments:,} תגובות | {total_shares:,} שיתופים | {total_clicks:,} קליקים
-ממוצע engagement rate: {avg_engagement}%
+    return f"""פוסטים חדשים: {summary['count']}
+סה"כ Reach: {totals['reach']:,} | צפיות וידאו: {totals['views']:,}
+מעורבות: {totals['likes']:,} לייקים | {totals['comments']:,} תגובות | {totals['shares']:,} שיתופים | {totals['clicks']:,} קליקים
+ממוצע engagement rate: {summary['avg_rate']}%
 
 טופ פוסטים (כולל מעורבות):
 {top_posts if top_posts else "אין פוסטים חדשים"}"""
 
 
-def summarize_instagram(df, yesterday_date):
+def summarize_instagram(df, yesterday_date, links=None):
     """יצירת סיכום אינסטגרם לפרומפט - כולל מטריקות מעורבות לניתוח AI"""
-    if df.empty:
+    summary = summarize_day(df, 'instagram', yesterday_date)
+    if summary is None:
         return "אין נתונים"
     
-    # פוסטים מאתמול
-    new_yesterday = df[df['date'] == yesterday_date].copy()
-    new_count = len(new_yesterday)
-    total_views = int(new_yesterday['views'].sum()) if not new_yesterday.empty else 0
-    total_reach = int(new_yesterday['reach'].sum()) if not new_yesterday.empty else 0
-    
-    # מטריקות מעורבות מצטברות
-    total_likes = int(new_yesterday['likes'].sum()) if 'likes' in new_yesterday.columns and not new_yesterday.empty else 0
-    total_comments = int(new_yesterday['comments'].sum()) if 'comments' in new_yesterday.columns and not new_yesterday.empty else 0
-    total_saved = int(new_yesterday['saved'].sum()) if 'saved' in new_yesterday.columns and not new_yesterday.empty else 0
-    total_shares = int(new_yesterday['shares'].sum()) if 'shares' in new_yesterday.columns and not new_yesterday.empty else 0
+    totals = summary['totals']
+    # טופ 5 לפי views - עם מטריקות מעורבות לניתוח
+    top_posts = format_top_lines(summary, links)
     
-    # ממוצע engagement rate
-    avg_engagement = 0
-    if 'engagement_rate' in new_yesterday.columns and not new_yesterday.empty:
-        avg_engagement = round(new_yesterday['engagement_rate'].mean(), 2)
+    if links:
+        links.set_totals('instagram', count=summary['count'], views=totals['views'])
     
-    # טופ 5 לפי views - עם מטריקות מעורבות לניתוח
-    top_posts = ""
-    if not new_yesterday.empty:
-        new_yesterday = new_yesterday.sort_values('views', ascending=False)
-        for _, row in new_yesterday.head(5).iterrows():
-            caption = (row.get('caption', '') or '')
-            likes = int(row.get('likes', 0))
-            comments = int(row.get('comments', 0))
-            saved = int(row.get('saved', 0))
-            shares = int(row.get('shares', 0))
-            eng_rate = round(row.get('engagement_rate', 0), 1)
-            # פורמט מורחב לניתוח AI
-            permalink = row.get('permalink', '')
-            top_posts += f"• {caption} | {row.get('type', '')} | {int(row['views']):,} views | {int(row['reach']):,} reach | לייקים: {likes:,} | תגובות: {comments} | שמירות: {saved} | שיתופים: {shares} | מעורבות: {eng_rate}% | LINK: {permalink}\n"
-    
-    return f"""פוסטים חדשים: {new_count}
-סה"כ צפיות: {total_views:,} | Reach: {total_reach:,}
-מעורבות: {total_likes:,} לייקים | {total_comments:,} תגובות | {total_saved:,} שמירות | {total_shares:,} שיתופים
-ממוצע engagement rate: {avg_engagement}%
+    return f"""פוסטים חדשים: {summary['count']}
+סה"כ צפיות: {totals['views']:,} | Reach: {totals['reach']:,}
+מעורבות: {totals['likes']:,} לייקים | {totals['comments']:,} תגובות | {totals['saved']:,} שמירות | {totals['shares']:,} שיתופים
+ממוצע engagement rate: {summary['avg_rate']}%
 
 טופ פוסטים (כולל מעורבות):
 {top_posts if top_posts else "אין פוסטים חדשים"}"""
@@ -259,49 +218,34 @@ def get_followers_summary(df):
     return f"YouTube: {int(yt):,} | Facebook: {int(fb):,} | Instagram: {int(ig):,}"
 
 
-def analyze_all_platforms_with_gemini(youtube_summary, facebook_summary, instagram_summary, 
-                                       followers_summary, yesterday_date, report_time):
-    """ניתוח מאוחד של כל הפלטפורמות עם Gemini"""
-    api_key = os.environ.get('GEMINI_API_KEY')
-    if not api_key: 
-        return "⚠️ חסר מפתח ל-Gemini."
+# הוראות הדוח היומי - החלק הקבוע של הפרומפט (נשמר ב-context cache של Gemini)
+# מחולק לחלקים כדי שמצב map-reduce ישתמש באותם כללים לכל קטע בנפרד
+REPORT_ROLE = """אתה מנתח ביצועי רשתות חברתיות של כאן חדשות.
 
-    client = genai.Client(api_key=api_key)
-    
-    today_date = datetime.now(pytz.timezone('Asia/Jerusalem')).strftime('%d/%m/%Y')
-    
-    prompt = f"""אתה מנתח ביצועי רשתות חברתיות של כאן חדשות. התאריך: {today_date}.
+"""
 
-=== ⚠️ הקשר חשוב - YouTube ===
+YOUTUBE_TIMING_CONTEXT = """=== ⚠️ הקשר חשוב - YouTube ===
 סרטוני המהדורה עולים ב-20:00-21:00 בערב. לכן:
 - סרטון מאתמול בערב קיבל רוב הצפיות שלו היום בבוקר - זה המחזור הטבעי שלו, לא הפתעה
 - רק סרטונים מ-3+ ימים אחורה שצוברים דלתא גבוהה הם באמת "ממשיכים להדהד"
 - אל תתלהב מסרטונים "ישנים" של יום-יומיים - זה פשוט איך YouTube עובד אצלנו
 
-=== 📊 נתונים (כולל מטריקות מעורבות לניתוח) ===
-
-📺 YouTube:
-{youtube_summary}
-
-📘 Facebook:
-{facebook_summary}
-
-📷 Instagram:
-{instagram_summary}
-
-📊 עוקבים:
-{followers_summary}
+"""
 
-=== 📝 מבנה הדוח ===
+REPORT_INTRO = """=== 📝 מבנה הדוח ===
 
 **כתוב דוח תמציתי וקריא.** הנתונים שקיבלת כוללים מטריקות מעורבות (לייקים, תגובות, שיתופים) - השתמש בהם לתובנות, אבל **אל תציג את כולם** ברשימת המובילים.
 
-🏆 ההצלחה של היום
+"""
+
+HEADLINE_FORMAT = """🏆 ההצלחה של היום
 ━━━━━━━━━━━━━━━━━
 2-3 משפטים: מה הסיפור/תוכן שהצליח הכי טוב? אם הצליח בכמה פלטפורמות - ציין.
 **אם יש מעורבות חריגה (הרבה לייקים/תגובות/שיתופים יחסית לצפיות) - ציין זאת כאן.**
 
-📺 YouTube
+"""
+
+YOUTUBE_SECTION_FORMAT = """📺 YouTube
 ━━━━━━━━━━━━━━━━━
 - כמה סרטונים | כמה צפיות חדשות
 - מוביל 1: [שם](LINK) | סוג | צפיות
@@ -309,7 +253,9 @@ def analyze_all_platforms_with_gemini(youtube_summary, facebook_summary, instagr
 - מוביל 3: [שם](LINK) | סוג | צפיות
 💡 תובנה במשפט אחד (אפשר להזכיר מעורבות חריגה אם יש)
 
-📘 Facebook
+"""
+
+FACEBOOK_SECTION_FORMAT = """📘 Facebook
 ━━━━━━━━━━━━━━━━━
 - כמה פוסטים | reach כולל
 - מוביל 1: [שם](LINK) | סוג | reach
@@ -317,7 +263,9 @@ def analyze_all_platforms_with_gemini(youtube_summary, facebook_summary, instagr
 - מוביל 3: [שם](LINK) | סוג | reach
 💡 תובנה במשפט אחד (אפשר להזכיר מעורבות/שיתופים חריגים אם יש)
 
-📷 Instagram
+"""
+
+INSTAGRAM_SECTION_FORMAT = """📷 Instagram
 ━━━━━━━━━━━━━━━━━
 - כמה פוסטים | צפיות כולל
 - מוביל 1: [שם](LINK) | סוג | views
@@ -325,11 +273,15 @@ def analyze_all_platforms_with_gemini(youtube_summary, facebook_summary, instagr
 - מוביל 3: [שם](LINK) | סוג | views
 💡 תובנה במשפט אחד (אפשר להזכיר שמירות/תגובות חריגות אם יש)
 
-🔥 3 תובנות חוצות פלטפורמות
+"""
+
+INSIGHTS_INTRO = """🔥 3 תובנות חוצות פלטפורמות
 ━━━━━━━━━━━━━━━━━
 בחר 3 תובנות מעניינות מהנתונים - דברים שמפתיעים או שווה לשים לב אליהם.
 
-**בחר 3 מתוך האפשרויות (או תן תובנה אחרת שמצאת):**
+"""
+
+INSIGHT_OPTIONS = """**בחר 3 מתוך האפשרויות (או תן תובנה אחרת שמצאת):**
 📊 סיפור שהצליח בכמה פלטפורמות - איפה יותר ולמה?
 ⚡ הפתעה - תוכן שהצליח/נכשל מעבר לצפוי
 🎬 פער בין פורמטים - Reels vs תמונות vs Shorts
@@ -340,7 +292,9 @@ def analyze_all_platforms_with_gemini(youtube_summary, facebook_summary, instagr
 🤔 שאלה פתוחה - משהו ששווה לבדוק לעומק
 ❤️ מעורבות חריגה - תוכן שקיבל הרבה לייקים/תגובות/שיתופים יחסית לצפיות
 
-פורמט:
+"""
+
+INSIGHTS_TEXT_FORMAT = """פורמט:
 • [אימוג'י] תובנה קצרה ב-1-2 משפטים
 • [אימוג'י] תובנה קצרה ב-1-2 משפטים
 • [אימוג'י] תובנה קצרה ב-1-2 משפטים
@@ -350,14 +304,20 @@ def analyze_all_platforms_with_gemini(youtube_summary, facebook_summary, instagr
 - התובנות חייבות להיות על נושאים שונים
 - אל תכתוב משהו שכבר ברור מהמספרים למעלה
 
-=== ⚙️ כללים קריטיים ===
+"""
+
+INSIGHTS_FORMAT = INSIGHTS_INTRO + INSIGHT_OPTIONS + INSIGHTS_TEXT_FORMAT
+
+LINK_RULES = """=== ⚙️ כללים קריטיים ===
 
 **חשוב - לינקים:**
-- הנתונים שקיבלת כוללים LINK: לכל פריט
-- כשאתה מציג מוביל, השתמש בפורמט Markdown: [כותרת](LINK)
-- דוגמה: ["זה היה מרחץ דמים": ארסן](https://youtube.com/watch?v=xyz)
-- אל תשנה את LINK - העתק אותו בדיוק כפי שהוא
-**תובנות מבוססות נתונים:**
+- הנתונים שקיבלת כוללים LINK: לכל פריט - מזהה קצר כמו Y1, F2, I3
+- כשאתה מציג מוביל, השתמש בפורמט Markdown: [כותרת](מזהה)
+- דוגמה: ["זה היה מרחץ דמים": ארסן](Y1)
+- אל תשנה את המזהה - העתק אותו בדיוק כפי שהוא, הוא יוחלף בלינק המלא
+"""
+
+DATA_RULES = """**תובנות מבוססות נתונים:**
 ✅ "פוסט X הגיע ל-Y reach, פי Z יותר מהמוביל השני" ← טוב, ספציפי
 ✅ "הסרטון על X קיבל 5% like rate, פי 2 מהממוצע" ← טוב, מבוסס נתונים
 ❌ "נראה שהאלגוריתם מעדיף תוכן ביטחוני" ← רע, השערה כללית
@@ -367,7 +327,9 @@ def analyze_all_platforms_with_gemini(youtube_summary, facebook_summary, instagr
 ✅ "סרטון מאתמול בערב הוביל כצפוי במחזור הטבעי שלו" ← טוב
 ❌ "סרטון מלפני יומיים מפתיע וממשיך להצליח" ← רע, זה לא מפתיע
 
-**כללי:**
+"""
+
+GENERAL_RULES = """**כללי:**
 - התחל ישר מ-🏆 בלי הקדמה
 - השתמש בקווי ━━━ להפרדה
 - שמור על bullet points קצרים וקריאים
@@ -375,40 +337,353 @@ def analyze_all_platforms_with_gemini(youtube_summary, facebook_summary, instagr
 - אל תמציא נתונים
 """
 
-    contents = [
-        types.Content(
-            role="user",
-            parts=[
-                types.Part.from_text(text=prompt),
-            ],
-        ),
-    ]
+REPORT_RULES = LINK_RULES + DATA_RULES + GENERAL_RULES
+
+DAILY_REPORT_INSTRUCTIONS = (
+    REPORT_ROLE + YOUTUBE_TIMING_CONTEXT + REPORT_INTRO + HEADLINE_FORMAT
+    + YOUTUBE_SECTION_FORMAT + FACEBOOK_SECTION_FORMAT + INSTAGRAM_SECTION_FORMAT
+    + INSIGHTS_FORMAT + REPORT_RULES
+)
+
+# קטעי הפלטפורמות למצב map-reduce
+SECTION_FORMATS = {
+    'youtube': YOUTUBE_SECTION_FORMAT,
+    'facebook': FACEBOOK_SECTION_FORMAT,
+    'instagram': INSTAGRAM_SECTION_FORMAT,
+}
+SECTION_LABELS = {
+    'youtube': '📺 YouTube',
+    'facebook': '📘 Facebook',
+    'instagram': '📷 Instagram',
+}
+
+REDUCE_INSTRUCTIONS = (
+    REPORT_ROLE + YOUTUBE_TIMING_CONTEXT
+    + "=== 📝 מבנה ===\n\n"
+    + "קיבלת את קטעי הפלטפורמות של הדוח היומי (כבר כתובים). "
+    + "כתוב רק את הפתיחה ואת התובנות החוצות, בדיוק בפורמט הזה:\n\n"
+    + HEADLINE_FORMAT + INSIGHTS_FORMAT + REPORT_RULES
+)
+
+
+# מצב JSON: המודל מחזיר מבנה לפי סכמה, והדוח מרונדר מקומית מהנתונים
+JSON_OUTPUT_FORMAT = """=== 📝 מבנה התשובה (JSON) ===
+
+החזר JSON בלבד, לפי הסכמה. הכותרות, המספרים והלינקים ימולאו אוטומטית מהנתונים - אל תעתיק אותם.
+
+- headline: 2-3 משפטים - מה הסיפור/תוכן שהצליח הכי טוב? אם הצליח בכמה פלטפורמות - ציין. אם יש מעורבות חריגה - ציין.
+- sections: קטע לכל פלטפורמה (youtube, facebook, instagram):
+  - leaders: עד 3 מזהים של המובילים (כמו Y1, F2, I3), מהחזק לחלש - רק מזהים שמופיעים בנתונים
+  - insight: תובנה במשפט אחד (אפשר להזכיר מעורבות חריגה אם יש)
+- insights: בדיוק 3 תובנות חוצות פלטפורמות על נושאים שונים, כל אחת עם emoji ו-text של 1-2 משפטים
+
+"""
+
+JSON_REPORT_INSTRUCTIONS = (
+    REPORT_ROLE + YOUTUBE_TIMING_CONTEXT + JSON_OUTPUT_FORMAT + INSIGHT_OPTIONS
+    + "=== ⚙️ כללים קריטיים ===\n\n" + DATA_RULES
+    + "**כללי:**\n- אם הכל רגיל/שגרתי - אל תמציא תובנות מלאכותיות\n- אל תמציא נתונים\n"
+)
+
+REPORT_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'headline': {'type': 'STRING'},
+        'sections': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'platform': {'type': 'STRING', 'enum': ['youtube', 'facebook', 'instagram']},
+                    'leaders': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+                    'insight': {'type': 'STRING'},
+                },
+                'required': ['platform', 'leaders', 'insight'],
+            },
+        },
+        'insights': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'emoji': {'type': 'STRING'},
+                    'text': {'type': 'STRING'},
+                },
+                'required': ['emoji', 'text'],
+            },
+        },
+    },
+    'required': ['headline', 'sections', 'insights'],
+}
+
+INTRADAY_INSTRUCTIONS = """אתה מנתח ביצועי רשתות חברתיות של כאן חדשות.
+קיבלת את התכנים המובילים של היום עד עכשיו בכל פלטפורמה.
+כתוב משפט אחד (עד 25 מילים) על הסיפור הבולט של היום. בלי הקדמה, בלי Markdown, בלי לינקים.
+אל תמציא נתונים.
+"""
+
+SEPARATOR = "━━━━━━━━━━━━━━━━━"
+
+
+def build_section_instructions(platform):
+    """הוראות לקטע פלטפורמה אחד - אותם כללים כמו בדוח המלא"""
+    context = YOUTUBE_TIMING_CONTEXT if platform == 'youtube' else ''
+    rules = REPORT_RULES.replace(
+        '- התחל ישר מ-🏆 בלי הקדמה',
+        '- כתוב רק את הקטע הזה, התחל ישר מהכותרת שלו בלי הקדמה'
+    )
+    return (
+        REPORT_ROLE + context
+        + "=== 📝 מבנה הקטע ===\n\n"
+        + "כתוב קטע אחד מתוך הדוח היומי, בדיוק בפורמט הזה:\n\n"
+        + SECTION_FORMATS[platform] + rules
+    )
+
+
+def generate_report(client, models_to_try, prompt, config=None, system_instruction=None, on_chunk=None):
+    """יצירת הדוח מהמודל - עם שלב Reflection (טיוטה + ביקורת) אם הופעל"""
+    if '--reflect' in sys.argv or REPORT_REFLECTION:
+        return generate_with_reflection(client, models_to_try, prompt, config,
+                                        system_instruction=system_instruction, on_chunk=on_chunk)
+    return generate_with_fallback(client, models_to_try, prompt, config, on_chunk=on_chunk,
+                                  system_instruction=system_instruction)
+
+
+def analyze_all_platforms_with_gemini(youtube_summary, facebook_summary, instagram_summary, 
+                                       followers_summary, yesterday_date, report_time,
+                                       prompt_builder=None, on_chunk=None):
+    """
+    ניתוח מאוחד של כל הפלטפורמות עם Gemini.
+    prompt_builder מתאים כל קטע לתקציב הטוקנים שלו ומחזיר את הלינקים המקוצרים לתשובה.
+    on_chunk נקרא עם הטקסט המצטבר בזמן ה-streaming (למשלוח הדרגתי לטלגרם).
+    """
+    api_key = os.environ.get('GEMINI_API_KEY')
+    if not api_key: 
+        return "⚠️ חסר מפתח ל-Gemini."
+
+    client = genai.Client(api_key=api_key)
     
-    # Try primary model first, fallback to secondary if it fails
+    # Primary model first, secondary hedged in parallel if it is slow (cached by prompt)
     models_to_try = ["gemini-3-pro-preview", "gemini-2.5-pro"]
     
-    for model_name in models_to_try:
-        try:
-            print(f"   Trying model: {model_name}")
-            
-            response_text = ""
-            for chunk in client.models.generate_content_stream(
-                model=model_name,
-                contents=contents,
-            ):
-                if chunk.text:
-                    response_text += chunk.text
-            
-            if response_text:
-                return response_text
-                
-        except Exception as e:
-            print(f"   Model {model_name} failed: {e}")
-            continue
+    if prompt_builder is None:
+        prompt_builder = PromptBuilder()
+    prompt_builder.client = client
+    prompt_builder.model = models_to_try[-1]
+    youtube_summary = prompt_builder.fit_section('youtube', youtube_summary)
+    facebook_summary = prompt_builder.fit_section('facebook', facebook_summary)
+    instagram_summary = prompt_builder.fit_section('instagram', instagram_summary)
+    followers_summary = prompt_builder.fit_section('followers', followers_summary)
+    
+    today_date = datetime.now(pytz.timezone('Asia/Jerusalem')).strftime('%d/%m/%Y')
+    
+    # החלק הקבוע (DAILY_REPORT_INSTRUCTIONS) נשלח כ-cached content; כאן רק הנתונים
+    prompt = f"""התאריך: {today_date}.
+
+=== 📊 נתונים (כולל מטריקות מעורבות לניתוח) ===
+
+📺 YouTube:
+{youtube_summary}
+
+📘 Facebook:
+{facebook_summary}
+
+📷 Instagram:
+{instagram_summary}
+
+📊 עוקבים:
+{followers_summary}
+"""
+
+    prompt_builder.measure_prompt(prompt)
+    
+    response_text = generate_report(client, models_to_try, prompt, on_chunk=on_chunk,
+                                    system_instruction=DAILY_REPORT_INSTRUCTIONS)
+    if response_text:
+        return prompt_builder.expand_links(response_text)
     
     return "שגיאה: לא הצלחתי לייצר את הדוח. נסו שוב מאוחר יותר."
 
 
+def markdown_safe(text, max_chars=80):
+    """ניקוי תווים ששוברים Markdown של טלגרם מטקסט של המודל (כותרות בתוך לינק, תובנות)"""
+    text = compact_text(text, max_chars)
+    for char in ('*', '_', '`'):
+        text = text.replace(char, '')
+    return text.replace('[', '(').replace(']', ')')
+
+
+def render_structured_report(data, prompt_builder):
+    """רינדור הדוח (Markdown לטלגרם) מתשובת ה-JSON ומהנתונים ששמורים ב-prompt_builder"""
+    lines = ["🏆 ההצלחה של היום", SEPARATOR, markdown_safe(data.get('headline', ''), INSIGHT_MAX_CHARS), ""]
+    
+    sections = {s.get('platform'): s for s in data.get('sections', [])}
+    for platform in ['youtube', 'facebook', 'instagram']:
+        totals = prompt_builder.totals.get(platform, {})
+        section = sections.get(platform, {})
+        lines += [SECTION_LABELS[platform], SEPARATOR]
+        
+        if platform == 'youtube':
+            lines.append(f"- {totals.get('count', 0)} סרטונים | {totals.get('views', 0):,} צפיות חדשות")
+        elif platform == 'facebook':
+            lines.append(f"- {totals.get('count', 0)} פוסטים | {totals.get('reach', 0):,} reach")
+        else:
+            lines.append(f"- {totals.get('count', 0)} פוסטים | {totals.get('views', 0):,} צפיות")
+        
+        rank = 0
+        for ref in section.get('leaders', []):
+            item = prompt_builder.items.get(str(ref).strip())
+            if not item or rank == 3:
+                continue
+            rank += 1
+            lines.append(
+                f"- מוביל {rank}: [{markdown_safe(item['title'])}]({item['url']}) | "
+                f"{item['type']} | {item['value']:,} {item['metric']}"
+            )
+        
+        if section.get('insight'):
+            lines.append(f"💡 {markdown_safe(section['insight'], INSIGHT_MAX_CHARS)}")
+        lines.append("")
+    
+    lines += ["🔥 3 תובנות חוצות פלטפורמות", SEPARATOR]
+    lines += [format_insight(insight) for insight in data.get('insights', [])[:3]]
+    return '\n'.join(lines)
+
+
+def format_insight(insight):
+    """שורת תובנה אחת: • [אימוג'י] טקסט"""
+    return f"• {insight.get('emoji', '').strip()} {markdown_safe(insight.get('text', ''), INSIGHT_MAX_CHARS)}"
+
+
+def analyze_all_platforms_structured(youtube_summary, facebook_summary, instagram_summary,
+                                     followers_summary, prompt_builder):
+    """
+    ניתוח מאוחד עם פלט JSON לפי REPORT_SCHEMA.
+    מחזיר (report_text, insights) - הדוח מרונדר מקומית, והתובנות כרשימה מוכנה לשמירה.
+    אם ה-JSON לא תקין - הדוח נוצר מחדש במסלול הטקסט החופשי (analyze_all_platforms_with_gemini),
+    עם רשימת תובנות ריקה (הן יחולצו מהטקסט בשמירה).
+    """
+    api_key = os.environ.get('GEMINI_API_KEY')
+    if not api_key: 
+        return "⚠️ חסר מפתח ל-Gemini.", []
+
+    client = genai.Client(api_key=api_key)
+    models_to_try = ["gemini-3-pro-preview", "gemini-2.5-pro"]
+    
+    prompt_builder.client = client
+    prompt_builder.model = models_to_try[-1]
+    youtube_summary = prompt_builder.fit_section('youtube', youtube_summary)
+    facebook_summary = prompt_builder.fit_section('facebook', facebook_summary)
+    instagram_summary = prompt_builder.fit_section('instagram', instagram_summary)
+    followers_summary = prompt_builder.fit_section('followers', followers_summary)
+    
+    today_date = datetime.now(pytz.timezone('Asia/Jerusalem')).strftime('%d/%m/%Y')
+    prompt = f"""התאריך: {today_date}.
+
+=== 📊 נתונים (כולל מטריקות מעורבות לניתוח) ===
+
+📺 YouTube:
+{youtube_summary}
+
+📘 Facebook:
+{facebook_summary}
+
+📷 Instagram:
+{instagram_summary}
+
+📊 עוקבים:
+{followers_summary}
+"""
+    prompt_builder.measure_prompt(prompt)
+    
+    config = {'response_mime_type': 'application/json', 'response_schema': REPORT_SCHEMA}
+    response_text = generate_report(client, models_to_try, prompt, config=config,
+                                    system_instruction=JSON_REPORT_INSTRUCTIONS)
+    if not response_text:
+        return "שגיאה: לא הצלחתי לייצר את הדוח. נסו שוב מאוחר יותר.", []
+    
+    try:
+        data = json.loads(response_text)
+    except ValueError as e:
+        print(f"   ⚠️ Invalid JSON from model, falling back to the free-text report: {e}")
+        now = datetime.now(pytz.timezone('Asia/Jerusalem'))
+        report = analyze_all_platforms_with_gemini(
+            youtube_summary, facebook_summary, instagram_summary, followers_summary,
+            (now - timedelta(days=1)).strftime('%Y-%m-%d'), now.strftime('%H:%M'), prompt_builder
+        )
+        return report, []
+    
+    insights = [format_insight(insight) for insight in data.get('insights', [])[:3]]
+    return render_structured_report(data, prompt_builder), insights
+
+
+def analyze_platforms_map_reduce(summaries, followers_summary, prompt_builder=None):
+    """
+    מצב map-reduce: כל קטע פלטפורמה נוצר במקביל מפרומפט קטן משלו,
+    ואז קריאה קצרה אחת כותבת את 🏆 ואת התובנות החוצות מתוך הקטעים.
+    summaries: מילון platform -> סיכום הנתונים שלה
+    """
+    api_key = os.environ.get('GEMINI_API_KEY')
+    if not api_key: 
+        return "⚠️ חסר מפתח ל-Gemini."
+
+    client = genai.Client(api_key=api_key)
+    models_to_try = ["gemini-3-pro-preview", "gemini-2.5-pro"]
+    
+    if prompt_builder is None:
+        prompt_builder = PromptBuilder()
+    prompt_builder.client = client
+    prompt_builder.model = models_to_try[-1]
+    summaries = {p: prompt_builder.fit_section(p, text) for p, text in summaries.items()}
+    followers_summary = prompt_builder.fit_section('followers', followers_summary)
+    
+    today_date = datetime.now(pytz.timezone('Asia/Jerusalem')).strftime('%d/%m/%Y')
+    
+    def run_section(platform):
+        prompt = f"""התאריך: {today_date}.
+
+=== 📊 נתונים - {SECTION_LABELS[platform]} (כולל מטריקות מעורבות לניתוח) ===
+{summaries[platform]}
+"""
+        return generate_with_fallback(client, models_to_try, prompt,
+                                      system_instruction=build_section_instructions(platform))
+    
+    # Map - כל הקטעים במקביל
+    map_start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(summaries)) as executor:
+        futures = {p: executor.submit(run_section, p) for p in summaries}
+        sections = {p: future.result() for p, future in futures.items()}
+    print(f"   🗺️ Map: {len(sections)} sections in {time.monotonic() - map_start:.1f}s")
+    
+    for platform, text in sections.items():
+        if not text:
+            sections[platform] = f"{SECTION_LABELS[platform]}\n━━━━━━━━━━━━━━━━━\nלא הצלחתי לייצר את הקטע."
+    sections_text = '\n\n'.join(sections[p].strip() for p in summaries)
+    
+    # Reduce - פתיחה ותובנות חוצות מתוך הקטעים
+    reduce_start = time.monotonic()
+    reduce_prompt = f"""התאריך: {today_date}.
+
+=== 📊 קטעי הפלטפורמות ===
+{sections_text}
+
+📊 עוקבים:
+{followers_summary}
+"""
+    reduce_text = generate_with_fallback(client, models_to_try, reduce_prompt,
+                                         system_instruction=REDUCE_INSTRUCTIONS) or ''
+    print(f"   🧩 Reduce: {time.monotonic() - reduce_start:.1f}s")
+    
+    # פיצול: 🏆 לפני הקטעים, 🔥 אחריהם
+    headline, insights = reduce_text, ''
+    marker = reduce_text.find('🔥')
+    if marker != -1:
+        headline, insights = reduce_text[:marker], reduce_text[marker:]
+    
+    report = '\n\n'.join(part.strip() for part in [headline, sections_text, insights] if part.strip())
+    return prompt_builder.expand_links(report)
+
+
 def extract_cross_platform_insights(report_text):
     """חילוץ קטע התובנות החוצות מהדוח"""
     # מחפש את הקטע של התובנות החוצות
@@ -437,10 +712,11 @@ def extract_cross_platform_insights(report_text):
     return ""
 
 
-def save_daily_insights_to_sheets(report_text, report_date):
+def save_daily_insights_to_sheets(report_text, report_date, insights=None):
     """
     שמירת התובנות היומיות לגיליון נפרד לטובת הדוח השבועי.
     הגיליון ייווצר אוטומטית בריצה הראשונה.
+    insights - רשימת תובנות מפלט JSON; אם אין, התובנות נחלצות מהטקסט.
     """
     try:
         gc = get_sheet_client()
@@ -455,8 +731,8 @@ def save_daily_insights_to_sheets(report_text, report_date):
             # הוספת כותרות
             worksheet.update('A1', [['date', 'insights', 'timestamp']])
         
-        # חילוץ התובנות
-        insights = extract_cross_platform_insights(report_text)
+        # תובנות מפלט JSON, או חילוץ מהטקסט
+        insights = '\n'.join(insights) if insights else extract_cross_platform_insights(report_text)
         
         if not insights:
             print("   ⚠️ No insights found to save")
@@ -475,37 +751,250 @@ def save_daily_insights_to_sheets(report_text, report_date):
         return False
 
 
-def send_telegram_message(message):
-    """שליחת הודעה לטלגרם"""
+def send_telegram_message(message, chat_ids=None):
+    """
+    שליחת הודעה לכל הצ'אטים במקביל - מפוצלת לפי קטעים, עם retry ב-429 וגיבוי לטקסט רגיל.
+    מחזיר {chat_id: {'ok', 'message_ids'}} (ריק אם אין הגדרות טלגרם)
+    """
     token = os.environ.get('TELEGRAM_TOKEN')
-    chat_id = os.environ.get('TELEGRAM_CHAT_ID')
+    chat_ids = get_chat_ids() if chat_ids is None else chat_ids
     
-    if not token or not chat_id:
+    if not token or not chat_ids:
         print("⚠️ Skipping Telegram - missing credentials.")
+        return {}
+
+    return fan_out_report(token, chat_ids, message, parse_mode="Markdown")
+
+
+def get_state_worksheet():
+    """גיליון 'מצב דוח' - נוצר בשימוש הראשון"""
+    gc = get_sheet_client()
+    sh = gc.open_by_url(SPREADSHEET_URL)
+    try:
+        return sh.worksheet(REPORT_STATE_SHEET)
+    except gspread.exceptions.WorksheetNotFound:
+        print(f"   Creating '{REPORT_STATE_SHEET}' worksheet...")
+        return sh.add_worksheet(title=REPORT_STATE_SHEET, rows=50, cols=len(REPORT_STATE_COLUMNS))
+
+
+def write_report_state(worksheet, states):
+    """כתיבת כל שורות המצב (שורה לכל צ'אט) במקום הקודמות"""
+    rows = [REPORT_STATE_COLUMNS] + [
+        [str(state.get(column, '')) for column in REPORT_STATE_COLUMNS] for state in states
+    ]
+    worksheet.clear()
+    worksheet.update('A1', rows)
+
+
+def save_report_state(report_date, full_report, results):
+    """
+    שמירת מזהה ההודעה האחרונה של הדוח בכל צ'אט, יחד עם הטקסט שלה,
+    כדי שהריצות במהלך היום יוכלו לערוך אותה במקום לשלוח דוח חדש.
+    """
+    parts = split_message(full_report)
+    if not parts:
+        return False
+    timestamp = datetime.now(pytz.timezone('Asia/Jerusalem')).strftime('%Y-%m-%d %H:%M')
+    states = [
+        {
+            'date': report_date,
+            'chat_id': chat_id,
+            'message_id': result['message_ids'][-1],
+            'base_text': parts[-1],
+            'leaders': '[]',
+            'updated_at': timestamp,
+        }
+        for chat_id, result in results.items()
+        if result['ok'] and result['message_ids']
+    ]
+    if not states:
+        return False
+    try:
+        write_report_state(get_state_worksheet(), states)
+        print(f"   ✅ Saved report state for {len(states)} chat(s)")
+        return True
+    except Exception as e:
+        print(f"   ⚠️ Failed to save report state: {e}")
         return False
 
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
+
+def load_report_state(report_date):
+    """מחזיר (worksheet, שורות המצב של הדוח מתאריך נתון); רשימה ריקה אם אין"""
+    try:
+        worksheet = get_state_worksheet()
+        records = worksheet.get_all_records(numericise_ignore=['all'])
+    except Exception as e:
+        print(f"   ⚠️ Failed to load report state: {e}")
+        return None, []
+    return worksheet, [record for record in records if record.get('date') == report_date]
+
+
+def fetch_today_data():
+    """
+    הפוסטים של היום מכל פלטפורמה (youtube, facebook, instagram), ישירות מה-API ובמקביל.
+    הגיליונות הגולמיים לא נקראים ולא נכתבים - views_delta / reach_delta שבהם נשארים מול הריצה
+    היומית, והמספרים המרועננים נשמרים רק במצב הדוח (rendered). פלטפורמה שנכשלה - טבלה ריקה.
+    """
+    def fetch_instagram():
+        ig_account_id = instagram_collector.get_instagram_account_id()
+        return instagram_collector.fetch_today_media(ig_account_id) if ig_account_id else pd.DataFrame()
+
+    fetchers = {
+        'youtube': youtube_collector.fetch_today_videos,
+        'facebook': facebook_collector.fetch_today_posts,
+        'instagram': fetch_instagram,
+    }
+    with ThreadPoolExecutor(max_workers=len(fetchers)) as executor:
+        futures = {platform: executor.submit(fetch) for platform, fetch in fetchers.items()}
+    data = {}
+    for platform, future in futures.items():
+        try:
+            data[platform] = future.result()
+        except Exception as e:
+            print(f"Error fetching today's {platform} posts: {e}")
+            data[platform] = pd.DataFrame()
+        print(f"   {platform}: {len(data[platform])} posts today")
+    return data
+
+
+def intraday_leaders(prompt_builder, limit=INTRADAY_LEADERS):
+    """
+    המובילים של היום לכל פלטפורמה, מהפריטים שהסיכומים רשמו ב-prompt_builder
+    (הסיכומים ממיינים לפי המטריקה, כך שסדר הרישום הוא סדר הדירוג).
+    סרטונים ישנים (צפיות חדשות) לא נכללים.
+    """
+    leaders = {}
+    for platform, prefix in (('youtube', 'Y'), ('facebook', 'F'), ('instagram', 'I')):
+        items = [
+            item for ref, item in prompt_builder.items.items()
+            if ref.startswith(prefix) and item['metric'] != 'צפיות חדשות'
+        ]
+        leaders[platform] = items[:limit]
+    return leaders
+
+
+def render_intraday_body(leaders, comment):
+    """שורות קטע העדכון (בלי שעת העדכון, כדי שאפשר יהיה להשוות בין ריצות)"""
+    lines = []
+    for platform, items in leaders.items():
+        icon = SECTION_LABELS[platform].split()[0]
+        for item in items:
+            lines.append(
+                f"{icon} [{markdown_safe(item['title'])}]({item['url']}) | "
+                f"{item['type']} | {item['value']:,} {item['metric']}"
+            )
+    if comment:
+        lines.append(f"💡 {comment.strip()}")
+    return '\n'.join(lines)
+
+
+def generate_intraday_comment(leaders):
+    """משפט אחד על המובילים של היום - קריאה קצרה למודל מהיר"""
+    api_key = os.environ.get('GEMINI_API_KEY')
+    if not api_key:
+        return ''
+    lines = [
+        f"{platform}: {compact_text(item['title'])} | {item['type']} | {item['value']:,} {item['metric']}"
+        for platform, items in leaders.items() for item in items
+    ]
+    client = genai.Client(api_key=api_key)
+    response_text = generate_with_fallback(client, [INTRADAY_MODEL], '\n'.join(lines),
+                                           system_instruction=INTRADAY_INSTRUCTIONS)
+    return compact_text(response_text or '', 300)
+
+
+def post_intraday_section(token, state, section):
+    """
+    קטע העדכון נכנס לסוף ההודעה של הדוח בשורות שלמות (כותרת ולפחות מוביל אחד), במקום
+    שהקיצור יחתוך אותו או ישבור לינק. אם אין מקום - הוא נשלח כתגובה להודעה, וריצות
+    הבאות עורכות את התגובה (section_message_id). מחזיר True/False.
+    """
+    chat_id, message_id = state['chat_id'], int(state['message_id'])
+    if not state.get('section_message_id'):
+        available = MAX_MESSAGE_CHARS - len(state['base_text']) - 2
+        fitted = fit_lines(section, available, min_lines=3)
+        if fitted:
+            return edit_message(token, chat_id, message_id, f"{state['base_text']}\n\n{fitted}")
+        print(f"   ✂️ {chat_id}: no room in the report message - sending the update as a reply")
+        reply_id = send_message(token, chat_id, fit_lines(section), reply_to=message_id)
+        if reply_id is None:
+            return False
+        state['section_message_id'] = reply_id
+        return True
+    return edit_message(token, chat_id, int(state['section_message_id']), fit_lines(section))
+
+
+def update_intraday_report():
+    """
+    עדכון במהלך היום: קטע '⚡ עדכון מהיום' בסוף ההודעה האחרונה של הדוח הבוקר
+    (או בתגובה אליה, אם אין בה מקום - post_intraday_section).
+    המובילים מחושבים מקומית מהפוסטים של היום (fetch_today_data - בלי לגעת בגיליונות הגולמיים);
+    Gemini נקרא רק אם קבוצת המובילים השתנתה,
+    וההודעה נערכת רק אם הטקסט המרונדר שונה מהעריכה הקודמת.
+    """
+    il_tz = pytz.timezone('Asia/Jerusalem')
+    now = datetime.now(il_tz)
+    today = now.strftime('%Y-%m-%d')
+    report_date = (now - timedelta(days=1)).strftime('%Y-%m-%d')
     
-    # Telegram message limit is 4096 characters
-    if len(message) > 4000:
-        print(f"⚠️ Message too long ({len(message)} chars), truncating...")
-        message = message[:3900] + "\n\n... (הדוח קוצר עקב מגבלת אורך)"
+    print(f"\n{'='*60}")
+    print(f"⚡ Intraday Update - {now.strftime('%Y-%m-%d %H:%M')}")
+    print(f"{'='*60}\n")
     
-    payload = {
-        "chat_id": chat_id, 
-        "text": message,
-        "parse_mode": "Markdown",
-        "disable_web_page_preview": True
-    }
-    try: 
-        response = requests.post(url, json=payload)
-        print(f"Telegram response: {response.status_code}")
-        if response.status_code != 200:
-            print(f"   Error details: {response.text[:200]}")
-        return response.status_code == 200
-    except Exception as e: 
-        print(f"Telegram Error: {e}")
-        return False
+    token = os.environ.get('TELEGRAM_TOKEN')
+    if not token:
+        print("⚠️ Skipping Telegram - missing credentials.")
+        return
+    
+    with stage('sheet_read'):
+        worksheet, states = load_report_state(report_date)
+    if not states:
+        print(f"ℹ️ No morning report state for {report_date} - nothing to update")
+        return
+    
+    # רק הפוסטים של היום - בלי עוקבים ובלי פרומפט מלא
+    prompt_builder = PromptBuilder()
+    with stage('fetch'):
+        data = fetch_today_data()
+    summarize_youtube(data['youtube'], today, prompt_builder)
+    summarize_facebook(data['facebook'], today, prompt_builder)
+    summarize_instagram(data['instagram'], today, prompt_builder)
+    leaders = intraday_leaders(prompt_builder)
+    leader_urls = sorted(item['url'] for items in leaders.values() for item in items)
+    if not leader_urls:
+        print("ℹ️ No new content today yet")
+        return
+    
+    state = states[0]
+    comment = state.get('comment', '')
+    if leader_urls != sorted(json.loads(state.get('leaders') or '[]')):
+        print("🤖 Leaders changed - asking Gemini for a one-line summary...")
+        with stage('llm'):
+            comment = generate_intraday_comment(leaders)
+    else:
+        print("♻️ Leaders unchanged - skipping Gemini")
+    
+    body = render_intraday_body(leaders, comment)
+    if body == state.get('rendered'):
+        print("✅ Nothing changed since the last update - skipping edit")
+        return
+    
+    section = f"⚡ עדכון מהיום (עודכן ב-{now.strftime('%H:%M')})\n{SEPARATOR}\n{body}"
+    with stage('telegram'):
+        print(f"📝 Editing the morning report in {len(states)} chat(s)...")
+        for state in states:
+            if post_intraday_section(token, state, section):
+                state.update(leaders=json.dumps(leader_urls), comment=comment, rendered=body,
+                             updated_at=now.strftime('%Y-%m-%d %H:%M'))
+                print(f"   ✅ {state['chat_id']}: updated")
+            else:
+                print(f"   ❌ {state['chat_id']}: edit failed")
+
+    try:
+        with stage('sheet_write'):
+            write_report_state(worksheet, states)
+    except Exception as e:
+        print(f"   ⚠️ Failed to save report state: {e}")
 
 
 def generate_unified_report():
@@ -520,60 +1009,120 @@ def generate_unified_report():
     print(f"{'='*60}\n")
     
     # שליפת נתונים מכל הפלטפורמות
-    print("📺 Fetching YouTube data...")
-    youtube_df = get_youtube_data()
-    print(f"   Found {len(youtube_df)} videos")
-    
-    print("📘 Fetching Facebook data...")
-    facebook_df = get_facebook_data()
-    print(f"   Found {len(facebook_df)} posts")
-    
-    print("📷 Fetching Instagram data...")
-    instagram_df = get_instagram_data()
-    print(f"   Found {len(instagram_df)} posts")
-    
-    print("📊 Fetching followers data...")
-    followers_df = get_followers_data()
-    print(f"   Found {len(followers_df)} rows")
-    
+    with stage('sheet_read'):
+        print("📺 Fetching YouTube data...")
+        youtube_df = get_youtube_data()
+        print(f"   Found {len(youtube_df)} videos")
+
+        print("📘 Fetching Facebook data...")
+        facebook_df = get_facebook_data()
+        print(f"   Found {len(facebook_df)} posts")
+
+        print("📷 Fetching Instagram data...")
+        instagram_df = get_instagram_data()
+        print(f"   Found {len(instagram_df)} posts")
+
+        print("📊 Fetching followers data...")
+        followers_df = get_followers_data()
+        print(f"   Found {len(followers_df)} rows")
+
     # יצירת סיכומים
     print("\n📝 Creating summaries...")
-    youtube_summary = summarize_youtube(youtube_df, yesterday)
-    facebook_summary = summarize_facebook(facebook_df, yesterday)
-    instagram_summary = summarize_instagram(instagram_df, yesterday)
+    prompt_builder = PromptBuilder()
+    youtube_summary = summarize_youtube(youtube_df, yesterday, prompt_builder)
+    facebook_summary = summarize_facebook(facebook_df, yesterday, prompt_builder)
+    instagram_summary = summarize_instagram(instagram_df, yesterday, prompt_builder)
     followers_summary = get_followers_summary(followers_df)
     
-    # ניתוח עם Gemini
-    print("\n🤖 Analyzing with Gemini...")
-    report = analyze_all_platforms_with_gemini(
-        youtube_summary, 
-        facebook_summary, 
-        instagram_summary,
-        followers_summary,
-        yesterday,
-        report_time
-    )
+    header = f"📊 *דוח רשתות חברתיות יומי - כאן חדשות*\n{now.strftime('%d/%m/%Y')} | נוצר ב-{report_time}\n\n"
+    
+    # מצב streaming: placeholder בצ'אט הראשון שמתעדכן בזמן היצירה
+    stream_message = None
+    on_chunk = None
+    chat_ids = get_chat_ids()
+    if '--stream' in sys.argv or REPORT_DELIVERY == 'stream':
+        token = os.environ.get('TELEGRAM_TOKEN')
+        if token and chat_ids:
+            stream_message = StreamingMessage(token, chat_ids[0])
+            if stream_message.start(header + "⏳ הדוח בהכנה..."):
+                on_chunk = lambda text: stream_message.update(header + prompt_builder.expand_links(text))
+            else:
+                stream_message = None
     
+    # ניתוח עם Gemini
+    with stage('llm'):
+        insights = None
+        if '--map-reduce' in sys.argv or REPORT_MODE == 'map_reduce':
+            print("\n🤖 Analyzing with Gemini (map-reduce)...")
+            report = analyze_platforms_map_reduce(
+                {'youtube': youtube_summary, 'facebook': facebook_summary, 'instagram': instagram_summary},
+                followers_summary,
+                prompt_builder
+            )
+        elif REPORT_FORMAT == 'json' and on_chunk is None:
+            print("\n🤖 Analyzing with Gemini (structured)...")
+            report, insights = analyze_all_platforms_structured(
+                youtube_summary,
+                facebook_summary,
+                instagram_summary,
+                followers_summary,
+                prompt_builder
+            )
+        else:
+            print("\n🤖 Analyzing with Gemini...")
+            report = analyze_all_platforms_with_gemini(
+                youtube_summary, 
+                facebook_summary, 
+                instagram_summary,
+                followers_summary,
+                yesterday,
+                report_time,
+                prompt_builder,
+                on_chunk
+            )
+
     # הוספת כותרת
-    header = f"📊 *דוח רשתות חברתיות יומי - כאן חדשות*\n{now.strftime('%d/%m/%Y')} | נוצר ב-{report_time}\n\n"
     full_report = header + report
     
     # שליחה לטלגרם
-    print("\n📨 Sending to Telegram...")
-    success = send_telegram_message(full_report)
+    with stage('telegram'):
+        print("\n📨 Sending to Telegram...")
+        if stream_message:
+            # שאר הצ'אטים מקבלים את הדוח הסופי (במקביל ביניהם) אחרי העריכה הסופית
+            results = {stream_message.chat_id: {
+                'ok': stream_message.finish(full_report),
+                'message_ids': stream_message.message_ids,
+            }}
+            if len(chat_ids) > 1:
+                results.update(send_telegram_message(full_report, chat_ids[1:]))
+        else:
+            results = send_telegram_message(full_report, chat_ids)
+    success = bool(results) and all(result['ok'] for result in results.values())
     
     if success:
         print("✅ Unified report sent successfully!")
         
         # שמירת התובנות היומיות לגיליון לטובת הדוח השבועי
         print("\n💾 Saving daily insights...")
-        save_daily_insights_to_sheets(full_report, yesterday)
-    else:
+        with stage('sheet_write'):
+            save_daily_insights_to_sheets(full_report, yesterday, insights)
+    
+    # שמירת מזהי ההודעות לעדכונים במהלך היום (--intraday)
+    if results:
+        with stage('sheet_write'):
+            save_report_state(yesterday, full_report, results)
+    
+    if not success:
+        mark_failed('report_not_sent')
         print("⚠️ Failed to send report")
         print("\n--- Report Preview ---")
         print(full_report[:1000])
 
 
 if __name__ == "__main__":
-    generate_unified_report()
+    with track_run('telegram_reporter'), profile_run('telegram_reporter'):
+        if '--intraday' in sys.argv:
+            update_intraday_report()
+        else:
+            generate_unified_report()
 
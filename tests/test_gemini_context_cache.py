@@ -0,0 +1,132 @@
+"""
+בדיקות ל-context cache של gemini_utils מול client מקומי (stub של client.caches / client.models)
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import gemini_utils
+
+INSTRUCTIONS = "הוראות קבועות לדוח היומי"
+MODEL = "gemini-2.5-pro"
+
+
+class StubCaches:
+    def __init__(self, fail_create=False):
+        self.cached = []
+        self.created = []
+        self.updated = []
+        self.fail_create = fail_create
+
+    def list(self):
+        return list(self.cached)
+
+    def create(self, model, config):
+        if self.fail_create:
+            raise RuntimeError("Cached content is too small")
+        cached = SimpleNamespace(name=f"cachedContents/{len(self.created) + 1}",
+                                 model=f"models/{model}", display_name=config.display_name)
+        self.created.append((model, config))
+        self.cached.append(cached)
+        return cached
+
+    def update(self, name, config):
+        self.updated.append((name, config.ttl))
+
+
+class StubModels:
+    def __init__(self):
+        self.configs = []
+
+    def generate_content_stream(self, model, contents, config):
+        self.configs.append(config)
+        yield SimpleNamespace(text="דוח", usage_metadata=None)
+
+
+def stub_client(**options):
+    return SimpleNamespace(caches=StubCaches(**options), models=StubModels())
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.setattr(gemini_utils, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(gemini_utils, 'CONTEXT_CACHE_ENABLED', True)
+    monkeypatch.setattr(gemini_utils, '_context_caches', {})
+    monkeypatch.setenv('GEMINI_FORCE_REFRESH', '1')
+
+
+def test_creates_cache_and_sends_it_instead_of_inline_instructions():
+    client = stub_client()
+    text = gemini_utils.generate_with_fallback(client, [MODEL], "נתונים", system_instruction=INSTRUCTIONS)
+
+    assert text == "דוח"
+    assert len(client.caches.created) == 1
+    model, config = client.caches.created[0]
+    assert model == MODEL
+    assert config.system_instruction == INSTRUCTIONS
+    assert config.display_name.startswith(gemini_utils.CONTEXT_CACHE_PREFIX)
+    sent = client.models.configs[0]
+    assert sent.cached_content == "cachedContents/1"
+    assert sent.system_instruction is None
+
+
+def test_reuses_cache_for_same_instructions():
+    client = stub_client()
+    first = gemini_utils.get_context_cache(client, MODEL, INSTRUCTIONS)
+    # אותה ריצה - מה-memo, בלי קריאה נוספת ל-API
+    assert gemini_utils.get_context_cache(client, MODEL, INSTRUCTIONS) == first
+    assert len(client.caches.created) == 1
+    assert client.caches.updated == []
+
+    # ריצה חדשה (memo ריק) - נמצא ברשימה, מאריכים TTL ולא יוצרים חדש
+    gemini_utils._context_caches.clear()
+    assert gemini_utils.get_context_cache(client, MODEL, INSTRUCTIONS) == first
+    assert len(client.caches.created) == 1
+    assert client.caches.updated == [(first, f"{gemini_utils.CONTEXT_CACHE_TTL_SEC}s")]
+
+
+def test_changed_instructions_create_a_new_cache():
+    client = stub_client()
+    first = gemini_utils.get_context_cache(client, MODEL, INSTRUCTIONS)
+    second = gemini_utils.get_context_cache(client, MODEL, INSTRUCTIONS + " (גרסה 2)")
+
+    assert second != first
+    assert len(client.caches.created) == 2
+    names = [config.display_name for _, config in client.caches.created]
+    assert names[0] != names[1]
+
+
+def test_falls_back_to_inline_instructions_when_caching_fails():
+    client = stub_client(fail_create=True)
+    text = gemini_utils.generate_with_fallback(client, [MODEL], "נתונים", system_instruction=INSTRUCTIONS)
+
+    assert text == "דוח"
+    sent = client.models.configs[0]
+    assert sent.cached_content is None
+    assert sent.system_instruction == INSTRUCTIONS
+    # הכשל נזכר - לא מנסים ליצור שוב באותה ריצה
+    assert gemini_utils.get_context_cache(client, MODEL, INSTRUCTIONS) is None
+
+
+def test_disabled_context_cache_sends_instructions_inline(monkeypatch):
+    monkeypatch.setattr(gemini_utils, 'CONTEXT_CACHE_ENABLED', False)
+    client = stub_client()
+    gemini_utils.generate_with_fallback(client, [MODEL], "נתונים", system_instruction=INSTRUCTIONS)
+
+    assert client.caches.created == []
+    assert client.models.configs[0].system_instruction == INSTRUCTIONS
+
+
+def test_remembers_too_small_instructions_across_runs():
+    client = stub_client(fail_create=True)
+    assert gemini_utils.get_context_cache(client, MODEL, INSTRUCTIONS) is None
+
+    # ריצה חדשה (memo ריק) - לא קוראים ל-caches.list / create שוב
+    gemini_utils._context_caches.clear()
+    client.caches.list = lambda: pytest.fail("caches.list called for too-small instructions")
+    assert gemini_utils.get_context_cache(client, MODEL, INSTRUCTIONS) is None
+
+    # הוראות אחרות (hash אחר) - מנסים מחדש
+    client.caches = StubCaches()
+    assert gemini_utils.get_context_cache(client, MODEL, INSTRUCTIONS + " (גרסה 2)") == "cachedContents/1"
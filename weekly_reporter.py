@@ -11,9 +11,12 @@ import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime, timedelta
 import pytz
-import requests
 from google import genai
-from google.genai import types
+from gemini_utils import generate_with_fallback
+from summary_engine import PLATFORMS, summarize_period
+from profiling import profile_run
+from daily_rollup import get_rollup, summarize_rollup
+from telegram_delivery import fan_out_report, get_chat_ids
 
 # Fix encoding for Windows console
 if sys.stdout.encoding != 'utf-8':
@@ -37,20 +40,35 @@ def get_sheet_client():
     return gspread.authorize(creds)
 
 
-def get_weekly_data(sheet_name, date_column, days_back=7):
-    """משיכת נתונים של X ימים אחרונים"""
+def get_weekly_data(sheet_name, date_column, days_back=7, max_rows=None):
+    """
+    משיכת נתונים של X ימים אחרונים.
+    max_rows - מספר הפוסטים בתקופה לפי הסיכום היומי: הגיליונות ממוינים מהחדש לישן,
+    אז מספיק לקרוא את השורות הראשונות (ועוד אחת) במקום את כל הגיליון. אם הן לא מכסות
+    בדיוק את התקופה (סיכום לא מעודכן, או שורות לא ממוינות מ---stream) - קוראים את כל הגיליון.
+    """
+    cutoff = (datetime.now(pytz.timezone('Asia/Jerusalem')) - timedelta(days=days_back)).strftime('%Y-%m-%d')
     try:
         gc = get_sheet_client()
         sh = gc.open_by_key(SPREADSHEET_ID)
         worksheet = sh.worksheet(sheet_name)
-        df = pd.DataFrame(worksheet.get_all_records())
+        df = None
+        if max_rows is not None:
+            values = worksheet.get_values(f"1:{max_rows + 2}")
+            header = values[0] if values else []
+            rows = [row + [''] * (len(header) - len(row)) for row in values[1:]]
+            df = pd.DataFrame(rows, columns=header)
+            if not covers_period(df, date_column, cutoff, max_rows, exhausted=len(rows) <= max_rows):
+                print(f"   ⚠️ Top {max_rows + 1} rows of {sheet_name} do not match the rollup - reading the full sheet")
+                df = None
+        if df is None:
+            df = pd.DataFrame(worksheet.get_all_records())
         
         if df.empty:
             return pd.DataFrame()
         
         # סינון לפי תאריך
-        cutoff = (datetime.now(pytz.timezone('Asia/Jerusalem')) - timedelta(days=days_back)).strftime('%Y-%m-%d')
-        df = df[df[date_column] >= cutoff]
+        df = df[df[date_column].astype(str) >= cutoff]
         
         return df
     except Exception as e:
@@ -58,6 +76,18 @@ def get_weekly_data(sheet_name, date_column, days_back=7):
         return pd.DataFrame()
 
 
+def covers_period(df, date_column, cutoff, expected, exhausted):
+    """
+    האם השורות הראשונות של הגיליון כוללות את כל הפוסטים בתקופה: בדיוק expected פוסטים
+    מ-cutoff והלאה, והשורה האחרונה שנקראה כבר לפני התקופה (או שהגיליון נגמר).
+    """
+    if df.empty or date_column not in df.columns:
+        return expected == 0 and exhausted
+    dates = df[date_column].astype(str)
+    in_period = int((dates >= cutoff).sum())
+    return in_period == expected and (exhausted or dates.iloc[-1] < cutoff)
+
+
 def get_daily_insights(days_back=7):
     """משיכת התובנות היומיות של השבוע"""
     try:
@@ -90,72 +120,77 @@ def get_daily_insights(days_back=7):
         return []
 
 
-def calculate_weekly_stats(yt_df, fb_df, ig_df):
-    """חישוב סטטיסטיקות שבועיות"""
+def merge_rollup_stats(summary, platform, rollup):
+    """סכומי התקופה מהסיכום היומי (אם יש) במקום החישוב מהשורות; הטופ נשאר מהשורות"""
+    period = (rollup or {}).get(platform)
+    if summary is None or not period:
+        return summary
+    totals = dict(period['totals'])
+    totals['saved'] = totals.pop('saves')
+    by_type = period['by_type'].rename(columns={'posts': 'count', 'saves': 'saved'})
+    by_type = by_type.sort_values(PLATFORMS[platform]['rank_by'], ascending=False)
+    return dict(summary, count=totals['posts'], totals=totals, by_type=by_type)
+
+
+def calculate_weekly_stats(yt_df, fb_df, ig_df, rollup=None):
+    """
+    חישוב סטטיסטיקות שבועיות - groupby אחד לפי סוג תוכן לכל פלטפורמה.
+    rollup - הסיכום היומי של השבוע (summarize_rollup); אם יש, הסכומים נלקחים ממנו.
+    """
     stats = {}
     
     # YouTube
-    if not yt_df.empty:
-        # המרת עמודות למספרים
-        for col in ['views', 'likes', 'comments']:
-            if col in yt_df.columns:
-                yt_df[col] = pd.to_numeric(yt_df[col], errors='coerce').fillna(0)
-        
-        stats['yt_total_videos'] = len(yt_df)
-        stats['yt_total_views'] = int(yt_df['views'].sum())
-        stats['yt_total_likes'] = int(yt_df['likes'].sum()) if 'likes' in yt_df.columns else 0
+    yt = merge_rollup_stats(summarize_period(yt_df, 'youtube'), 'youtube', rollup)
+    if yt:
+        stats['yt_total_videos'] = yt['count']
+        stats['yt_total_views'] = yt['totals']['views']
+        stats['yt_total_likes'] = yt['totals']['likes']
         
         # Shorts vs רגיל
-        if 'video_type' in yt_df.columns:
-            shorts_count = len(yt_df[yt_df['video_type'] == 'Shorts'])
-            stats['yt_shorts_pct'] = round(shorts_count / len(yt_df) * 100, 1) if len(yt_df) > 0 else 0
-            
-            shorts_views = yt_df[yt_df['video_type'] == 'Shorts']['views'].sum()
+        if 'video_type' in yt['columns']:
+            by_type = yt['by_type']
+            shorts_count = int(by_type.at['Shorts', 'count']) if 'Shorts' in by_type.index else 0
+            shorts_views = int(by_type.at['Shorts', 'views']) if 'Shorts' in by_type.index else 0
+            stats['yt_shorts_pct'] = round(shorts_count / yt['count'] * 100, 1)
             stats['yt_shorts_views_pct'] = round(shorts_views / stats['yt_total_views'] * 100, 1) if stats['yt_total_views'] > 0 else 0
-        
-        # טופ 5
-        stats['yt_top_5'] = yt_df.nlargest(5, 'views')[['title', 'video_type', 'views']].to_dict('records') if 'video_type' in yt_df.columns else []
+            
+            # טופ 5
+            stats['yt_top_5'] = yt['top'][['title', 'video_type', 'views']].to_dict('records')
+        else:
+            stats['yt_top_5'] = []
     
     # Facebook
-    if not fb_df.empty:
-        # המרת עמודות למספרים
-        for col in ['reach', 'views', 'likes', 'comments', 'shares']:
-            if col in fb_df.columns:
-                fb_df[col] = pd.to_numeric(fb_df[col], errors='coerce').fillna(0)
-        
-        stats['fb_total_posts'] = len(fb_df)
-        stats['fb_total_reach'] = int(fb_df['reach'].sum())
-        stats['fb_total_likes'] = int(fb_df['likes'].sum()) if 'likes' in fb_df.columns else 0
-        stats['fb_total_shares'] = int(fb_df['shares'].sum()) if 'shares' in fb_df.columns else 0
+    fb = merge_rollup_stats(summarize_period(fb_df, 'facebook'), 'facebook', rollup)
+    if fb:
+        stats['fb_total_posts'] = fb['count']
+        stats['fb_total_reach'] = fb['totals']['reach']
+        stats['fb_total_likes'] = fb['totals']['likes']
+        stats['fb_total_shares'] = fb['totals']['shares']
         
         # סוגי פוסטים
-        if 'type' in fb_df.columns:
-            by_type = fb_df.groupby('type')['reach'].sum().sort_values(ascending=False)
+        if 'type' in fb['columns']:
+            by_type = fb['by_type']['reach']
             stats['fb_best_format'] = by_type.index[0] if len(by_type) > 0 else "N/A"
             stats['fb_format_breakdown'] = by_type.head(3).to_dict()
         
         # טופ 5
-        stats['fb_top_5'] = fb_df.nlargest(5, 'reach')[['title', 'type', 'reach']].to_dict('records') if 'type' in fb_df.columns else []
+        stats['fb_top_5'] = fb['top'][['title', 'type', 'reach']].to_dict('records') if 'type' in fb['columns'] else []
     
     # Instagram
-    if not ig_df.empty:
-        # המרת עמודות למספרים
-        for col in ['views', 'reach', 'likes', 'comments', 'saved']:
-            if col in ig_df.columns:
-                ig_df[col] = pd.to_numeric(ig_df[col], errors='coerce').fillna(0)
-        
-        stats['ig_total_posts'] = len(ig_df)
-        stats['ig_total_views'] = int(ig_df['views'].sum())
-        stats['ig_total_likes'] = int(ig_df['likes'].sum()) if 'likes' in ig_df.columns else 0
-        stats['ig_total_saved'] = int(ig_df['saved'].sum()) if 'saved' in ig_df.columns else 0
+    ig = merge_rollup_stats(summarize_period(ig_df, 'instagram'), 'instagram', rollup)
+    if ig:
+        stats['ig_total_posts'] = ig['count']
+        stats['ig_total_views'] = ig['totals']['views']
+        stats['ig_total_likes'] = ig['totals']['likes']
+        stats['ig_total_saved'] = ig['totals']['saved']
         
         # סוגי פוסטים
-        if 'type' in ig_df.columns:
-            by_type = ig_df.groupby('type')['views'].sum().sort_values(ascending=False)
+        if 'type' in ig['columns']:
+            by_type = ig['by_type']['views']
             stats['ig_best_format'] = by_type.index[0] if len(by_type) > 0 else "N/A"
         
         # טופ 5
-        stats['ig_top_5'] = ig_df.nlargest(5, 'views')[['caption', 'type', 'views']].to_dict('records') if 'type' in ig_df.columns else []
+        stats['ig_top_5'] = ig['top'][['caption', 'type', 'views']].to_dict('records') if 'type' in ig['columns'] else []
     
     return stats
 
@@ -222,23 +257,8 @@ def format_daily_insights(insights_list):
     return text if text else "לא נמצאו תובנות יומיות."
 
 
-def analyze_weekly_with_gemini(stats_text, daily_insights_text, week_start, week_end):
-    """ניתוח שבועי עם Gemini"""
-    api_key = os.environ.get('GEMINI_API_KEY')
-    if not api_key:
-        return "⚠️ חסר מפתח ל-Gemini."
-    
-    client = genai.Client(api_key=api_key)
-    
-    prompt = f"""אתה מנתח ביצועי רשתות חברתיות של כאן חדשות. כתוב דוח שבועי.
-
-=== 📊 נתונים שבועיים ===
-תקופה: {week_start} עד {week_end}
-
-{stats_text}
-
-=== 💡 תובנות שזיהינו בכל יום ===
-{daily_insights_text}
+# הוראות הדוח השבועי - החלק הקבוע של הפרומפט (נשמר ב-context cache של Gemini)
+WEEKLY_REPORT_INSTRUCTIONS = """אתה מנתח ביצועי רשתות חברתיות של כאן חדשות. כתוב דוח שבועי.
 
 === 📝 מבנה הדוח ===
 
@@ -294,35 +314,33 @@ def analyze_weekly_with_gemini(stats_text, daily_insights_text, week_start, week
 - אל תמציא נתונים
 """
 
+
+def analyze_weekly_with_gemini(stats_text, daily_insights_text, week_start, week_end):
+    """ניתוח שבועי עם Gemini"""
+    api_key = os.environ.get('GEMINI_API_KEY')
+    if not api_key:
+        return "⚠️ חסר מפתח ל-Gemini."
+    
+    client = genai.Client(api_key=api_key)
+    
+    # החלק הקבוע (WEEKLY_REPORT_INSTRUCTIONS) נשלח כ-cached content; כאן רק הנתונים
+    prompt = f"""=== 📊 נתונים שבועיים ===
+תקופה: {week_start} עד {week_end}
+
+{stats_text}
+
+=== 💡 תובנות שזיהינו בכל יום ===
+{daily_insights_text}
+"""
+
     try:
-        contents = [
-            types.Content(
-                role="user",
-                parts=[types.Part.from_text(text=prompt)],
-            ),
-        ]
-        
-        # Try models in order
+        # Primary model first, secondary hedged in parallel if it is slow (cached by prompt)
         models_to_try = ["gemini-3-pro-preview", "gemini-2.5-pro"]
         
-        for model_name in models_to_try:
-            try:
-                print(f"   Trying model: {model_name}")
-                
-                response_text = ""
-                for chunk in client.models.generate_content_stream(
-                    model=model_name,
-                    contents=contents,
-                ):
-                    if chunk.text:
-                        response_text += chunk.text
-                
-                if response_text:
-                    return response_text
-                    
-            except Exception as e:
-                print(f"   Model {model_name} failed: {e}")
-                continue
+        response_text = generate_with_fallback(client, models_to_try, prompt,
+                                               system_instruction=WEEKLY_REPORT_INSTRUCTIONS)
+        if response_text:
+            return response_text
         
         return "שגיאה: לא הצלחתי לייצר את הדוח."
         
@@ -330,29 +348,17 @@ def analyze_weekly_with_gemini(stats_text, daily_insights_text, week_start, week
         return f"שגיאה בניתוח: {e}"
 
 
-def send_telegram_message(message):
-    """שליחת הודעה לטלגרם"""
+def send_telegram_message(message, chat_ids=None):
+    """שליחת הודעה לכל הצ'אטים במקביל - מפוצלת לפי קטעים, עם retry ב-429 וגיבוי לטקסט רגיל"""
     token = os.environ.get('TELEGRAM_TOKEN')
-    chat_id = os.environ.get('TELEGRAM_CHAT_ID')
+    chat_ids = get_chat_ids() if chat_ids is None else chat_ids
     
-    if not token or not chat_id:
+    if not token or not chat_ids:
         print("⚠️ Skipping Telegram - missing credentials.")
         return False
 
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    
-    if len(message) > 4000:
-        print(f"⚠️ Message too long ({len(message)} chars), truncating...")
-        message = message[:3900] + "\n\n... (הדוח קוצר עקב מגבלת אורך)"
-    
-    payload = {"chat_id": chat_id, "text": message}
-    try:
-        response = requests.post(url, json=payload)
-        print(f"Telegram response: {response.status_code}")
-        return response.status_code == 200
-    except Exception as e:
-        print(f"Telegram Error: {e}")
-        return False
+    results = fan_out_report(token, chat_ids, message, parse_mode=None)
+    return bool(results) and all(result['ok'] for result in results.values())
 
 
 def main():
@@ -368,19 +374,30 @@ def main():
     week_start_display = (today - timedelta(days=7)).strftime('%d/%m')
     week_end_display = (today - timedelta(days=1)).strftime('%d/%m/%Y')
     
-    # 1. משיכת נתונים
+    # 1. משיכת הסיכום היומי - ממנו הסכומים, ומספר השורות שצריך לקרוא מכל גיליון
+    print("📊 Fetching daily rollup...")
+    rollup = summarize_rollup(get_rollup(days_back=7))
+    post_counts = {platform: period['totals']['posts'] for platform, period in rollup.items()}
+    print(f"   Rollup covers: {', '.join(rollup) or 'nothing (reading full sheets)'}")
+    
     print("📺 Fetching YouTube data...")
-    yt_df = get_weekly_data('נתוני יוטיוב', 'published_at', days_back=7)
+    yt_df = get_weekly_data('נתוני יוטיוב', 'published_at', days_back=7, max_rows=post_counts.get('youtube'))
     print(f"   Found {len(yt_df)} videos")
     
     print("📘 Fetching Facebook data...")
-    fb_df = get_weekly_data('נתוני פייסבוק', 'date', days_back=7)
+    fb_df = get_weekly_data('נתוני פייסבוק', 'date', days_back=7, max_rows=post_counts.get('facebook'))
     print(f"   Found {len(fb_df)} posts")
     
     print("📷 Fetching Instagram data...")
-    ig_df = get_weekly_data('נתוני אינסטגרם', 'date', days_back=7)
+    ig_df = get_weekly_data('נתוני אינסטגרם', 'date', days_back=7, max_rows=post_counts.get('instagram'))
     print(f"   Found {len(ig_df)} posts")
     
+    # הסכומים מהסיכום היומי רק אם הוא מסכים עם השורות (אחרת הוא חלקי או לא מעודכן)
+    for platform, df in (('youtube', yt_df), ('facebook', fb_df), ('instagram', ig_df)):
+        if platform in rollup and not df.empty and len(df) != post_counts[platform]:
+            print(f"   ⚠️ Rollup has {post_counts[platform]} {platform} posts, sheet has {len(df)} - using the sheet")
+            del rollup[platform]
+    
     # 2. משיכת תובנות יומיות
     print("💡 Fetching daily insights...")
     daily_insights = get_daily_insights(days_back=7)
@@ -388,7 +405,7 @@ def main():
     
     # 3. חישוב סטטיסטיקות
     print("📊 Calculating stats...")
-    stats = calculate_weekly_stats(yt_df, fb_df, ig_df)
+    stats = calculate_weekly_stats(yt_df, fb_df, ig_df, rollup)
     stats_text = format_stats_for_prompt(stats)
     insights_text = format_daily_insights(daily_insights)
     
@@ -413,4 +430,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with profile_run('weekly_reporter'):
+        main()
@@ -4,6 +4,7 @@ YouTube Collector - איסוף נתוני סרטונים מיוטיוב
 """
 
 import os
+import sys
 import json
 import pandas as pd
 from googleapiclient.discovery import build
@@ -13,6 +14,13 @@ import isodate
 from datetime import datetime, timedelta
 import pytz
 import numpy as np
+from daily_rollup import update_rollup
+from run_telemetry import track_run, stage, mark_failed
+from run_scheduler import (is_priority, should_defer, record_deferred, can_finish, install_stop_handler,
+                           load_priority_ids, save_priority_ids)
+from sheet_journal import flush, write_sheet
+from sheet_stream import SheetChunkWriter
+from profiling import profile_run
 
 # Load .env file if exists (for local development)
 try:
@@ -53,57 +61,76 @@ def get_uploads_playlist_id(youtube):
         print(f"Error finding uploads ID: {e}")
         return None
 
-def get_existing_data():
+def open_worksheet():
+    """(spreadsheet, worksheet) של גיליון היוטיוב"""
+    gc = get_sheet_client()
+    sh = gc.open_by_url(SPREADSHEET_URL)
+    try:
+        worksheet = sh.worksheet(SHEET_NAME)
+    except:
+        worksheet = sh.get_worksheet(0)
+    return sh, worksheet
+
+
+def get_existing_data(worksheet):
     """שואב את הנתונים הקיימים מה-Sheet כדי לחשב דלתא"""
     try:
-        gc = get_sheet_client()
-        sh = gc.open_by_url(SPREADSHEET_URL)
-        try:
-            worksheet = sh.worksheet(SHEET_NAME)
-        except:
-            worksheet = sh.get_worksheet(0)
-        
         existing_df = pd.DataFrame(worksheet.get_all_records())
         if not existing_df.empty:
             existing_df['video_id'] = existing_df['video_id'].astype(str)
         return existing_df
+    except gspread.exceptions.APIError:
+        # Sheets לא זמין - בלי ההיסטוריה הכתיבה הייתה דורסת את הגיליון
+        raise
     except Exception as e:
         print(f"Error fetching existing data: {e}")
         return pd.DataFrame()
 
 
-def fetch_videos():
-    """שאיבת סרטונים מיוטיוב"""
+def iter_videos(deferred, since=None):
+    """
+    generator: דף מה-playlist -> סטטיסטיקות -> שורה מוכנה לגיליון, סרטון אחרי סרטון.
+    סרטונים שנדחו (תקציב זמן) נוספים לרשימה deferred.
+    since (datetime עם אזור זמן) - הסרטון הכי ישן; ברירת המחדל: 30 הימים האחרונים.
+    """
     youtube = get_youtube_service()
     uploads_id = get_uploads_playlist_id(youtube)
     if not uploads_id: 
-        return pd.DataFrame()
+        return
 
     il_tz = pytz.timezone('Asia/Jerusalem')
     current_time = datetime.now(il_tz).strftime('%Y-%m-%d %H:%M')
-    cutoff_date = datetime.now(pytz.utc) - timedelta(days=30)
+    cutoff_date = since or datetime.now(pytz.utc) - timedelta(days=30)
+    leaders = load_priority_ids('youtube_collector')
     
-    videos = []
     next_page = None
     should_stop = False
     
-    print("Fetching videos from YouTube API...")
     while True:
         req = youtube.playlistItems().list(part="snippet,contentDetails", playlistId=uploads_id, maxResults=50, pageToken=next_page)
-        res = req.execute()
+        with stage('fetch'):
+            res = req.execute()
         
         ids_to_fetch = []
+        newest_pub = None
         for item in res['items']:
             pub = datetime.strptime(item['contentDetails']['videoPublishedAt'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=pytz.utc)
             if pub < cutoff_date: 
                 should_stop = True
                 break
             ids_to_fetch.append(item['contentDetails']['videoId'])
+            newest_pub = max(newest_pub or pub, pub)
         
         if not ids_to_fetch: 
             break
 
-        stats_res = youtube.videos().list(part="snippet,contentDetails,statistics,topicDetails", id=','.join(ids_to_fetch)).execute()
+        # תחת תקציב זמן (run_scheduler) - דף של סרטונים ישנים נדחה לריצה הבאה (אלא אם יש בו מוביל בדלתא)
+        if should_defer(priority=is_priority(newest_pub) or not leaders.isdisjoint(ids_to_fetch)):
+            deferred.extend(ids_to_fetch)
+            stats_res = {'items': []}
+        else:
+            with stage('enrich'):
+                stats_res = youtube.videos().list(part="snippet,contentDetails,statistics,topicDetails", id=','.join(ids_to_fetch)).execute()
         
         for item in stats_res['items']:
             dur = item['contentDetails']['duration']
@@ -121,7 +148,7 @@ def fetch_videos():
             thumb = item['snippet']['thumbnails']
             thumb_url = thumb.get('maxres', thumb.get('high', thumb.get('medium')))['url']
 
-            videos.append({
+            yield {
                 'video_id': item['id'],
                 'published_at': item['snippet']['publishedAt'][:10],
                 'published_time': item['snippet']['publishedAt'][11:16],
@@ -139,23 +166,42 @@ def fetch_videos():
                 'comment_rate': round((comments/views*100) if views > 0 else 0, 4),
                 'video_url': f"https://www.youtube.com/watch?v={item['id']}",
                 'last_updated': current_time
-            })
+            }
             
         if should_stop or 'nextPageToken' not in res: 
             break
         next_page = res['nextPageToken']
-    
+
+
+def fetch_videos():
+    """שאיבת סרטונים מיוטיוב"""
+    deferred = []
+    print("Fetching videos from YouTube API...")
+    videos = list(iter_videos(deferred))
     print(f"Fetched {len(videos)} videos.")
-    return pd.DataFrame(videos)
+    record_deferred('youtube_collector', deferred)
+    df = pd.DataFrame(videos)
+    df.attrs['deferred_ids'] = deferred
+    return df
 
 
-def update_google_sheet(new_data_df):
-    """עדכון הגיליון בגוגל שיטס"""
-    print("Updating Google Sheets...")
-    
-    # שליפת הנתונים הקיימים
-    existing_df = get_existing_data()
-    
+def fetch_today_videos():
+    """
+    הסרטונים של היום בלבד (מחצות שעון ישראל), לעדכון במהלך היום (telegram_reporter --intraday).
+    בלי merge ובלי כתיבה לגיליון - views_delta נשאר מול הריצה היומית.
+    """
+    midnight = datetime.now(pytz.timezone('Asia/Jerusalem')).replace(hour=0, minute=0, second=0, microsecond=0)
+    return pd.DataFrame(list(iter_videos([], since=midnight)))
+
+
+def merge_videos(new_data_df, existing_df):
+    """
+    מיזוג הסרטונים שנאספו עם הקיימים בגיליון (בלי גישה לגיליון):
+    views_delta מול ההרצה הקודמת, איחוד לפי video_id (הנתון החדש גובר), מיון וניקוי.
+    סרטונים שנדחו בריצה הזו (new_data_df.attrs['deferred_ids']) נשארים כמו שהם, עם דלתא 0.
+    """
+    deferred = [str(video_id) for video_id in new_data_df.attrs.get('deferred_ids', [])]
+
     # חישוב דלתא - כמה צפיות נוספו מאז ההרצה הקודמת
     if not existing_df.empty and 'views' in existing_df.columns:
         existing_df['views'] = pd.to_numeric(existing_df['views'], errors='coerce').fillna(0)
@@ -167,14 +213,6 @@ def update_google_sheet(new_data_df):
     else:
         new_data_df['views_delta'] = 0
     
-    # מיזוג הנתונים
-    gc = get_sheet_client()
-    sh = gc.open_by_url(SPREADSHEET_URL)
-    try: 
-        worksheet = sh.worksheet(SHEET_NAME)
-    except: 
-        worksheet = sh.get_worksheet(0)
-    
     if existing_df.empty: 
         final_df = new_data_df
     else:
@@ -189,6 +227,10 @@ def update_google_sheet(new_data_df):
         combined = pd.concat([new_data_df, existing_df])
         final_df = combined.drop_duplicates(subset=['video_id'], keep='first')
     
+    # בלי מדידה חדשה אין דלתא - אחרת הדוח יספור שוב את הגידול של הריצה הקודמת
+    if deferred:
+        final_df.loc[final_df['video_id'].astype(str).isin(deferred), 'views_delta'] = 0
+
     final_df = final_df.sort_values(by='published_at', ascending=False)
     final_df = final_df.fillna(0).replace([np.inf, -np.inf], 0)
     
@@ -196,18 +238,70 @@ def update_google_sheet(new_data_df):
     for col in ['description', 'tags', 'thumbnail_url', 'published_time', 'duration_formatted']:
         if col in final_df.columns: 
             final_df[col] = final_df[col].replace(0, "")
+    return final_df
+
 
-    worksheet.clear()
-    worksheet.update([final_df.columns.values.tolist()] + final_df.values.tolist(), value_input_option='RAW')
-    print("Sheet updated successfully!")
+def update_google_sheet(new_data_df):
+    """עדכון הגיליון בגוגל שיטס. מחזיר את הטבלה שנכתבה, או None אם השמירה בוטלה"""
+    print("Updating Google Sheets...")
+    # אין זמן לסיים את השמירה לפני שה-scheduler עוצר את הריצה
+    if not can_finish('the sheet write'):
+        mark_failed('no_time_to_save')
+        return None
+    
+    # שליפת הנתונים הקיימים ומיזוג - אחרי שליחת כתיבות שנשארו ביומן מריצה קודמת. אם הן לא
+    # נשלחו, ההיסטוריה לא כוללת אותן והכתיבה החדשה הייתה גוברת עליהן ביומן - לכן לא שומרים
+    with stage('sheet_read'):
+        sh, worksheet = open_worksheet()
+        if not flush(sh):
+            mark_failed('sheet_journal_pending')
+            return None
+        existing_df = get_existing_data(worksheet)
+    with stage('merge'):
+        final_df = merge_videos(new_data_df, existing_df)
+    
+    with stage('sheet_write'):
+        # דרך יומן הכתיבות - אם Sheets נופל, הנתונים נשלחים בריצה הבאה
+        if write_sheet(sh, worksheet.title, [final_df.columns.values.tolist()] + final_df.values.tolist(), 'RAW'):
+            print("Sheet updated successfully!")
+        save_priority_ids('youtube_collector', final_df, 'video_id')
+        
+        # עדכון הסיכום היומי - רק לתאריכים של הסרטונים שנאספו בריצה הזו
+        update_rollup(sh, 'youtube', final_df, new_data_df['published_at'])
     
     return final_df
 
 
+def stream_to_sheet():
+    """
+    מצב streaming (--stream): כל CHUNK_ROWS סרטונים שנאספו נכתבים מיד לגיליון (upsert לפי video_id),
+    בזיכרון חסום - לאיסוף של חלון ארוך.
+    """
+    print("Streaming videos from YouTube API to Google Sheets...")
+    sh, worksheet = open_worksheet()
+    # כתיבה מלאה שממתינה ביומן הייתה דורסת את מה שנכתב כאן
+    if not flush(sh):
+        mark_failed('sheet_journal_pending')
+        return
+
+    deferred = []
+    writer = SheetChunkWriter(sh, worksheet, 'youtube', 'video_id', {'views_delta': 'views'})
+    writer.write(iter_videos(deferred))
+    record_deferred('youtube_collector', deferred)
+    writer.reset_deltas(deferred)
+    writer.close()
+
+
 if __name__ == "__main__":
-    new_videos = fetch_videos()
-    if not new_videos.empty:
-        updated_df = update_google_sheet(new_videos)
-        print(f"✅ YouTube collection complete! {len(new_videos)} videos processed.")
-    else:
-        print("No videos found.")
+    install_stop_handler()
+    with track_run('youtube_collector'), profile_run('youtube_collector'):
+        if '--stream' in sys.argv:
+            stream_to_sheet()
+        else:
+            new_videos = fetch_videos()
+            if not new_videos.empty:
+                updated_df = update_google_sheet(new_videos)
+                if updated_df is not None:
+                    print(f"✅ YouTube collection complete! {len(new_videos)} videos processed.")
+            else:
+                print("No videos found.")